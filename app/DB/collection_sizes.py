@@ -0,0 +1,39 @@
+"""
+Кэш размеров коллекций, найденных автоопределением (`app.parser.discovery`).
+
+Функции синхронные: из async-кода их вызывают через `run_db`.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from .create_database import connect_db
+from .models import CollectionSize
+
+
+def _size_to_dict(size: CollectionSize) -> dict:
+    return {
+        "collection": size.collection,
+        "max_id": size.max_id,
+        "probes": size.probes,
+        "discovered_at": size.discovered_at,
+    }
+
+
+def get_collection_size(collection: str) -> Optional[dict]:
+    with connect_db() as session:
+        size = session.get(CollectionSize, collection)
+        return _size_to_dict(size) if size else None
+
+
+def save_collection_size(collection: str, max_id: int, probes: int) -> dict:
+    with connect_db() as session:
+        size = session.get(CollectionSize, collection)
+        if size is None:
+            size = CollectionSize(collection=collection)
+            session.add(size)
+        size.max_id = max_id
+        size.probes = probes
+        size.discovered_at = datetime.now()
+        session.flush()
+        return _size_to_dict(size)
@@ -1,14 +1,66 @@
-from sqlalchemy import create_engine
+import re
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 from contextlib import contextmanager
 from datetime import datetime
-from .models import Base, Gift  # Импортируем модель из текущего пакета DB
+from .models import Base, Gift, gift_collection  # Импортируем модель из текущего пакета DB
+from app.bot.config import Config
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+config = Config()
+
 DATABASE_URL = "sqlite:///gifts.db"   # URL вашей базы данных SQLite
 engine = create_engine(DATABASE_URL)
+
+# Профиль производительности SQLite, применяется к каждому новому соединению.
+# WAL позволяет читать БД параллельно с записью парсера, а synchronous=NORMAL
+# в режиме WAL делает fsync только на checkpoint'ах.
+SQLITE_PRAGMAS = {
+    "journal_mode": config.SQLITE_JOURNAL_MODE,
+    "synchronous": config.SQLITE_SYNCHRONOUS,
+    "mmap_size": config.SQLITE_MMAP_SIZE,
+    # Отрицательное значение cache_size задаётся в KiB, а не в страницах
+    "cache_size": -abs(config.SQLITE_CACHE_SIZE_KB),
+    "temp_store": config.SQLITE_TEMP_STORE,
+    "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+}
+
+_PRAGMA_VALUE_RE = re.compile(r"^(-?\d+|[A-Za-z_]+)$")
+
+
+@event.listens_for(engine, "connect")
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    # Профиль применяется к каждому новому DBAPI-соединению пула.
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            if not _PRAGMA_VALUE_RE.match(str(value)):
+                logger.warning("Пропускаем PRAGMA %s: недопустимое значение %r", name, value)
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def sqlite_settings_report() -> dict:
+    """Вернуть фактические значения настраиваемых PRAGMA SQLite и записать их в лог."""
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        report = {}
+        for name in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            report[name] = row[0] if row else None
+        cursor.close()
+    finally:
+        raw.close()
+    logger.info("Настройки SQLite: %s", report)
+    return report
+
+
 SessionFactory = sessionmaker(bind=engine)
 Session = scoped_session(SessionFactory)
 
@@ -29,9 +81,12 @@ def connect_db():
     
 def create_database(): 
   
-    # Create the database and tables.
+    # Create the database and tables, then bring an existing database
+    # up to date (indexes and columns added after it was created).
     
     Base.metadata.create_all(engine)
+    from .migrations import migrate
+    migrate(engine)
     
 def start_database(
     id, name, model, backdrop, symbol, sale_price
@@ -46,6 +101,7 @@ def start_database(
         
         new_gift = Gift(
             id=id,
+            collection=gift_collection(name),
             name=name,
             model=model,
             backdrop=backdrop,
@@ -0,0 +1,368 @@
+"""
+Хранение задач массового парсинга и их контрольных точек в SQLite.
+
+Задача (`ParseJob`) делится на чанки (`ParseJobChunk`) по `chunk_size` ID;
+задача может охватывать несколько коллекций, тогда у каждой свои чанки.
+Воркер забирает чанк, обрабатывает ID по порядку и периодически сохраняет
+`next_id` — после перезапуска процесса чанк продолжается с этой точки.
+ID с временными сбоями копятся в `deferred` и повторяются в конце чанка.
+Функции синхронные: из async-кода их вызывают через `run_db`.
+"""
+
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, update
+
+from .create_database import connect_db
+from .models import JobStatus, ParseJob, ParseJobChunk
+
+# Статусы, из которых задача больше не продолжается
+FINISHED_STATUSES = (JobStatus.CANCELLED, JobStatus.COMPLETED)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def _dump_ids(ids: Iterable[int]) -> str:
+    return ",".join(str(gift_id) for gift_id in sorted(ids))
+
+
+def _load_ids(value: Optional[str]) -> List[int]:
+    return [int(gift_id) for gift_id in value.split(",")] if value else []
+
+
+def _chunk_to_dict(chunk: ParseJobChunk) -> dict:
+    return {
+        "id": chunk.id,
+        "job_id": chunk.job_id,
+        "collection": chunk.collection,
+        "start_id": chunk.start_id,
+        "end_id": chunk.end_id,
+        "next_id": chunk.next_id,
+        "status": chunk.status,
+        "deferred": _load_ids(chunk.deferred),
+    }
+
+
+def _percent(done: int, total: int) -> str:
+    return f"{done / total * 100:.1f}%" if total else "100.0%"
+
+
+def _job_to_dict(job: ParseJob, progress: dict) -> dict:
+    total = progress["total"]
+    done = progress["done"]
+    return {
+        "task_id": job.id,
+        "collection": job.collection,
+        "range": f"{job.start_id}-{job.end_id}",
+        "concurrency": job.concurrency,
+        "status": job.status,
+        "total": total,
+        "done": done,
+        "success": progress["success"],
+        "failed": progress["failed"],
+        "skipped": progress["skipped"],
+        "deferred": progress["deferred"],
+        "progress": _percent(done, total),
+        "chunks": progress["chunks"],
+        "collections": progress["collections"],
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+
+_COUNTERS = ("total", "done", "success", "failed", "skipped", "deferred")
+
+
+def _progress(session, job_ids: List[str]) -> dict:
+    """
+    Сводка по чанкам задач: обработано ID, успехи/ошибки, чанки по статусам.
+
+    В `collections` — та же сводка по каждой коллекции задачи.
+    """
+    progress = {
+        job_id: {**dict.fromkeys(_COUNTERS, 0), "chunks": {}, "collections": {}}
+        for job_id in job_ids
+    }
+    if not job_ids:
+        return progress
+    # Число ID в списке через запятую: запятые + 1 (пустой список — 0)
+    deferred = ParseJobChunk.deferred
+    deferred_count = case(
+        (deferred == "", 0),
+        else_=func.length(deferred) - func.length(func.replace(deferred, ",", "")) + 1,
+    )
+    rows = (
+        session.query(
+            ParseJobChunk.job_id,
+            ParseJobChunk.collection,
+            ParseJobChunk.status,
+            func.count(),
+            func.min(ParseJobChunk.start_id),
+            func.max(ParseJobChunk.end_id),
+            func.max(ParseJobChunk.weight),
+            func.sum(ParseJobChunk.end_id - ParseJobChunk.start_id + 1),
+            func.sum(ParseJobChunk.next_id - ParseJobChunk.start_id),
+            func.sum(ParseJobChunk.success),
+            func.sum(ParseJobChunk.failed),
+            func.sum(ParseJobChunk.skipped),
+            func.sum(deferred_count),
+        )
+        .filter(ParseJobChunk.job_id.in_(job_ids))
+        .group_by(ParseJobChunk.job_id, ParseJobChunk.collection, ParseJobChunk.status)
+        .all()
+    )
+    for job_id, collection, status, chunks, start_id, end_id, weight, *counters in rows:
+        item = progress[job_id]
+        per_collection = item["collections"].setdefault(collection, {
+            "start_id": start_id, "end_id": end_id, "weight": weight,
+            **dict.fromkeys(_COUNTERS, 0), "chunks": {},
+        })
+        per_collection["start_id"] = min(per_collection["start_id"], start_id)
+        per_collection["end_id"] = max(per_collection["end_id"], end_id)
+        for name, value in zip(_COUNTERS, counters):
+            item[name] += value or 0
+            per_collection[name] += value or 0
+        item["chunks"][status.value] = item["chunks"].get(status.value, 0) + chunks
+        per_collection["chunks"][status.value] = chunks
+    for item in progress.values():
+        for per_collection in item["collections"].values():
+            per_collection["range"] = f"{per_collection.pop('start_id')}-{per_collection.pop('end_id')}"
+            per_collection["progress"] = _percent(per_collection["done"], per_collection["total"])
+    return progress
+
+
+def create_job(
+    collection: str,
+    start_id: int,
+    end_id: int,
+    concurrency: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict:
+    """Создать задачу по одной коллекции и разбить диапазон на чанки."""
+    return create_multi_job([(collection, start_id, end_id, 1.0)], concurrency, chunk_size)
+
+
+def create_multi_job(
+    ranges: List[Tuple[str, int, int, float]],
+    concurrency: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict:
+    """
+    Создать одну задачу по нескольким коллекциям.
+
+    `ranges` — кортежи (коллекция, start_id, end_id, вес). Все диапазоны
+    делятся на чанки одной задачи и делят её `concurrency`; очерёдность
+    чанков между коллекциями задаёт `claim_chunk` с учётом весов.
+    """
+    now = datetime.now()
+    job_id = uuid.uuid4().hex
+    with connect_db() as session:
+        job = ParseJob(
+            id=job_id,
+            collection=",".join(collection for collection, *_ in ranges),
+            start_id=min(start_id for _, start_id, _, _ in ranges),
+            end_id=max(end_id for _, _, end_id, _ in ranges),
+            concurrency=concurrency,
+            status=JobStatus.PENDING,
+            created_at=now,
+            updated_at=now,
+        )
+        session.add(job)
+        session.bulk_insert_mappings(ParseJobChunk, [
+            {
+                "job_id": job_id,
+                "collection": collection,
+                "weight": weight,
+                "start_id": chunk_start,
+                "end_id": min(chunk_start + chunk_size - 1, end_id),
+                "next_id": chunk_start,
+                "status": JobStatus.PENDING,
+                "success": 0,
+                "failed": 0,
+                "skipped": 0,
+                "deferred": "",
+                "updated_at": now,
+            }
+            for collection, start_id, end_id, weight in ranges
+            for chunk_start in range(start_id, end_id + 1, chunk_size)
+        ])
+        session.flush()
+        return _job_to_dict(job, _progress(session, [job_id])[job_id])
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with connect_db() as session:
+        job = session.get(ParseJob, job_id)
+        if job is None:
+            return None
+        return _job_to_dict(job, _progress(session, [job_id])[job_id])
+
+
+def list_jobs(limit: int = 100) -> List[dict]:
+    """Последние задачи, от новых к старым."""
+    with connect_db() as session:
+        jobs = session.query(ParseJob).order_by(ParseJob.created_at.desc()).limit(limit).all()
+        progress = _progress(session, [job.id for job in jobs])
+        return [_job_to_dict(job, progress[job.id]) for job in jobs]
+
+
+def set_job_status(job_id: str, status: JobStatus, allowed_from=None) -> Optional[JobStatus]:
+    """
+    Сменить статус задачи.
+
+    Если задан `allowed_from`, статус меняется только из перечисленных.
+    Возвращает статус задачи после вызова (None — задача не найдена).
+    """
+    with connect_db() as session:
+        job = session.get(ParseJob, job_id)
+        if job is None:
+            return None
+        if allowed_from is not None and job.status not in allowed_from:
+            return job.status
+        now = datetime.now()
+        job.status = status
+        job.updated_at = now
+        if status in FINISHED_STATUSES:
+            job.finished_at = now
+        return status
+
+
+def job_status(job_id: str) -> Optional[JobStatus]:
+    with connect_db() as session:
+        job = session.get(ParseJob, job_id)
+        return job.status if job else None
+
+
+def _next_collection(session, job_id: str) -> Optional[str]:
+    """
+    Коллекция, чей чанк задачи брать следующим (взвешенная справедливая очередь).
+
+    Для каждой коллекции с ещё не взятыми чанками считается, сколько ID
+    уже отдано воркерам, делённое на вес; берётся коллекция с наименьшим
+    значением. Так маленькие коллекции не ждут, пока пройдёт большая, а
+    при равных весах все коллекции продвигаются с одинаковой скоростью.
+    """
+    pending = ParseJobChunk.status == JobStatus.PENDING
+    served = func.sum(case(
+        # Отданный обратно чанк учитывается по контрольной точке
+        (pending, ParseJobChunk.next_id - ParseJobChunk.start_id),
+        else_=ParseJobChunk.end_id - ParseJobChunk.start_id + 1,
+    ))
+    rows = (
+        session.query(ParseJobChunk.collection, served, func.max(ParseJobChunk.weight))
+        .filter(ParseJobChunk.job_id == job_id)
+        .group_by(ParseJobChunk.collection)
+        .having(func.sum(case((pending, 1), else_=0)) > 0)
+        .all()
+    )
+    if not rows:
+        return None
+    collection, _, _ = min(rows, key=lambda row: (row[1] / max(row[2], 1e-9), row[0]))
+    return collection
+
+
+def claim_chunk(job_id: str) -> Optional[dict]:
+    """Забрать следующий свободный чанк задачи (атомарно помечается как running)."""
+    with connect_db() as session:
+        while True:
+            collection = _next_collection(session, job_id)
+            if collection is None:
+                return None
+            chunk_id = (
+                session.query(ParseJobChunk.id)
+                .filter(
+                    ParseJobChunk.job_id == job_id,
+                    ParseJobChunk.collection == collection,
+                    ParseJobChunk.status == JobStatus.PENDING,
+                )
+                .order_by(ParseJobChunk.start_id)
+                .limit(1)
+                .scalar()
+            )
+            if chunk_id is None:
+                continue
+            # Условный UPDATE: если чанк уже забрал другой воркер, ищем следующий
+            claimed = session.execute(
+                update(ParseJobChunk)
+                .where(ParseJobChunk.id == chunk_id, ParseJobChunk.status == JobStatus.PENDING)
+                .values(status=JobStatus.RUNNING, updated_at=datetime.now())
+            ).rowcount
+            if claimed:
+                return _chunk_to_dict(session.get(ParseJobChunk, chunk_id))
+
+
+def checkpoint_chunk(
+    chunk_id: int,
+    next_id: int,
+    success: int,
+    failed: int,
+    skipped: int,
+    finished: bool,
+    deferred: Iterable[int] = (),
+) -> None:
+    """
+    Сохранить контрольную точку чанка.
+
+    `success`/`failed`/`skipped` — приращения с прошлой точки, `deferred` —
+    текущий список ID, ждущих повтора после временного сбоя. Завершённый
+    чанк помечается completed, иначе остаётся running.
+    """
+    with connect_db() as session:
+        session.execute(
+            update(ParseJobChunk)
+            .where(ParseJobChunk.id == chunk_id)
+            .values(
+                next_id=next_id,
+                success=ParseJobChunk.success + success,
+                failed=ParseJobChunk.failed + failed,
+                skipped=ParseJobChunk.skipped + skipped,
+                deferred=_dump_ids(deferred),
+                status=JobStatus.COMPLETED if finished else JobStatus.RUNNING,
+                updated_at=datetime.now(),
+            )
+        )
+
+
+def release_chunk(chunk_id: int) -> None:
+    """Вернуть недоделанный чанк в очередь (пауза, отмена воркера, остановка)."""
+    with connect_db() as session:
+        session.execute(
+            update(ParseJobChunk)
+            .where(ParseJobChunk.id == chunk_id, ParseJobChunk.status == JobStatus.RUNNING)
+            .values(status=JobStatus.PENDING, updated_at=datetime.now())
+        )
+
+
+def has_unfinished_chunks(job_id: str) -> bool:
+    with connect_db() as session:
+        return session.query(
+            session.query(ParseJobChunk)
+            .filter(ParseJobChunk.job_id == job_id, ParseJobChunk.status != JobStatus.COMPLETED)
+            .exists()
+        ).scalar()
+
+
+def recover_jobs() -> List[str]:
+    """
+    Подготовить незавершённые задачи к продолжению после перезапуска.
+
+    Чанки, оставшиеся в состоянии running (процесс упал посреди обработки),
+    возвращаются в очередь — их `next_id` сохранён. Возвращает ID задач,
+    которые нужно запустить снова (pending/running; paused остаются на паузе).
+    """
+    with connect_db() as session:
+        session.execute(
+            update(ParseJobChunk)
+            .where(ParseJobChunk.status == JobStatus.RUNNING)
+            .values(status=JobStatus.PENDING)
+        )
+        rows = (
+            session.query(ParseJob.id)
+            .filter(ParseJob.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
+            .order_by(ParseJob.created_at)
+            .all()
+        )
+        return [job_id for (job_id,) in rows]
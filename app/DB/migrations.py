@@ -0,0 +1,330 @@
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn
+
+from .models import Gift, ParseJobChunk, RecrawlState, gift_collection, normalize_slug, parse_sale_price
+from app.logging_config import get_logger, init_logging
+
+logger = get_logger(__name__)
+
+
+# Каждая миграция идемпотентна: на свежей БД (после create_all) она ничего
+# не меняет, а на старой доводит схему до актуальной. Номер последней
+# применённой миграции хранится в `PRAGMA user_version`.
+
+
+# Сколько повторяющихся имён показывать в ошибке миграции
+DUPLICATES_SHOWN = 20
+
+
+class MigrationError(Exception):
+    """Миграцию нельзя применить автоматически: данные нужно поправить вручную."""
+
+
+def _gift_indexes(conn: Connection) -> None:
+    """
+    Уникальный индекс по `name` и индексы по трейтам.
+
+    Пока в таблице есть гифты с одинаковым именем, уникальный индекс не
+    создать. Сами миграции пользовательские строки не удаляют: миграция
+    останавливается со списком дубликатов, а удалить их можно явно —
+    `python -m app.DB.migrations --drop-duplicate-names`.
+    """
+    duplicates = conn.execute(text(
+        "SELECT name, GROUP_CONCAT(id, ', ') FROM gifts WHERE name IS NOT NULL"
+        " GROUP BY name HAVING COUNT(*) > 1 ORDER BY name"
+    )).all()
+    if duplicates:
+        shown = "; ".join(f"{name!r}: id {ids}" for name, ids in duplicates[:DUPLICATES_SHOWN])
+        more = len(duplicates) - DUPLICATES_SHOWN
+        raise MigrationError(
+            f"gifts.name повторяется у {len(duplicates)} имён, уникальный индекс не создать: "
+            f"{shown}{f' и ещё {more}' if more > 0 else ''}. Удалите лишние строки вручную или "
+            "запустите `python -m app.DB.migrations --drop-duplicate-names` (останется последняя запись)"
+        )
+    _create_indexes(conn, Gift.__table__, "name", "model", "backdrop", "symbol")
+
+
+def drop_duplicate_names(engine=None) -> int:
+    """
+    Удалить гифты с повторяющимся `name`, оставив последнюю запись каждого имени.
+
+    Вызывается только явно (флаг `--drop-duplicate-names`); каждая удалённая
+    строка пишется в лог. Возвращает число удалённых строк.
+    """
+    if engine is None:
+        from .create_database import engine
+
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(Gift.__tablename__):
+            return 0
+        rows = conn.execute(text(
+            "SELECT rowid, id, name FROM gifts WHERE name IS NOT NULL AND rowid NOT IN ("
+            " SELECT MAX(rowid) FROM gifts WHERE name IS NOT NULL GROUP BY name)"
+        )).all()
+        for rowid, gift_id, name in rows:
+            logger.warning("Удаляем дубликат gifts.name: id=%s name=%r", gift_id, name)
+            conn.execute(text("DELETE FROM gifts WHERE rowid = :rowid"), {"rowid": rowid})
+    return len(rows)
+
+
+def _create_indexes(conn: Connection, table, *column_names: str) -> None:
+    """Создать индексы модели, построенные только по указанным колонкам (если их ещё нет)."""
+    for index in table.indexes:
+        if {column.name for column in index.columns} <= set(column_names):
+            index.create(conn, checkfirst=True)
+
+
+def _add_missing_columns(conn: Connection, table) -> None:
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        logger.info("Добавляем колонку %s.%s", table.name, column.name)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+
+def backfill_price_columns(conn: Connection, batch_size: int = 5000) -> int:
+    """
+    Заполнить price_ton/status у записей, сохранённых до появления этих колонок.
+
+    Строки читаются пачками по первичному ключу и обновляются одним
+    executemany на пачку. Возвращает число обновлённых строк.
+    """
+    table = Gift.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(price_ton=bindparam("b_price_ton"), status=bindparam("b_status"))
+    )
+    updated = 0
+    last_id = None
+    while True:
+        query = (
+            select(table.c.id, table.c.sale_price)
+            .where(table.c.status.is_(None), table.c.sale_price.is_not(None))
+            .order_by(table.c.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = conn.execute(query).all()
+        if not rows:
+            break
+        params = []
+        for gift_id, sale_price in rows:
+            price_ton, status = parse_sale_price(sale_price)
+            params.append({"b_id": gift_id, "b_price_ton": price_ton, "b_status": status})
+        conn.execute(stmt, params)
+        updated += len(rows)
+        last_id = rows[-1][0]
+    if updated:
+        logger.info("Backfill price_ton/status: обновлено %s строк", updated)
+    return updated
+
+
+def _gift_price_columns(conn: Connection) -> None:
+    """Колонки price_ton/status, их индексы и заполнение для старых записей."""
+    _add_missing_columns(conn, Gift.__table__)
+    _create_indexes(conn, Gift.__table__, "price_ton", "status")
+    backfill_price_columns(conn)
+
+
+def _job_chunk_skipped(conn: Connection) -> None:
+    """Счётчик пропущенных по негативному кэшу ID у чанков задач."""
+    if inspect(conn).has_table(ParseJobChunk.__tablename__):
+        _add_missing_columns(conn, ParseJobChunk.__table__)
+
+
+def _job_chunk_deferred(conn: Connection) -> None:
+    """Список отложенных (временные сбои) ID у чанков задач."""
+    if inspect(conn).has_table(ParseJobChunk.__tablename__):
+        _add_missing_columns(conn, ParseJobChunk.__table__)
+
+
+def _job_chunk_collection(conn: Connection) -> None:
+    """Коллекция и вес у чанков задач (задачи по нескольким коллекциям)."""
+    if not inspect(conn).has_table(ParseJobChunk.__tablename__):
+        return
+    _add_missing_columns(conn, ParseJobChunk.__table__)
+    # Старые задачи — одноколлекционные: коллекция чанка берётся из задачи
+    conn.execute(text(
+        "UPDATE parse_job_chunks SET collection = ("
+        " SELECT collection FROM parse_jobs WHERE parse_jobs.id = parse_job_chunks.job_id)"
+        " WHERE collection = ''"
+    ))
+
+
+def _gift_rarity_rank(conn: Connection) -> None:
+    """Место гифта по редкости внутри коллекции."""
+    _add_missing_columns(conn, Gift.__table__)
+
+
+def _gift_collection_key(conn: Connection, batch_size: int = 5000) -> None:
+    """
+    Составной первичный ключ гифтов (id, collection).
+
+    SQLite не умеет менять первичный ключ, поэтому таблица пересоздаётся:
+    старая переименовывается, новая создаётся по модели, строки копируются,
+    а slug коллекции выводится из имени пачками по `id`.
+    """
+    if any(column["primary_key"] for column in inspect(conn).get_columns(Gift.__tablename__)
+           if column["name"] == "collection"):
+        return
+    # Индексы переезжают вместе с переименованной таблицей и заняли бы имена новых
+    index_names = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'gifts' AND sql IS NOT NULL"
+    )).scalars().all()
+    for name in index_names:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    # legacy_alter_table: внешние ключи других таблиц остаются ссылками на `gifts`
+    conn.execute(text("PRAGMA legacy_alter_table = ON"))
+    conn.execute(text("ALTER TABLE gifts RENAME TO gifts_old"))
+    conn.execute(text("PRAGMA legacy_alter_table = OFF"))
+    Gift.__table__.create(conn)
+
+    existing = {column["name"] for column in inspect(conn).get_columns("gifts_old")}
+    columns = ", ".join(
+        column.name for column in Gift.__table__.columns
+        if column.name in existing and column.name != "collection"
+    )
+    conn.execute(text(f"INSERT INTO gifts ({columns}) SELECT {columns} FROM gifts_old"))
+    conn.execute(text("DROP TABLE gifts_old"))
+
+    # Старые id уникальны, поэтому до заполнения slug строку однозначно задаёт id
+    table = Gift.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(collection=bindparam("b_collection"))
+    )
+    copied = 0
+    last_id = None
+    while True:
+        query = select(table.c.id, table.c.name).order_by(table.c.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = conn.execute(query).all()
+        if not rows:
+            break
+        params = [
+            {"b_id": gift_id, "b_collection": gift_collection(name)}
+            for gift_id, name in rows
+        ]
+        conn.execute(stmt, params)
+        copied += len(rows)
+        last_id = rows[-1][0]
+    logger.info("Гифты перенесены на ключ (id, collection): %s строк", copied)
+
+
+def _recrawl_state_collection_key(conn: Connection) -> None:
+    """Состояние планировщика обновлений по ключу гифта (collection, number) вместо `gifts.id`."""
+    table = RecrawlState.__tablename__
+    if not inspect(conn).has_table(table):
+        return
+    if "gift_id" not in {column["name"] for column in inspect(conn).get_columns(table)}:
+        return
+    index_names = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"
+    ), {"table": table}).scalars().all()
+    for name in index_names:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_old"))
+    RecrawlState.__table__.create(conn)
+    columns = ", ".join(column.name for column in RecrawlState.__table__.columns)
+    # collection/number уже хранились в строках: история проверок переносится как есть
+    conn.execute(text(
+        f"INSERT OR IGNORE INTO {table} ({columns}) SELECT {columns} FROM {table}_old"
+    ))
+    conn.execute(text(f"DROP TABLE {table}_old"))
+
+
+def _normalize_collection_slugs(conn: Connection) -> None:
+    """
+    Привести slug коллекций гифтов к `normalize_slug`.
+
+    Парсер одно время писал slug так, как его ввёл пользователь ('PlushPepe'),
+    а миграция 7 — выведенный из имени ('plushpepe'). Если после приведения
+    ключ (id, collection) совпадёт с уже существующим, UPDATE упадёт на
+    первичном ключе, и миграция остановится: такие строки надо разобрать вручную.
+    """
+    tables = [Gift.__tablename__]
+    if inspect(conn).has_table(RecrawlState.__tablename__):
+        tables.append(RecrawlState.__tablename__)
+    for table in tables:
+        slugs = conn.execute(text(f"SELECT DISTINCT collection FROM {table}")).scalars().all()
+        for slug in slugs:
+            normalized = normalize_slug(slug)
+            if normalized == slug:
+                continue
+            updated = conn.execute(
+                text(f"UPDATE {table} SET collection = :normalized WHERE collection = :slug"),
+                {"normalized": normalized, "slug": slug},
+            ).rowcount
+            logger.info("%s: slug %r -> %r (%s строк)", table, slug, normalized, updated)
+
+
+def _gift_name_nocase_index(conn: Connection) -> None:
+    """Индекс `name COLLATE NOCASE` для регистронезависимого поиска по префиксу."""
+    _create_indexes(conn, Gift.__table__, "name")
+
+
+def _gift_collection_index(conn: Connection) -> None:
+    """Индекс по slug коллекции: пересчёт редкости и оценок выбирает коллекцию целиком."""
+    _create_indexes(conn, Gift.__table__, "collection")
+
+
+MIGRATIONS = [
+    _gift_indexes,
+    _gift_price_columns,
+    _job_chunk_skipped,
+    _job_chunk_deferred,
+    _job_chunk_collection,
+    _gift_rarity_rank,
+    _gift_collection_key,
+    _recrawl_state_collection_key,
+    _normalize_collection_slugs,
+    _gift_name_nocase_index,
+    _gift_collection_index,
+]
+
+
+def migrate(engine=None) -> int:
+    """
+    Применить недостающие миграции к существующей БД.
+
+    Возвращает номер версии схемы после миграции.
+    """
+    if engine is None:
+        from .create_database import engine
+
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(Gift.__tablename__):
+            # Таблиц ещё нет — их создаст create_all, мигрировать нечего
+            return 0
+        version = conn.execute(text("PRAGMA user_version")).scalar() or 0
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            logger.info("Применяем миграцию %s: %s", number, migration.__name__)
+            migration(conn)
+            conn.execute(text(f"PRAGMA user_version = {number}"))
+            version = number
+    return version
+
+
+if __name__ == "__main__":
+    # python -m app.DB.migrations [--drop-duplicate-names] — обновить схему существующей gifts.db
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Миграции схемы gifts.db")
+    parser.add_argument(
+        "--drop-duplicate-names", action="store_true",
+        help="удалить гифты с повторяющимся именем (остаётся последняя запись)",
+    )
+    args = parser.parse_args()
+    init_logging()
+    if args.drop_duplicate_names:
+        logger.info("Удалено дубликатов gifts.name: %s", drop_duplicate_names())
+    logger.info("Версия схемы: %s", migrate())
@@ -1,28 +1,262 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+import enum
+import re
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, ForeignKeyConstraint, Index, Text
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
+from typing import Optional, Tuple
 
 Base = declarative_base()
 
 
+class GiftStatus(str, enum.Enum):
+    """Статус гифта на fragment.com, выводится из sale_price."""
+
+    FOR_SALE = "for_sale"
+    MINTED = "minted"
+    UNKNOWN = "unknown"
+
+
+def parse_sale_price(sale_price) -> Tuple[Optional[float], Optional[GiftStatus]]:
+    """
+    Разобрать sale_price ("1,250", "12 000.5", "Minted", 1250) в (price_ton, status).
+
+    Нечисловой статус, отличный от 'Minted', даёт (None, UNKNOWN),
+    а отсутствующая цена — (None, None).
+    """
+    if sale_price is None:
+        return None, None
+    if isinstance(sale_price, (int, float)):
+        return float(sale_price), GiftStatus.FOR_SALE
+
+    value = str(sale_price).strip()
+    if not value:
+        return None, None
+    if value.lower() == GiftStatus.MINTED.value:
+        return None, GiftStatus.MINTED
+
+    # Разделители тысяч: запятые и (неразрывные) пробелы
+    cleaned = "".join(value.replace(",", "").split())
+    try:
+        return float(cleaned), GiftStatus.FOR_SALE
+    except ValueError:
+        return None, GiftStatus.UNKNOWN
+
+
+def normalize_slug(slug: Optional[str]) -> str:
+    """
+    Slug коллекции в том виде, в каком он хранится в `gifts.collection`.
+
+    Регистр и всё, кроме латиницы и цифр, отбрасываются: 'PlushPepe',
+    'plush-pepe' и имя 'Plush Pepe' дают один и тот же 'plushpepe'.
+    """
+    return re.sub(r"[^A-Za-z0-9]", "", slug or "").lower()
+
+
+def split_gift_name(name: str) -> Optional[tuple]:
+    """
+    Разобрать имя гифта в (slug коллекции, номер).
+
+    'Plush Pepe #2773' -> ('plushpepe', 2773). Если номера в имени нет — None.
+    """
+    match = re.match(r"^(.*?)\s*#(\d+)$", (name or "").strip())
+    if not match:
+        return None
+    slug = normalize_slug(match.group(1))
+    return (slug, int(match.group(2))) if slug else None
+
+
+def gift_collection(name: str) -> str:
+    """Slug коллекции по имени гифта ('' — имя без номера)."""
+    parts = split_gift_name(name)
+    return parts[0] if parts else ""
+
+
 class Gift(Base):
     __tablename__ = 'gifts'
 
-    # Используем `id` как первичный ключ — это соответствует контракту API
-    # Значения `id` приходят из внешнего источника (парсер), поэтому
-    # отключаем autoincrement, чтобы не перезаписывать внешние ID.
+    # `id` — номер гифта внутри коллекции (контракт API), он повторяется
+    # в разных коллекциях: 'lootbag-5' и 'plushpepe-5' — разные гифты.
+    # Поэтому первичный ключ составной: (id, slug коллекции). Порядок
+    # колонок позволяет индексу PK обслуживать сортировку и курсор по id.
+    # Значения приходят из внешнего источника (парсер), autoincrement отключён.
+    # Отдельный индекс по collection — для выборки всей коллекции (редкость, оценки).
     id = Column(Integer, primary_key=True, autoincrement=False)
+    collection = Column(String, primary_key=True, default="", server_default="", index=True)
 
-    name = Column(String)
-    model = Column(String)
-    backdrop = Column(String)
-    symbol = Column(String)
+    # Имя уникально и индексировано: по нему ищут GET/PUT/PATCH /gifts/{gift_name}
+    # и проверка дубликатов при записи. Трейты индексируются для фильтров и статистики.
+    name = Column(String, unique=True, index=True)
+    model = Column(String, index=True)
+    backdrop = Column(String, index=True)
+    symbol = Column(String, index=True)
 
     # sale_price может быть числом или статусом (например, 'Minted'),
     # поэтому храним его как текст (nullable).
     sale_price = Column(String, nullable=True)
+    # Числовая цена и статус, разобранные из sale_price при парсинге,
+    # чтобы фильтровать и сортировать по цене средствами SQL.
+    price_ton = Column(Float, nullable=True, index=True)
+    status = Column(
+        Enum(
+            GiftStatus,
+            native_enum=False,
+            length=16,
+            values_callable=lambda statuses: [s.value for s in statuses],
+        ),
+        nullable=True,
+        index=True,
+    )
 
     rarity_score = Column(Float, nullable=True)
+    # Место по редкости внутри коллекции (1 — самый редкий), см. app.price_calculator
+    rarity_rank = Column(Integer, nullable=True)
     estimated_price = Column(Float, nullable=True)
     # Сохраняем время добавления с дефолтным значением
     date_added = Column(DateTime, default=datetime.utcnow)
+
+
+# LIKE в SQLite не различает регистр ASCII и использует индекс, только если
+# он построен с NOCASE: для поиска по префиксу имени (`name LIKE 'prefix%'`)
+Index("ix_gifts_name_nocase", Gift.name.collate("NOCASE"))
+
+
+class JobStatus(str, enum.Enum):
+    """Состояние задачи массового парсинга (и её чанков)."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    PAUSED = "paused"
+    CANCELLED = "cancelled"
+    COMPLETED = "completed"
+
+
+def _status_column(enum_cls, length: int = 16, **kwargs):
+    return Column(
+        Enum(
+            enum_cls,
+            native_enum=False,
+            length=length,
+            values_callable=lambda statuses: [s.value for s in statuses],
+        ),
+        **kwargs,
+    )
+
+
+class ParseJob(Base):
+    """
+    Задача массового парсинга диапазонов ID одной или нескольких коллекций.
+
+    У многоколлекционной задачи `collection` — имена коллекций через
+    запятую, `start_id`/`end_id` — границы объединения диапазонов; сами
+    диапазоны задают чанки.
+    """
+
+    __tablename__ = 'parse_jobs'
+
+    id = Column(String(32), primary_key=True)
+    collection = Column(String, nullable=False)
+    start_id = Column(Integer, nullable=False)
+    end_id = Column(Integer, nullable=False)
+    concurrency = Column(Integer, nullable=False)
+    status = _status_column(JobStatus, nullable=False, default=JobStatus.PENDING, index=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ParseJobChunk(Base):
+    """
+    Часть диапазона задачи, которую берёт один воркер.
+
+    `next_id` — контрольная точка: все ID меньше него уже разобраны и
+    записаны в БД, после перезапуска обработка продолжается с него.
+    """
+
+    __tablename__ = 'parse_job_chunks'
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String(32), ForeignKey('parse_jobs.id'), nullable=False, index=True)
+    collection = Column(String, nullable=False, default="", server_default="")
+    # Доля коллекции в общей пропускной способности задачи (взвешенная очерёдность чанков)
+    weight = Column(Float, nullable=False, default=1.0, server_default="1")
+    start_id = Column(Integer, nullable=False)
+    end_id = Column(Integer, nullable=False)
+    next_id = Column(Integer, nullable=False)
+    status = _status_column(JobStatus, nullable=False, default=JobStatus.PENDING, index=True)
+    success = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    # ID, пропущенные по негативному кэшу (заведомо пустые)
+    skipped = Column(Integer, nullable=False, default=0, server_default="0")
+    # ID с временными сбоями (сеть, 429/5xx), ждущие повтора: через запятую
+    deferred = Column(Text, nullable=False, default="", server_default="")
+    updated_at = Column(DateTime, default=datetime.now)
+
+
+class ParseOutcome(str, enum.Enum):
+    """Итог разбора одного ID на fragment.com."""
+
+    OK = "ok"
+    NOT_FOUND = "not_found"
+    INSUFFICIENT_DATA = "insufficient_data"
+    NETWORK_ERROR = "network_error"
+    # Временный HTTP-статус (408/425/429/5xx), запрос стоит повторить
+    HTTP_ERROR = "http_error"
+    # Остальные статусы (403, 410, ...): сервер отказал окончательно
+    HTTP_REJECTED = "http_rejected"
+    # Непредвиденная ошибка обработки страницы (разбор, кэш): повтор не поможет
+    PARSE_ERROR = "parse_error"
+    # Страница получена и разобрана, но гифт не записан в БД
+    DB_ERROR = "db_error"
+
+
+class NegativeResult(Base):
+    """
+    Негативный кэш: ID коллекции, по которым гифт не удалось получить.
+
+    По `outcome` и `seen_at` парсер решает, можно ли пропустить ID при
+    повторном обходе (TTL задаётся отдельно для каждого исхода).
+    """
+
+    __tablename__ = 'negative_results'
+
+    collection = Column(String, primary_key=True)
+    gift_id = Column(Integer, primary_key=True, autoincrement=False)
+    outcome = _status_column(ParseOutcome, length=24, nullable=False)
+    seen_at = Column(DateTime, nullable=False, default=datetime.now)
+    seen_count = Column(Integer, nullable=False, default=1)
+
+
+class CollectionSize(Base):
+    """Найденный автоопределением максимальный ID коллекции."""
+
+    __tablename__ = 'collection_sizes'
+
+    collection = Column(String, primary_key=True)
+    max_id = Column(Integer, nullable=False)
+    probes = Column(Integer, nullable=False, default=0)
+    discovered_at = Column(DateTime, nullable=False, default=datetime.now)
+
+
+class RecrawlState(Base):
+    """
+    История повторных проверок гифта для планировщика обновлений.
+
+    По числу проверок и наблюдённых изменений цены оценивается, как часто
+    гифт меняется, и из этого — когда его проверять снова (`next_due_at`).
+    Гифт задаётся тем же ключом, что и в `gifts`: slug коллекции и номер
+    (`Gift.collection`, `Gift.id`).
+    """
+
+    __tablename__ = 'recrawl_state'
+    __table_args__ = (
+        ForeignKeyConstraint(["number", "collection"], ["gifts.id", "gifts.collection"]),
+    )
+
+    collection = Column(String, primary_key=True)
+    number = Column(Integer, primary_key=True, autoincrement=False)
+    last_price = Column(String, nullable=True)
+    checks = Column(Integer, nullable=False, default=0)
+    changes = Column(Integer, nullable=False, default=0)
+    last_checked_at = Column(DateTime, nullable=True)
+    last_changed_at = Column(DateTime, nullable=True)
+    next_due_at = Column(DateTime, nullable=False, index=True)
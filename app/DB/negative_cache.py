@@ -0,0 +1,156 @@
+"""
+Негативный кэш результатов парсинга.
+
+Для каждого ID коллекции, по которому гифт не получен (404, недостаточно
+данных, сетевая ошибка), хранится исход и время, когда он был получен.
+При повторном обходе ID пропускается, пока не истёк TTL его исхода.
+Успешный разбор удаляет запись — ID снова считается живым. Ошибка записи
+в БД (`DB_ERROR`) ничего не говорит о странице и в кэш не попадает.
+Записи с истёкшим TTL удаляет `purge_expired` — её вызывает исполнитель
+задач парсинга после каждой завершённой задачи (только задачи и пополняют кэш).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from sqlalchemy import and_, delete, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .create_database import connect_db
+from .models import NegativeResult, ParseOutcome
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# TTL по исходам: 404 и «недостаточно данных» меняются редко, сетевые ошибки
+# стоит перепроверять скоро, а 429/5xx — признак перегрузки, их не кэшируем.
+# Прочие отказы (403, 410, ...) окончательны, но проверяются снова через сутки.
+# Ошибки разбора тоже не кэшируем: после исправления парсера ID нужен снова.
+DEFAULT_TTLS = {
+    ParseOutcome.NOT_FOUND: timedelta(days=7),
+    ParseOutcome.INSUFFICIENT_DATA: timedelta(days=1),
+    ParseOutcome.NETWORK_ERROR: timedelta(hours=1),
+    ParseOutcome.HTTP_ERROR: timedelta(0),
+    ParseOutcome.HTTP_REJECTED: timedelta(days=1),
+    ParseOutcome.PARSE_ERROR: timedelta(0),
+}
+
+_ttls: Dict[ParseOutcome, timedelta] = dict(DEFAULT_TTLS)
+
+# Исходы, которые не меняют кэш: не добавляют запись и не удаляют существующую
+IGNORED_OUTCOMES = frozenset({ParseOutcome.DB_ERROR})
+
+# Параметров в одном запросе не больше лимита SQLite
+ROWS_PER_STATEMENT = 500
+
+
+def configure_negative_ttls(**hours: float) -> Dict[ParseOutcome, timedelta]:
+    """
+    Задать TTL (в часах) для исходов: `not_found=168, network_error=1, ...`.
+
+    TTL 0 — исход записывается, но ID не пропускается.
+    """
+    for name, value in hours.items():
+        _ttls[ParseOutcome(name)] = timedelta(hours=value)
+    return dict(_ttls)
+
+
+def _active_clause(now: datetime):
+    """Условие «запись ещё действует» с учётом TTL её исхода."""
+    clauses = [
+        and_(NegativeResult.outcome == outcome, NegativeResult.seen_at >= now - ttl)
+        for outcome, ttl in _ttls.items()
+        if outcome != ParseOutcome.OK and ttl > timedelta(0)
+    ]
+    return or_(*clauses) if clauses else None
+
+
+def known_negative_ids(
+    collection: str, start_id: int, end_id: int, now: Optional[datetime] = None
+) -> Set[int]:
+    """ID из диапазона, которые можно пропустить: их негативный исход ещё не устарел."""
+    active = _active_clause(now or datetime.now())
+    if active is None:
+        return set()
+    with connect_db() as session:
+        rows = (
+            session.query(NegativeResult.gift_id)
+            .filter(
+                NegativeResult.collection == collection,
+                NegativeResult.gift_id.between(start_id, end_id),
+                active,
+            )
+            .all()
+        )
+        return {gift_id for (gift_id,) in rows}
+
+
+def record_outcomes(collection: str, outcomes: Dict[int, ParseOutcome]) -> None:
+    """
+    Сохранить исходы разбора пачки ID.
+
+    Негативные исходы upsert'ятся (время и счётчик обновляются), успешные
+    удаляют запись из кэша, `IGNORED_OUTCOMES` пропускаются.
+    """
+    if not outcomes:
+        return
+    now = datetime.now()
+    negative = [
+        {"collection": collection, "gift_id": gift_id, "outcome": outcome, "seen_at": now, "seen_count": 1}
+        for gift_id, outcome in outcomes.items()
+        if outcome != ParseOutcome.OK and outcome not in IGNORED_OUTCOMES
+    ]
+    positive = [gift_id for gift_id, outcome in outcomes.items() if outcome == ParseOutcome.OK]
+
+    with connect_db() as session:
+        for i in range(0, len(negative), ROWS_PER_STATEMENT):
+            stmt = sqlite_insert(NegativeResult).values(negative[i:i + ROWS_PER_STATEMENT])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[NegativeResult.collection, NegativeResult.gift_id],
+                set_={
+                    "outcome": stmt.excluded.outcome,
+                    "seen_at": stmt.excluded.seen_at,
+                    "seen_count": NegativeResult.seen_count + 1,
+                },
+            )
+            session.execute(stmt)
+        for i in range(0, len(positive), ROWS_PER_STATEMENT):
+            session.execute(
+                delete(NegativeResult).where(
+                    NegativeResult.collection == collection,
+                    NegativeResult.gift_id.in_(positive[i:i + ROWS_PER_STATEMENT]),
+                )
+            )
+
+
+def purge_expired(now: Optional[datetime] = None) -> int:
+    """Удалить записи с истёкшим TTL. Возвращает число удалённых строк."""
+    active = _active_clause(now or datetime.now())
+    with connect_db() as session:
+        stmt = delete(NegativeResult)
+        if active is not None:
+            stmt = stmt.where(~active)
+        removed = session.execute(stmt).rowcount
+    if removed:
+        logger.info("Негативный кэш: удалено %s устаревших записей", removed)
+    return removed
+
+
+def negative_cache_stats(collection: Optional[str] = None) -> dict:
+    """Число записей по исходам (и сколько из них ещё действует)."""
+    active = _active_clause(datetime.now())
+    with connect_db() as session:
+        query = session.query(NegativeResult.outcome, func.count())
+        if collection is not None:
+            query = query.filter(NegativeResult.collection == collection)
+        total = dict(query.group_by(NegativeResult.outcome).all())
+        active_counts = dict(query.filter(active).group_by(NegativeResult.outcome).all()) if active is not None else {}
+    return {
+        outcome.value: {
+            "total": total.get(outcome, 0),
+            "active": active_counts.get(outcome, 0),
+            "ttl_hours": _ttls[outcome].total_seconds() / 3600,
+        }
+        for outcome in _ttls
+    }
@@ -0,0 +1,169 @@
+"""
+Состояние планировщика повторных проверок (`recrawl_state`).
+
+Таблица играет роль персистентной очереди с приоритетом: индекс по
+`next_due_at` отдаёт самые «просроченные» гифты первыми. Функции
+синхронные: из async-кода их вызывают через `run_db`.
+"""
+
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy import and_, bindparam, func, tuple_, update
+
+from .create_database import connect_db
+from .models import Gift, GiftStatus, RecrawlState
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Строка состояния относится к гифту с тем же slug коллекции и номером
+_GIFT_JOIN = and_(RecrawlState.collection == Gift.collection, RecrawlState.number == Gift.id)
+
+
+def seed_recrawl_state(
+    first_due: Callable[[Optional[GiftStatus], datetime], datetime],
+    batch_size: int = 5000,
+) -> int:
+    """
+    Завести состояние для гифтов, которых ещё нет в очереди.
+
+    Гифт задаётся ключом (`Gift.collection`, `Gift.id`) — тем же slug и
+    номером, по которым строится его URL. `first_due` задаёт время первой
+    проверки по статусу и дате добавления. Гифты без slug коллекции
+    пропускаются. Возвращает число добавленных записей.
+    """
+    added = 0
+    last_key = None
+    while True:
+        with connect_db() as session:
+            query = (
+                session.query(Gift.id, Gift.collection, Gift.status, Gift.sale_price, Gift.date_added)
+                .outerjoin(RecrawlState, _GIFT_JOIN)
+                .filter(RecrawlState.number.is_(None), Gift.collection != "")
+            )
+            if last_key is not None:
+                query = query.filter(tuple_(Gift.id, Gift.collection) > tuple_(*last_key))
+            rows = query.order_by(Gift.id, Gift.collection).limit(batch_size).all()
+            if not rows:
+                break
+            now = datetime.now()
+            mappings = [
+                {
+                    "collection": collection,
+                    "number": number,
+                    "last_price": sale_price,
+                    "checks": 0,
+                    "changes": 0,
+                    "next_due_at": first_due(status, date_added or now),
+                }
+                for number, collection, status, sale_price, date_added in rows
+            ]
+            session.bulk_insert_mappings(RecrawlState, mappings)
+            added += len(mappings)
+            last_key = (rows[-1][0], rows[-1][1])
+    if added:
+        logger.info("Планировщик обновлений: добавлено %s гифтов", added)
+    return added
+
+
+def due_gifts(limit: int, now: Optional[datetime] = None) -> List[dict]:
+    """Гифты, которые пора проверить, от самых просроченных."""
+    with connect_db() as session:
+        rows = (
+            session.query(RecrawlState, Gift.status)
+            .join(Gift, _GIFT_JOIN)
+            .filter(RecrawlState.next_due_at <= (now or datetime.now()))
+            .order_by(RecrawlState.next_due_at)
+            .limit(limit)
+            .all()
+        )
+        return [
+            {
+                "collection": state.collection,
+                "number": state.number,
+                "last_price": state.last_price,
+                "checks": state.checks,
+                "changes": state.changes,
+                "status": status,
+            }
+            for state, status in rows
+        ]
+
+
+def apply_checks(updates: Iterable[dict]) -> int:
+    """
+    Записать итоги проверок одним executemany.
+
+    Каждый элемент: collection, number, last_price, checks, changes,
+    last_checked_at, last_changed_at (None — не менять), next_due_at.
+    """
+    params = [
+        {
+            "b_collection": item["collection"],
+            "b_number": item["number"],
+            "b_last_price": item["last_price"],
+            "b_checks": item["checks"],
+            "b_changes": item["changes"],
+            "b_checked": item["last_checked_at"],
+            "b_changed": item["last_changed_at"],
+            "b_next_due": item["next_due_at"],
+        }
+        for item in updates
+    ]
+    if not params:
+        return 0
+    table = RecrawlState.__table__
+    stmt = (
+        update(table)
+        .where(table.c.collection == bindparam("b_collection"), table.c.number == bindparam("b_number"))
+        .values(
+            last_price=bindparam("b_last_price"),
+            checks=bindparam("b_checks"),
+            changes=bindparam("b_changes"),
+            last_checked_at=bindparam("b_checked"),
+            last_changed_at=func.coalesce(bindparam("b_changed"), table.c.last_changed_at),
+            next_due_at=bindparam("b_next_due"),
+        )
+    )
+    with connect_db() as session:
+        session.execute(stmt, params)
+    return len(params)
+
+
+def recrawl_stats(now: Optional[datetime] = None) -> dict:
+    """Размер очереди, сколько гифтов уже просрочено и сводка по статусам."""
+    now = now or datetime.now()
+    with connect_db() as session:
+        total = session.query(func.count(RecrawlState.number)).scalar()
+        due = (
+            session.query(func.count(RecrawlState.number))
+            .filter(RecrawlState.next_due_at <= now)
+            .scalar()
+        )
+        by_status = (
+            session.query(
+                Gift.status,
+                func.count(RecrawlState.number),
+                func.sum(RecrawlState.checks),
+                func.sum(RecrawlState.changes),
+                func.min(RecrawlState.next_due_at),
+            )
+            .join(Gift, _GIFT_JOIN)
+            .group_by(Gift.status)
+            .all()
+        )
+    return {
+        "tracked": total,
+        "due": due,
+        "by_status": {
+            (status.value if status else "none"): {
+                "gifts": count,
+                "checks": checks or 0,
+                "changes": changes or 0,
+                "next_due_at": next_due,
+            }
+            for status, count, checks, changes, next_due in by_status
+        },
+    }
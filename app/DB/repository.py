@@ -0,0 +1,229 @@
+"""
+Доступ к таблице `gifts` для API.
+
+Синхронные функции работают через обычную сессию SQLAlchemy и возвращают
+простые словари (объекты ORM не переживают закрытие сессии). Списки
+гифтов выбираются только нужными колонками (кортежами, без создания
+объектов ORM) — на больших страницах это основная часть времени запроса. Из async-кода
+их нужно вызывать через `run_db`, который выполняет запрос в ограниченном
+пуле потоков и не блокирует event loop.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import select, tuple_
+
+from .create_database import connect_db
+from .models import Gift, GiftStatus, parse_sale_price
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+GIFT_FIELDS = ("id", "collection", "name", "model", "backdrop", "symbol", "sale_price", "price_ton", "status")
+GIFT_COLUMNS = tuple(getattr(Gift, field) for field in GIFT_FIELDS)
+
+# Значений в одном `IN (...)` при массовом поиске (лимит параметров SQLite — 999 в старых сборках)
+LOOKUP_CHUNK_SIZE = 500
+
+DEFAULT_DB_WORKERS = 8
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def configure_db_executor(max_workers: int = DEFAULT_DB_WORKERS) -> None:
+    """Создать пул потоков для запросов к БД (вызывается при старте приложения)."""
+    global _executor
+    shutdown_db_executor()
+    _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+
+def shutdown_db_executor() -> None:
+    """Остановить пул потоков БД (вызывается при остановке приложения)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_db(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Выполнить синхронную функцию работы с БД в пуле потоков.
+
+    Размер пула ограничен, поэтому медленные запросы не занимают все
+    соединения SQLAlchemy и не блокируют обработку других запросов.
+    """
+    if _executor is None:
+        configure_db_executor()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+def gift_to_dict(gift: Gift) -> dict:
+    return {field: getattr(gift, field) for field in GIFT_FIELDS}
+
+
+def _filtered_gifts(
+    query,
+    status: Optional[GiftStatus],
+    min_price: Optional[float],
+    max_price: Optional[float],
+):
+    if status is not None:
+        query = query.where(Gift.status == status)
+    if min_price is not None:
+        query = query.where(Gift.price_ton >= min_price)
+    if max_price is not None:
+        query = query.where(Gift.price_ton <= max_price)
+    return query
+
+
+def _gift_rows(session, query) -> List[dict]:
+    return [dict(zip(GIFT_FIELDS, row)) for row in session.execute(query)]
+
+
+def count_gifts() -> int:
+    with connect_db() as session:
+        return session.query(Gift).count()
+
+
+def list_gifts(
+    limit: int = 100,
+    offset: int = 0,
+    status: Optional[GiftStatus] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: str = "id",
+) -> List[dict]:
+    """Страница гифтов с фильтрами по статусу/цене и сортировкой по id или цене."""
+    query = _filtered_gifts(select(*GIFT_COLUMNS), status, min_price, max_price)
+    if sort == "price_asc":
+        query = query.order_by(Gift.price_ton.asc().nulls_last(), Gift.id, Gift.collection)
+    elif sort == "price_desc":
+        query = query.order_by(Gift.price_ton.desc().nulls_last(), Gift.id, Gift.collection)
+    else:
+        query = query.order_by(Gift.id, Gift.collection)
+
+    with connect_db() as session:
+        return _gift_rows(session, query.limit(limit).offset(offset))
+
+
+def list_gifts_after(
+    after_id: int = 0,
+    limit: int = 100,
+    status: Optional[GiftStatus] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    after_collection: Optional[str] = None,
+) -> Tuple[List[dict], bool]:
+    """
+    Keyset-страница: гифты после позиции по возрастанию (id, collection).
+
+    Без `after_collection` берутся гифты с `id > after_id`, с ним — после
+    пары (`after_id`, `after_collection`): номера повторяются в разных
+    коллекциях, и курсор должен различать гифты с одним id.
+
+    В отличие от OFFSET, SQLite сразу переходит к нужному месту по первичному
+    ключу, поэтому время страницы не зависит от глубины. Возвращает
+    (записи, есть_ли_ещё).
+    """
+    if after_collection is None:
+        position = Gift.id > after_id
+    else:
+        position = tuple_(Gift.id, Gift.collection) > tuple_(after_id, after_collection)
+    query = _filtered_gifts(select(*GIFT_COLUMNS).where(position), status, min_price, max_price)
+    with connect_db() as session:
+        # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+        gifts = _gift_rows(session, query.order_by(Gift.id, Gift.collection).limit(limit + 1))
+        return gifts[:limit], len(gifts) > limit
+
+
+def get_gift_by_name(name: str) -> Optional[dict]:
+    with connect_db() as session:
+        gift = session.query(Gift).filter(Gift.name == name).first()
+        return gift_to_dict(gift) if gift else None
+
+
+def lookup_gifts(
+    names: Sequence[str] = (),
+    ids: Sequence[int] = (),
+    chunk_size: int = LOOKUP_CHUNK_SIZE,
+) -> Tuple[Dict[str, dict], Dict[int, List[dict]]]:
+    """
+    Найти много гифтов по именам и ID за несколько запросов `IN (...)`.
+
+    Значения делятся на пачки по `chunk_size`, чтобы не упереться в лимит
+    параметров SQLite. Возвращает ({имя: гифт}, {id: [гифты]}) для найденных:
+    один id может быть у гифтов разных коллекций.
+    """
+    by_name: Dict[str, dict] = {}
+    by_id: Dict[int, List[dict]] = {}
+    with connect_db() as session:
+        names = list(dict.fromkeys(names))
+        for i in range(0, len(names), chunk_size):
+            query = select(*GIFT_COLUMNS).where(Gift.name.in_(names[i:i + chunk_size]))
+            for gift in _gift_rows(session, query):
+                by_name[gift["name"]] = gift
+        ids = list(dict.fromkeys(ids))
+        for i in range(0, len(ids), chunk_size):
+            query = (
+                select(*GIFT_COLUMNS)
+                .where(Gift.id.in_(ids[i:i + chunk_size]))
+                .order_by(Gift.id, Gift.collection)
+            )
+            for gift in _gift_rows(session, query):
+                by_id.setdefault(gift["id"], []).append(gift)
+    return by_name, by_id
+
+
+def _set_sale_price(gift: Gift, sale_price) -> None:
+    # Сохраняем как строку — это позволяет хранить статусы ('Minted') и числа,
+    # а числовая цена и статус хранятся отдельно и не разбираются заново при ответе
+    gift.sale_price = str(sale_price) if sale_price is not None else None
+    gift.price_ton, gift.status = parse_sale_price(gift.sale_price)
+
+
+def update_gift(name: str, values: dict) -> Optional[dict]:
+    """
+    Полное обновление гифта по имени (PUT). Возвращает None, если гифт не найден.
+
+    `rarity_score` и `estimated_price` обновляются, только если переданы не None.
+    """
+    with connect_db() as session:
+        gift = session.query(Gift).filter(Gift.name == name).first()
+        if not gift:
+            return None
+
+        gift.name = values["name"]
+        gift.model = values["model"]
+        gift.backdrop = values["backdrop"]
+        gift.symbol = values["symbol"]
+        _set_sale_price(gift, values.get("sale_price"))
+
+        if values.get("rarity_score") is not None:
+            gift.rarity_score = values["rarity_score"]
+        if values.get("estimated_price") is not None:
+            gift.estimated_price = values["estimated_price"]
+
+        session.flush()
+        return gift_to_dict(gift)
+
+
+def patch_gift(name: str, values: dict) -> Optional[dict]:
+    """Частичное обновление гифта (PATCH): меняются только переданные поля."""
+    with connect_db() as session:
+        gift = session.query(Gift).filter(Gift.name == name).first()
+        if not gift:
+            return None
+
+        if "name" in values:
+            gift.name = values["name"]
+        if "sale_price" in values:
+            _set_sale_price(gift, values["sale_price"])
+
+        session.flush()
+        return gift_to_dict(gift)
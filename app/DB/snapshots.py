@@ -0,0 +1,241 @@
+"""
+Снимки базы данных для выгрузки через `/db/download`.
+
+Снимок делается online backup API SQLite: копия согласована на момент
+начала backup'а, даже если парсер в это время пишет в БД. Затем файл
+сжимается gzip'ом и сохраняется под именем с sha256 содержимого — если
+с прошлого снимка ничего не изменилось, новый файл не создаётся, а
+хэш служит ETag'ом для условных запросов.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .create_database import engine
+from .repository import run_db
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+SNAPSHOT_PREFIX = "gifts-"
+SNAPSHOT_SUFFIX = ".db.gz"
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_SNAPSHOT_DIR = "snapshots"
+DEFAULT_KEEP = 3
+
+
+@dataclass
+class Snapshot:
+    """Сжатый снимок БД на диске."""
+
+    path: str
+    sha256: str
+    size: int
+    created_at: float
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+    @property
+    def filename(self) -> str:
+        return "gifts" + SNAPSHOT_SUFFIX
+
+    def to_dict(self) -> dict:
+        return {
+            "sha256": self.sha256,
+            "size": self.size,
+            "created_at": self.created_at,
+        }
+
+
+def _snapshot_from_path(path: str) -> Optional[Snapshot]:
+    name = os.path.basename(path)
+    if not (name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)):
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    sha256 = name[len(SNAPSHOT_PREFIX):-len(SNAPSHOT_SUFFIX)]
+    return Snapshot(path=path, sha256=sha256, size=stat.st_size, created_at=stat.st_mtime)
+
+
+class SnapshotStore:
+    """
+    Каталог сжатых снимков БД.
+
+    Хранится не более `keep` последних снимков; последним считается снимок
+    с самым свежим временем изменения файла (при повторе содержимого время
+    обновляется, поэтому «последний» всегда соответствует текущей БД).
+    """
+
+    def __init__(self, directory: str = DEFAULT_SNAPSHOT_DIR, keep: int = DEFAULT_KEEP):
+        if keep < 1:
+            raise ValueError("keep должен быть >= 1")
+        self.directory = directory
+        self.keep = keep
+        # Снимки делаются по одному: параллельный backup только удвоит нагрузку на диск
+        self._lock = threading.Lock()
+
+    def list_snapshots(self) -> List[Snapshot]:
+        """Снимки на диске, от новых к старым."""
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for name in os.listdir(self.directory):
+            snapshot = _snapshot_from_path(os.path.join(self.directory, name))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return sorted(snapshots, key=lambda s: s.created_at, reverse=True)
+
+    def latest(self) -> Optional[Snapshot]:
+        snapshots = self.list_snapshots()
+        return snapshots[0] if snapshots else None
+
+    def take(self) -> Snapshot:
+        """Сделать снимок БД (синхронно; из async-кода вызывать через `run_db`)."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            started = time.perf_counter()
+            raw_path = os.path.join(self.directory, f".backup-{os.getpid()}.db")
+            gz_path = raw_path + ".gz"
+            try:
+                self._backup(raw_path)
+                sha256 = self._compress(raw_path, gz_path)
+                path = os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{sha256}{SNAPSHOT_SUFFIX}")
+                if os.path.exists(path):
+                    # Содержимое не изменилось — только отмечаем снимок как самый свежий
+                    os.utime(path)
+                    logger.info("Снимок БД не изменился (%s)", sha256[:12])
+                else:
+                    os.replace(gz_path, path)
+                    logger.info(
+                        "Снимок БД %s: %s байт за %.2f с",
+                        sha256[:12], os.path.getsize(path), time.perf_counter() - started,
+                    )
+            finally:
+                for tmp in (raw_path, gz_path):
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+            self.prune()
+            return _snapshot_from_path(path)
+
+    def prune(self) -> None:
+        """Удалить всё, кроме `keep` последних снимков."""
+        for snapshot in self.list_snapshots()[self.keep:]:
+            try:
+                os.remove(snapshot.path)
+            except FileNotFoundError:
+                pass
+
+    def _backup(self, target_path: str) -> None:
+        # Backup за один шаг выполняется в одной читающей транзакции, поэтому
+        # копия согласована; в режиме WAL он не блокирует запись парсера
+        raw = engine.raw_connection()
+        try:
+            target = sqlite3.connect(target_path)
+            try:
+                raw.driver_connection.backup(target)
+                # Копия — самостоятельный файл, без -wal/-shm рядом
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+        finally:
+            raw.close()
+
+    @staticmethod
+    def _compress(source_path: str, target_path: str) -> str:
+        # mtime=0 делает gzip детерминированным, хэш считается по несжатой БД
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as source, open(target_path, "wb") as target:
+            with gzip.GzipFile(filename="gifts.db", mode="wb", fileobj=target, mtime=0) as gz:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    gz.write(chunk)
+        return digest.hexdigest()
+
+
+class SnapshotScheduler:
+    """Фоновая задача, делающая снимок каждые `interval` секунд."""
+
+    def __init__(self, store: SnapshotStore, interval: float):
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await run_db(self.store.take)
+            except Exception as e:
+                logger.exception("Не удалось сделать снимок БД: %s", e)
+            await asyncio.sleep(self.interval)
+
+
+# Общее хранилище снимков и планировщик для API.
+_default_store: Optional[SnapshotStore] = None
+_scheduler: Optional[SnapshotScheduler] = None
+
+
+def configure_snapshots(directory: str, keep: int, interval: float) -> SnapshotStore:
+    """Задать каталог, число хранимых снимков и период (сек; 0 — только по запросу)."""
+    global _default_store, _scheduler
+    _default_store = SnapshotStore(directory=directory, keep=keep)
+    _scheduler = SnapshotScheduler(_default_store, interval)
+    return _default_store
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """Вернуть общее хранилище, создав его с настройками по умолчанию при необходимости."""
+    global _default_store
+    if _default_store is None:
+        _default_store = SnapshotStore()
+    return _default_store
+
+
+async def start_snapshot_scheduler() -> None:
+    """Запустить периодические снимки (вызывается при старте приложения)."""
+    if _scheduler is not None:
+        await _scheduler.start()
+
+
+async def stop_snapshot_scheduler() -> None:
+    """Остановить периодические снимки (вызывается при остановке приложения)."""
+    if _scheduler is not None:
+        await _scheduler.stop()
+
+
+if __name__ == "__main__":
+    from app.logging_config import init_logging
+
+    init_logging()
+    snapshot = get_snapshot_store().take()
+    logger.info("Снимок БД: %s (%s байт)", snapshot.path, snapshot.size)
@@ -0,0 +1,211 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .create_database import connect_db
+from .models import Gift, gift_collection, normalize_slug
+from .repository import run_db
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Поля, которые парсер обновляет у уже существующей записи.
+# rarity_score / rarity_rank / estimated_price / date_added при повторном парсинге не трогаем.
+UPSERT_FIELDS = ("name", "model", "backdrop", "symbol", "sale_price", "price_ton", "status")
+
+# SQLite ограничивает число параметров в одном запросе, поэтому
+# большой батч пишется несколькими INSERT'ами внутри одной транзакции.
+ROWS_PER_STATEMENT = 500
+
+# Подписчики на записанные гифты (например, инвалидация кэша чтения API)
+_write_listeners: List[Callable[[List[dict]], None]] = []
+
+
+def add_write_listener(listener: Callable[[List[dict]], None]) -> None:
+    """Вызывать `listener(rows)` после каждой успешной записи `upsert_gifts`."""
+    _write_listeners.append(listener)
+
+
+def _notify_listeners(rows: List[dict]) -> None:
+    for listener in _write_listeners:
+        try:
+            listener(rows)
+        except Exception as e:
+            logger.exception("Ошибка обработчика записи гифтов: %s", e)
+
+
+def upsert_gifts(records: Iterable[dict]) -> int:
+    """
+    Записать гифты одним multi-row `INSERT ... ON CONFLICT(id, collection) DO UPDATE`.
+
+    `id` — номер гифта внутри коллекции, поэтому ключ записи — пара
+    (`id`, `collection`). Парсер передаёт slug коллекции в `collection`;
+    если его нет, slug берётся из имени гифта ('Plush Pepe #5' -> 'plushpepe').
+    Slug приводится `normalize_slug`, как и в миграции: 'PlushPepe' и
+    'plushpepe' — одна коллекция.
+    Дубликаты ключа внутри батча схлопываются (побеждает последняя запись).
+    После коммита записанные строки передаются подписчикам `add_write_listener`.
+    Возвращает число записанных строк.
+    """
+    by_key = {}
+    for record in records:
+        collection = normalize_slug(record.get("collection")) or gift_collection(record.get("name"))
+        by_key[(record["id"], collection)] = record
+    if not by_key:
+        return 0
+
+    now = datetime.now()
+    rows = [
+        {
+            "id": gift_id,
+            "collection": collection,
+            **{name: record.get(name) for name in UPSERT_FIELDS},
+            "date_added": now,
+        }
+        for (gift_id, collection), record in by_key.items()
+    ]
+
+    with connect_db() as session:
+        for i in range(0, len(rows), ROWS_PER_STATEMENT):
+            stmt = sqlite_insert(Gift).values(rows[i:i + ROWS_PER_STATEMENT])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Gift.id, Gift.collection],
+                set_={name: stmt.excluded[name] for name in UPSERT_FIELDS},
+            )
+            session.execute(stmt)
+    _notify_listeners(rows)
+    return len(rows)
+
+
+class GiftBatchWriter:
+    """
+    Write-behind запись результатов парсинга.
+
+    Записи складываются в ограниченную очередь, а фоновая задача сбрасывает
+    их в БД пачками: как только набралось `batch_size` записей или прошло
+    `flush_interval` секунд с первой записи в пачке. Полная очередь
+    притормаживает парсер, если БД не успевает.
+
+    `put()` возвращает future с итогом записи: вызывающий код узнаёт, что
+    гифт сохранён, только после коммита его пачки, а об ошибке — по False.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.5, max_pending: int = 2000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+
+    async def start(self) -> None:
+        """Запустить фоновую задачу сброса."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Дописать всё из очереди и остановить фоновую задачу."""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def put(self, record: dict) -> "asyncio.Future[bool]":
+        """
+        Поставить запись в очередь на запись.
+
+        Ожидание `put()` — только место в очереди. Возвращаемый future
+        завершается после попытки записать пачку с этой записью: True —
+        пачка закоммичена, False — запись не удалась.
+        """
+        await self.start()
+        written = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, written))
+        return written
+
+    async def flush(self) -> None:
+        """Дождаться, пока все поставленные записи будут обработаны (итог каждой — в её future)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "write_seconds": round(self.write_seconds, 3),
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[dict, "asyncio.Future[bool]"]]) -> None:
+        started = time.perf_counter()
+        ok = False
+        try:
+            count = await run_db(upsert_gifts, [record for record, _ in batch])
+            self.written += count
+            self.batches += 1
+            ok = True
+        except Exception as e:
+            self.failed += len(batch)
+            logger.exception("Ошибка пакетной записи %s гифтов в БД: %s", len(batch), e)
+        finally:
+            self.write_seconds += time.perf_counter() - started
+            for _, written in batch:
+                if not written.done():
+                    written.set_result(ok)
+                self._queue.task_done()
+
+
+# Общий writer для API и фоновых задач.
+_default_writer: Optional[GiftBatchWriter] = None
+
+
+def configure_gift_writer(batch_size: int, flush_interval: float) -> GiftBatchWriter:
+    """Задать параметры общего writer'а (вызывается при старте приложения)."""
+    global _default_writer
+    _default_writer = GiftBatchWriter(batch_size=batch_size, flush_interval=flush_interval)
+    return _default_writer
+
+
+def get_gift_writer() -> GiftBatchWriter:
+    """Вернуть общий writer, создав его с настройками по умолчанию при необходимости."""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = GiftBatchWriter()
+    return _default_writer
+
+
+async def close_gift_writer() -> None:
+    """Дописать очередь и остановить общий writer (вызывается при остановке приложения)."""
+    if _default_writer is not None:
+        await _default_writer.stop()
@@ -9,6 +9,26 @@ Supported keys (example):
  - BOT_TOKEN: Telegram bot token (string)
  - API_URL: URL of the local FastAPI server (used by the bot if needed)
  - DB_PATH: optional path to SQLite DB file
+ - FETCH_CONCURRENCY / FETCH_TIMEOUT: fragment.com parser concurrency and timeout
+ - PARSER_BACKEND: HTML extraction backend ("stream" or "bs4")
+ - RATE_LIMIT_INITIAL / RATE_LIMIT_MIN / RATE_LIMIT_MAX: adaptive request rate bounds (req/s)
+ - WRITER_BATCH_SIZE / WRITER_FLUSH_MS: batch writer size and flush interval
+ - SQLITE_*: SQLite pragmas (journal mode, synchronous, mmap, cache, temp store, busy timeout)
+ - DB_EXECUTOR_WORKERS: thread pool size for API database queries
+ - SNAPSHOT_DIR / SNAPSHOT_INTERVAL_MIN / SNAPSHOT_KEEP: compressed DB snapshots for /db/download
+ - JOB_CHUNK_SIZE / JOB_CHUNK_WORKERS / JOB_CHECKPOINT_EVERY: persistent batch-parse jobs
+ - NEGATIVE_TTL_*_H: hours batch jobs skip IDs that returned 404 / too little data / network error
+ - DISCOVERY_CACHE_TTL_H / DISCOVERY_HOLE_WINDOW: automatic collection size discovery
+ - RECRAWL_BUDGET_PER_HOUR / RECRAWL_TICK_SECONDS: incremental price re-crawl scheduler
+ - ARCHIVE_DIR / ARCHIVE_SEGMENT_MB: optional raw-page archive for offline re-parsing
+ - PIPELINE_EXTRACT_WORKERS / PIPELINE_QUEUE_SIZE: HTML parsing processes (None = one per core,
+   0 = threads) and pages buffered between fetching and parsing
+ - HTTP_CACHE_PATH / HTTP_CACHE_MAX_ENTRIES: ETag/Last-Modified cache of parsed pages (None disables)
+ - FETCH_RETRY_* / BREAKER_*: retries with jittered backoff and the circuit breaker that pauses
+   all crawling while fragment.com is failing
+ - READ_CACHE_MAX_ENTRIES / READ_CACHE_TTL: in-memory cache of gift lookups and list pages (0 disables)
+ - TRAIT_REFRESH_SECONDS: how often rarity and estimated prices are recomputed for collections with
+   written gifts (0 = only after parse jobs and on demand)
 
 If you prefer environment variables, use python-dotenv and a local `.env` file instead.
 """
@@ -16,6 +36,48 @@ If you prefer environment variables, use python-dotenv and a local `.env` file i
 BOT_TOKEN = "your-telegram-bot-token-here"
 API_URL = "http://127.0.0.1:8000"
 DB_PATH = "/path/to/gifts.db"
+FETCH_CONCURRENCY = 8
+FETCH_TIMEOUT = 10.0
+PARSER_BACKEND = "stream"
+RATE_LIMIT_INITIAL = 2.0
+RATE_LIMIT_MIN = 0.2
+RATE_LIMIT_MAX = 50.0
+WRITER_BATCH_SIZE = 200
+WRITER_FLUSH_MS = 500
+SQLITE_JOURNAL_MODE = "WAL"
+SQLITE_SYNCHRONOUS = "NORMAL"
+SQLITE_MMAP_SIZE = 268435456
+SQLITE_CACHE_SIZE_KB = 65536
+SQLITE_TEMP_STORE = "MEMORY"
+SQLITE_BUSY_TIMEOUT_MS = 5000
+DB_EXECUTOR_WORKERS = 8
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_INTERVAL_MIN = 60
+SNAPSHOT_KEEP = 3
+JOB_CHUNK_SIZE = 1000
+JOB_CHUNK_WORKERS = 2
+JOB_CHECKPOINT_EVERY = 100
+NEGATIVE_TTL_NOT_FOUND_H = 168.0
+NEGATIVE_TTL_INSUFFICIENT_H = 24.0
+NEGATIVE_TTL_NETWORK_ERROR_H = 1.0
+DISCOVERY_CACHE_TTL_H = 24.0
+DISCOVERY_HOLE_WINDOW = 5
+RECRAWL_BUDGET_PER_HOUR = 600
+RECRAWL_TICK_SECONDS = 60.0
+ARCHIVE_DIR = "archive"
+ARCHIVE_SEGMENT_MB = 64
+PIPELINE_EXTRACT_WORKERS = None
+PIPELINE_QUEUE_SIZE = 64
+HTTP_CACHE_PATH = "http_cache.db"
+HTTP_CACHE_MAX_ENTRIES = 200000
+FETCH_RETRY_ATTEMPTS = 4
+FETCH_RETRY_BASE_DELAY = 0.5
+FETCH_RETRY_MAX_DELAY = 20.0
+BREAKER_FAILURE_THRESHOLD = 10
+BREAKER_COOLDOWN = 30.0
+READ_CACHE_MAX_ENTRIES = 10000
+READ_CACHE_TTL = 30.0
+TRAIT_REFRESH_SECONDS = 60.0
 
 # Example: feature toggles / settings
 DEBUG = True
@@ -19,6 +19,67 @@ if BaseSettings is not None:
         BOT_TOKEN: Optional[str] = None
         API_URL: str = "http://127.0.0.1:8000"
         DB_PATH: Optional[str] = None
+        # Парсер fragment.com: число одновременных запросов и таймаут (сек)
+        FETCH_CONCURRENCY: int = 8
+        FETCH_TIMEOUT: float = 10.0
+        # Бэкенд разбора HTML: "stream" (быстрый) или "bs4" (BeautifulSoup)
+        PARSER_BACKEND: str = "stream"
+        # Адаптивный лимитер запросов к fragment.com (запросов в секунду)
+        RATE_LIMIT_INITIAL: float = 2.0
+        RATE_LIMIT_MIN: float = 0.2
+        RATE_LIMIT_MAX: float = 50.0
+        # Пакетная запись результатов парсинга: размер пачки и интервал сброса (мс)
+        WRITER_BATCH_SIZE: int = 200
+        WRITER_FLUSH_MS: int = 500
+        # Профиль производительности SQLite (PRAGMA на каждое соединение)
+        SQLITE_JOURNAL_MODE: str = "WAL"
+        SQLITE_SYNCHRONOUS: str = "NORMAL"
+        SQLITE_MMAP_SIZE: int = 268435456
+        SQLITE_CACHE_SIZE_KB: int = 65536
+        SQLITE_TEMP_STORE: str = "MEMORY"
+        SQLITE_BUSY_TIMEOUT_MS: int = 5000
+        # Размер пула потоков, в котором API выполняет запросы к БД
+        DB_EXECUTOR_WORKERS: int = 8
+        # Снимки БД для /db/download: каталог, период (мин, 0 — только по запросу), сколько хранить
+        SNAPSHOT_DIR: str = "snapshots"
+        SNAPSHOT_INTERVAL_MIN: int = 60
+        SNAPSHOT_KEEP: int = 3
+        # Задачи массового парсинга: размер чанка, воркеров на задачу, ID между контрольными точками
+        JOB_CHUNK_SIZE: int = 1000
+        JOB_CHUNK_WORKERS: int = 2
+        JOB_CHECKPOINT_EVERY: int = 100
+        # Негативный кэш: сколько часов пропускать ID после 404 / нехватки данных / сетевой ошибки
+        NEGATIVE_TTL_NOT_FOUND_H: float = 168.0
+        NEGATIVE_TTL_INSUFFICIENT_H: float = 24.0
+        NEGATIVE_TTL_NETWORK_ERROR_H: float = 1.0
+        # Автоопределение размера коллекции: срок кэша (ч) и допустимая длина дыры в нумерации
+        DISCOVERY_CACHE_TTL_H: float = 24.0
+        DISCOVERY_HOLE_WINDOW: int = 5
+        # Планировщик обновлений цен: запросов в час (0 — выключен) и период тика (сек)
+        RECRAWL_BUDGET_PER_HOUR: int = 600
+        RECRAWL_TICK_SECONDS: float = 60.0
+        # Архив сырых страниц для повторного разбора (пусто — выключен) и размер сегмента (МБ)
+        ARCHIVE_DIR: Optional[str] = None
+        ARCHIVE_SEGMENT_MB: int = 64
+        # Конвейер парсинга: процессов разбора HTML (пусто — по числу ядер, 0 — в потоках)
+        # и размер очереди страниц между загрузкой и разбором
+        PIPELINE_EXTRACT_WORKERS: Optional[int] = None
+        PIPELINE_QUEUE_SIZE: int = 64
+        # Кэш условных запросов (ETag/Last-Modified): файл (пусто — выключен) и лимит записей
+        HTTP_CACHE_PATH: Optional[str] = "http_cache.db"
+        HTTP_CACHE_MAX_ENTRIES: int = 200000
+        # Повторы временных сбоев (попыток, базовая и максимальная пауза, сек) и
+        # предохранитель: сбоев подряд до паузы и длительность паузы (сек)
+        FETCH_RETRY_ATTEMPTS: int = 4
+        FETCH_RETRY_BASE_DELAY: float = 0.5
+        FETCH_RETRY_MAX_DELAY: float = 20.0
+        BREAKER_FAILURE_THRESHOLD: int = 10
+        BREAKER_COOLDOWN: float = 30.0
+        # Кэш чтения гифтов в API: записей в памяти и время жизни записи (сек); 0 — выключен
+        READ_CACHE_MAX_ENTRIES: int = 10000
+        READ_CACHE_TTL: float = 30.0
+        # Пересчёт редкости и оценочных цен изменившихся коллекций: период в секундах (0 — только вручную)
+        TRAIT_REFRESH_SECONDS: float = 60.0
 
         class Config:
             env_file = ".env"
@@ -40,14 +101,132 @@ else:
                 if 'API_URL' environment variable is not set.
             DB_PATH (Optional[str]): Path to the database file from environment variable 'DB_PATH'.
                 If not provided, the application may use default database settings.
+            FETCH_CONCURRENCY (int): Maximum number of simultaneous requests to fragment.com.
+            FETCH_TIMEOUT (float): Timeout in seconds for a single fragment.com request.
+            PARSER_BACKEND (str): HTML extraction backend, 'stream' (default) or 'bs4'.
+            RATE_LIMIT_INITIAL / RATE_LIMIT_MIN / RATE_LIMIT_MAX (float): Start, floor and
+                ceiling of the adaptive fragment.com request rate, in requests per second.
+            WRITER_BATCH_SIZE (int): Parsed gifts written per multi-row upsert.
+            WRITER_FLUSH_MS (int): Maximum time a parsed gift waits before being written.
+            SQLITE_JOURNAL_MODE / SQLITE_SYNCHRONOUS / SQLITE_MMAP_SIZE / SQLITE_CACHE_SIZE_KB /
+                SQLITE_TEMP_STORE / SQLITE_BUSY_TIMEOUT_MS: SQLite pragmas applied to every connection.
+            DB_EXECUTOR_WORKERS (int): Size of the thread pool that runs API database queries.
+            SNAPSHOT_DIR (str): Directory for compressed database snapshots served by /db/download.
+            SNAPSHOT_INTERVAL_MIN (int): Minutes between scheduled snapshots, 0 disables the schedule.
+            SNAPSHOT_KEEP (int): Number of most recent snapshots kept on disk.
+            JOB_CHUNK_SIZE (int): Gift IDs per chunk of a persistent batch-parse job.
+            JOB_CHUNK_WORKERS (int): Chunk workers running in parallel for one job.
+            JOB_CHECKPOINT_EVERY (int): Gift IDs processed between saved checkpoints.
+            NEGATIVE_TTL_NOT_FOUND_H / NEGATIVE_TTL_INSUFFICIENT_H / NEGATIVE_TTL_NETWORK_ERROR_H
+                (float): Hours a gift ID is skipped by batch jobs after a 404, a page without
+                enough data or a network error (0 disables skipping for that outcome).
+            DISCOVERY_CACHE_TTL_H (float): Hours a discovered collection size is reused.
+            DISCOVERY_HOLE_WINDOW (int): Consecutive missing IDs tolerated while probing.
+            RECRAWL_BUDGET_PER_HOUR (int): fragment.com requests per hour spent on refreshing
+                known gifts, 0 disables the re-crawl scheduler.
+            RECRAWL_TICK_SECONDS (float): How often the re-crawl scheduler picks due gifts.
+            ARCHIVE_DIR (Optional[str]): Directory of the raw-page archive; unset disables it.
+            ARCHIVE_SEGMENT_MB (int): Size at which a new archive segment file is started.
+            PIPELINE_EXTRACT_WORKERS (Optional[int]): HTML extraction processes used by batch
+                jobs; unset means one per CPU core, 0 parses in threads instead.
+            PIPELINE_QUEUE_SIZE (int): Downloaded pages buffered between fetching and parsing.
+            HTTP_CACHE_PATH (Optional[str]): SQLite file of the conditional-request cache;
+                empty disables it.
+            HTTP_CACHE_MAX_ENTRIES (int): Pages kept in the cache before LRU eviction.
+            FETCH_RETRY_ATTEMPTS (int): Attempts per request on network errors and 408/429/5xx.
+            FETCH_RETRY_BASE_DELAY / FETCH_RETRY_MAX_DELAY (float): Exponential backoff bounds
+                (seconds, full jitter).
+            BREAKER_FAILURE_THRESHOLD (int): Consecutive transient failures that pause all
+                fragment.com requests.
+            BREAKER_COOLDOWN (float): Initial pause in seconds; doubles while probes keep failing.
+            READ_CACHE_MAX_ENTRIES (int): Gift lookups and list pages kept in the API's
+                in-memory cache; 0 disables it.
+            READ_CACHE_TTL (float): Seconds a cached lookup or page stays valid.
+            TRAIT_REFRESH_SECONDS (float): Period of rarity and estimated-price recomputation
+                for collections with written gifts (also run after each finished parse job);
+                0 leaves only job completion and the manual POST /traits/refresh.
 
         Environment Variables:
             BOT_TOKEN: Telegram bot token (required)
             API_URL: API service URL (optional, defaults to localhost:8000)
             DB_PATH: Database file path (required)
+            FETCH_CONCURRENCY: Parser concurrency limit (optional, defaults to 8)
+            FETCH_TIMEOUT: Parser request timeout (optional, defaults to 10.0)
+            PARSER_BACKEND: HTML extraction backend (optional, defaults to 'stream')
+            RATE_LIMIT_INITIAL / RATE_LIMIT_MIN / RATE_LIMIT_MAX: Adaptive rate bounds
+                (optional, default to 2.0 / 0.2 / 50.0 requests per second)
+            WRITER_BATCH_SIZE / WRITER_FLUSH_MS: Batch writer size and flush interval
+                (optional, default to 200 rows / 500 ms)
+            SQLITE_*: SQLite tuning profile (optional, defaults to WAL / NORMAL / 256 MiB mmap /
+                64 MiB cache / MEMORY temp store / 5000 ms busy timeout)
+            DB_EXECUTOR_WORKERS: API database thread pool size (optional, defaults to 8)
+            SNAPSHOT_DIR / SNAPSHOT_INTERVAL_MIN / SNAPSHOT_KEEP: Database snapshots
+                (optional, default to 'snapshots' / 60 minutes / 3 files)
+            JOB_CHUNK_SIZE / JOB_CHUNK_WORKERS / JOB_CHECKPOINT_EVERY: Batch-parse job engine
+                (optional, default to 1000 IDs / 2 workers / 100 IDs)
+            NEGATIVE_TTL_*_H: Negative cache TTLs (optional, default to 168 / 24 / 1 hours)
+            DISCOVERY_CACHE_TTL_H / DISCOVERY_HOLE_WINDOW: Collection size discovery
+                (optional, default to 24 hours / 5 IDs)
+            RECRAWL_BUDGET_PER_HOUR / RECRAWL_TICK_SECONDS: Incremental re-crawl scheduler
+                (optional, default to 600 requests / 60 seconds)
+            ARCHIVE_DIR / ARCHIVE_SEGMENT_MB: Raw-page archive (optional, disabled by default;
+                64 MiB segments)
+            PIPELINE_EXTRACT_WORKERS / PIPELINE_QUEUE_SIZE: Parsing pipeline (optional,
+                default to one process per core / 64 pages)
+            HTTP_CACHE_PATH / HTTP_CACHE_MAX_ENTRIES: Conditional-request cache (optional,
+                default to 'http_cache.db' / 200000 pages)
+            FETCH_RETRY_* / BREAKER_*: Retries and circuit breaker (optional, default to
+                4 attempts / 0.5-20 s backoff / 10 failures / 30 s pause)
+            READ_CACHE_MAX_ENTRIES / READ_CACHE_TTL: API read cache (optional, default to
+                10000 entries / 30 seconds)
+            TRAIT_REFRESH_SECONDS: Rarity / estimated price refresh period (optional, defaults
+                to 60 seconds)
         """
         
         def __init__(self) -> None:
             self.BOT_TOKEN: Optional[str] = os.getenv("BOT_TOKEN")
             self.API_URL: str = os.getenv("API_URL", "http://127.0.0.1:8000")
-            self.DB_PATH: Optional[str] = os.getenv("DB_PATH")
\ No newline at end of file
+            self.DB_PATH: Optional[str] = os.getenv("DB_PATH")
+            self.FETCH_CONCURRENCY: int = int(os.getenv("FETCH_CONCURRENCY", "8"))
+            self.FETCH_TIMEOUT: float = float(os.getenv("FETCH_TIMEOUT", "10.0"))
+            self.PARSER_BACKEND: str = os.getenv("PARSER_BACKEND", "stream")
+            self.RATE_LIMIT_INITIAL: float = float(os.getenv("RATE_LIMIT_INITIAL", "2.0"))
+            self.RATE_LIMIT_MIN: float = float(os.getenv("RATE_LIMIT_MIN", "0.2"))
+            self.RATE_LIMIT_MAX: float = float(os.getenv("RATE_LIMIT_MAX", "50.0"))
+            self.WRITER_BATCH_SIZE: int = int(os.getenv("WRITER_BATCH_SIZE", "200"))
+            self.WRITER_FLUSH_MS: int = int(os.getenv("WRITER_FLUSH_MS", "500"))
+            self.SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+            self.SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+            self.SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))
+            self.SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+            self.SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+            self.SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+            self.DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+            self.SNAPSHOT_DIR: str = os.getenv("SNAPSHOT_DIR", "snapshots")
+            self.SNAPSHOT_INTERVAL_MIN: int = int(os.getenv("SNAPSHOT_INTERVAL_MIN", "60"))
+            self.SNAPSHOT_KEEP: int = int(os.getenv("SNAPSHOT_KEEP", "3"))
+            self.JOB_CHUNK_SIZE: int = int(os.getenv("JOB_CHUNK_SIZE", "1000"))
+            self.JOB_CHUNK_WORKERS: int = int(os.getenv("JOB_CHUNK_WORKERS", "2"))
+            self.JOB_CHECKPOINT_EVERY: int = int(os.getenv("JOB_CHECKPOINT_EVERY", "100"))
+            self.NEGATIVE_TTL_NOT_FOUND_H: float = float(os.getenv("NEGATIVE_TTL_NOT_FOUND_H", "168.0"))
+            self.NEGATIVE_TTL_INSUFFICIENT_H: float = float(os.getenv("NEGATIVE_TTL_INSUFFICIENT_H", "24.0"))
+            self.NEGATIVE_TTL_NETWORK_ERROR_H: float = float(os.getenv("NEGATIVE_TTL_NETWORK_ERROR_H", "1.0"))
+            self.DISCOVERY_CACHE_TTL_H: float = float(os.getenv("DISCOVERY_CACHE_TTL_H", "24.0"))
+            self.DISCOVERY_HOLE_WINDOW: int = int(os.getenv("DISCOVERY_HOLE_WINDOW", "5"))
+            self.RECRAWL_BUDGET_PER_HOUR: int = int(os.getenv("RECRAWL_BUDGET_PER_HOUR", "600"))
+            self.RECRAWL_TICK_SECONDS: float = float(os.getenv("RECRAWL_TICK_SECONDS", "60.0"))
+            self.ARCHIVE_DIR: Optional[str] = os.getenv("ARCHIVE_DIR") or None
+            self.ARCHIVE_SEGMENT_MB: int = int(os.getenv("ARCHIVE_SEGMENT_MB", "64"))
+            extract_workers = os.getenv("PIPELINE_EXTRACT_WORKERS")
+            self.PIPELINE_EXTRACT_WORKERS: Optional[int] = int(extract_workers) if extract_workers else None
+            self.PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+            self.HTTP_CACHE_PATH: Optional[str] = os.getenv("HTTP_CACHE_PATH", "http_cache.db") or None
+            self.HTTP_CACHE_MAX_ENTRIES: int = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "200000"))
+            self.FETCH_RETRY_ATTEMPTS: int = int(os.getenv("FETCH_RETRY_ATTEMPTS", "4"))
+            self.FETCH_RETRY_BASE_DELAY: float = float(os.getenv("FETCH_RETRY_BASE_DELAY", "0.5"))
+            self.FETCH_RETRY_MAX_DELAY: float = float(os.getenv("FETCH_RETRY_MAX_DELAY", "20.0"))
+            self.BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "10"))
+            self.BREAKER_COOLDOWN: float = float(os.getenv("BREAKER_COOLDOWN", "30.0"))
+            self.READ_CACHE_MAX_ENTRIES: int = int(os.getenv("READ_CACHE_MAX_ENTRIES", "10000"))
+            self.READ_CACHE_TTL: float = float(os.getenv("READ_CACHE_TTL", "30.0"))
+            self.TRAIT_REFRESH_SECONDS: float = float(os.getenv("TRAIT_REFRESH_SECONDS", "60.0"))
@@ -10,11 +10,18 @@ admin_router = Router()
 
 config = Config()
 
-async def get_gifts() -> List[dict]:
-    """Получить список гифтов через API (возвращает JSON)."""
+async def get_gifts(page_size: int = 500) -> List[dict]:
+    """Получить список всех гифтов через API курсорной пагинацией (возвращает JSON)."""
+    gifts: List[dict] = []
+    params = {"after_id": 0, "limit": page_size}
     async with aiohttp.ClientSession() as session:
-        async with session.get(f"{config.API_URL}/gifts/") as resp:
-            resp.raise_for_status()
-            return await resp.json()
+        while True:
+            async with session.get(f"{config.API_URL}/gifts/", params=params) as resp:
+                resp.raise_for_status()
+                page = await resp.json()
+            gifts.extend(page["items"])
+            if not page["next_cursor"]:
+                return gifts
+            params = {"cursor": page["next_cursor"], "limit": page_size}
         
 
@@ -20,6 +20,17 @@ logger = logging.getLogger(__name__)
 
 user_router = Router()
 
+# Размер страницы при обходе /gifts/ курсорной пагинацией
+GIFTS_PAGE_SIZE = 100
+# Сколько имён можно искать одним сообщением /gift_name
+MAX_LOOKUP_NAMES = 100
+# Максимальная длина текста одного сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Последний отправленный снимок БД: ETag с сервера и file_id документа в Telegram.
+# Если снимок не изменился (304), документ пересылается по file_id без повторной загрузки.
+_last_db_snapshot = {"etag": None, "file_id": None, "caption": None}
+
 
 @user_router.message(Command("get_all_gifts"))
 async def parse_command(message: Message):
@@ -46,34 +57,42 @@ async def parse_command(message: Message):
     config = Config()
     api_url = config.API_URL.rstrip("/")
 
+    sent = 0
+    seen = 0
+    # Курсорная пагинация: первая страница по after_id=0, дальше по next_cursor
+    params = {"after_id": 0, "limit": GIFTS_PAGE_SIZE}
     try:
         async with aiohttp.ClientSession() as sess:
-            async with sess.get(f"{api_url}/gifts/") as resp:
-                resp.raise_for_status()
-                gifts = await resp.json()
+            while params:
+                async with sess.get(f"{api_url}/gifts/", params=params) as resp:
+                    resp.raise_for_status()
+                    page = await resp.json()
+
+                for g in page.get("items", []):
+                    seen += 1
+                    try:
+                        gid = g.get("id")
+                        name = g.get("name") or g.get("model") or ""
+                        normalized = normalize_name(name)
+                        if not normalized or not gid:
+                            continue
+                        link = f"t.me/nft/{normalized}-{gid}"
+                        await message.answer(link)
+                        sent += 1
+                    except Exception:
+                        logger.exception("Failed to process gift: %s", g)
+
+                next_cursor = page.get("next_cursor")
+                params = {"cursor": next_cursor, "limit": GIFTS_PAGE_SIZE} if next_cursor else None
     except Exception as e:
         logger.exception("Failed to fetch gifts from API: %s", e)
         await message.answer("Ошибка при получении списка гифтов от API.")
         return
 
-    if not gifts:
+    if seen == 0:
         await message.answer("Список гифтов пуст.")
         return
 
-    sent = 0
-    for g in gifts:
-        try:
-            gid = g.get("id")
-            name = g.get("name") or g.get("model") or ""
-            normalized = normalize_name(name)
-            if not normalized or not gid:
-                continue
-            link = f"t.me/nft/{normalized}-{gid}"
-            await message.answer(link)
-            sent += 1
-        except Exception:
-            logger.exception("Failed to process gift: %s", g)
-
     if sent == 0:
         await message.answer("Не удалось сформировать ни одной ссылки.")
 
@@ -114,27 +133,67 @@ Returns:
     await message.answer(
         "🔍 <b>Поиск гифта по названию</b>\n\n"
         "Введите <b>полное название</b> гифта с номером:\n"
-        "Например: <code>Plush Pepe #2790</code>\n\n",
+        "Например: <code>Plush Pepe #2790</code>\n\n"
+        f"Можно сразу несколько (до {MAX_LOOKUP_NAMES}) — по одному на строке или через запятую.\n\n",
 
         parse_mode="HTML"
     )
     
     await state.set_state(GiftForm.waiting_for_name)
 
+def split_gift_names(text: str) -> list:
+    """Имена гифтов из сообщения: по одному на строке или через запятую (без повторов)."""
+    names = (part.strip() for part in re.split(r"[\n,;]+", text or ""))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def format_gift_card(gift: dict) -> str:
+    """Карточка гифта для ответа в чат."""
+    gift_id = gift.get("id")
+    name = gift.get("name", "")
+
+    # Формируем ссылку t.me/nft/plushpepe-2790
+    # normalize_name убирает "#2773" и спецсимволы, оставляя только "plushpepe"
+    normalized = normalize_name(name)
+    nft_link = f"https://t.me/nft/{normalized}-{gift_id}" if normalized and gift_id else "—"
+
+    return (
+        f"📦 <b>Название:</b> {name}\n"
+        f"📝 <b>Детали:</b>\n"
+        f"• Model: {gift.get('model', '')}\n"
+        f"• Backdrop: {gift.get('backdrop', '')}\n"
+        f"• Symbol: {gift.get('symbol', '')}\n"
+        f"• Sale Price: {gift.get('sale_price', '')}\n\n"
+        f"🔗{nft_link}"
+    )
+
+
+async def answer_in_parts(message: Message, blocks: list) -> None:
+    """Отправить блоки текста, склеивая их в сообщения не длиннее лимита Telegram."""
+    part = ""
+    for block in blocks:
+        if part and len(part) + len(block) + 2 > TELEGRAM_MESSAGE_LIMIT:
+            await message.answer(part, parse_mode="HTML")
+            part = ""
+        part = f"{part}\n\n{block}" if part else block
+    if part:
+        await message.answer(part, parse_mode="HTML")
+
+
 @user_router.message(GiftForm.waiting_for_name)
 async def process_gift_name(message: Message, state: FSMContext):
     """
 Handles the gift name input in the gift search form.
-This function processes the user's input when they provide a gift name to search for.
+This function processes the user's input when they provide one or several gift
+names to search for (one per line or comma-separated).
 It performs the following operations:
-1. Extracts and cleans the gift name from the message
-2. URL-encodes the gift name for safe API requests
-3. Makes an HTTP GET request to the API to find the gift by exact name
-4. Handles various error cases (404 not found, connection errors, etc.)
-5. Formats and displays the gift information if found
-6. Clears the FSM state after processing
+1. Splits and cleans the gift names from the message
+2. Resolves all of them with a single POST /gifts/lookup request
+3. Handles connection errors
+4. Formats and displays the found gifts and lists the missing names
+5. Clears the FSM state after processing
 Args:
-    message (Message): The Telegram message containing the gift name
+    message (Message): The Telegram message containing the gift names
     state (FSMContext): The finite state machine context for managing conversation state
 Returns:
     None
@@ -142,76 +201,61 @@ Raises:
     aiohttp.ClientError: When there are HTTP connection issues with the API
     Exception: For any other unexpected errors during processing
 Note:
-    - Gift names are URL-encoded to handle special characters like '#'
+    - Names travel in the JSON body, so characters like '#' need no URL-encoding
     - The function generates a t.me/nft link using normalized gift name and ID
     - State is always cleared at the end, regardless of success or failure
 """
-    gift_name = message.text.strip()
-    
+    names = split_gift_names(message.text)
+    if not names:
+        await message.answer("❌ Введите хотя бы одно название гифта.")
+        await state.clear()
+        return
+    if len(names) > MAX_LOOKUP_NAMES:
+        await message.answer(f"❌ Не больше {MAX_LOOKUP_NAMES} гифтов за одно сообщение.")
+        await state.clear()
+        return
+
     # Логируем что получили от пользователя
-    logger.info(f"Поиск гифта по имени: '{gift_name}'")
-    
+    logger.info("Поиск гифтов по имени (%s): %s", len(names), names[:5])
+
     config = Config()
     api_url = config.API_URL.rstrip("/")
-    
-    # URL-кодируем имя гифта (особенно важно для символа #)
-    encoded_gift_name = quote(gift_name, safe='')
-    
-    # Пытаемся получить гифт по точному имени
+
+    # Все имена ищутся одним запросом к API
     try:
         async with aiohttp.ClientSession() as sess:
-            async with sess.get(f"{api_url}/gifts/{encoded_gift_name}") as resp:
-                if resp.status == 404:
-                    await message.answer(
-                        f"❌ Гифт с именем <b>'{gift_name}'</b> не найден.\n\n"
-                        f"💡 <b>Подсказка:</b> Введите полное имя с номером,\n"
-                        f"например: <code>Plush Pepe #2790</code>",
-                        parse_mode="HTML"
-                    )
-                    await state.clear()
-                    return
+            async with sess.post(f"{api_url}/gifts/lookup", json={"names": names}) as resp:
                 resp.raise_for_status()
-                
-                gift = await resp.json()
-                
+                result = await resp.json()
+
     except aiohttp.ClientError as e:
-        logger.exception("Ошибка HTTP при запросе гифта из API: %s", e)
+        logger.exception("Ошибка HTTP при запросе гифтов из API: %s", e)
         await message.answer("❌ Не удалось подключиться к API. Проверьте, что сервер запущен.")
         await state.clear()
         return
-    
+
     except Exception as e:
-        logger.exception("Неожиданная ошибка при запросе гифта из API: %s", e)
+        logger.exception("Неожиданная ошибка при запросе гифтов из API: %s", e)
         await message.answer("❌ Произошла ошибка при обработке запроса.")
         await state.clear()
         return
-    
-    # Извлекаем данные
-    gift_id = gift.get("id")
-    name = gift.get("name", "")
-    model = gift.get("model", "")
-    backdrop = gift.get("backdrop", "")
-    symbol = gift.get("symbol", "")
-    sale_price = gift.get("sale_price", "")
-    
-    # Формируем ссылку t.me/nft/plushpepe-2790
-    # normalize_name убирает "#2773" и спецсимволы, оставляя только "plushpepe"
-    normalized = normalize_name(name)
-    nft_link = f"https://t.me/nft/{normalized}-{gift_id}" if normalized and gift_id else "—"
-    
-    # Формируем красивый ответ
-    response = (
-        f"🎁 <b>Гифт найден!</b>\n\n"
-        f"📦 <b>Название:</b> {name}\n"
-        f"📝 <b>Детали:</b>\n"
-        f"• Model: {model}\n"
-        f"• Backdrop: {backdrop}\n"
-        f"• Symbol: {symbol}\n"
-        f"• Sale Price: {sale_price}\n\n"
-        f"🔗{nft_link}"
-    )
-    
-    await message.answer(response, parse_mode="HTML")
+
+    found = result.get("found", [])
+    missing = result.get("missing", {}).get("names", [])
+
+    blocks = [format_gift_card(gift) for gift in found]
+    if blocks:
+        title = "🎁 <b>Гифт найден!</b>" if len(names) == 1 else f"🎁 <b>Найдено гифтов: {len(found)} из {len(names)}</b>"
+        blocks[0] = f"{title}\n\n{blocks[0]}"
+    if missing:
+        listed = "\n".join(f"• {name}" for name in missing)
+        blocks.append(
+            f"❌ Не найдены:\n{listed}\n\n"
+            f"💡 <b>Подсказка:</b> Введите полное имя с номером,\n"
+            f"например: <code>Plush Pepe #2790</code>"
+        )
+
+    await answer_in_parts(message, blocks)
     await state.clear()
 
 @user_router.message(Command("put_gift"))
@@ -354,8 +398,10 @@ async def download_handler(message: Message):
     Note:
         - Uses aiohttp for async HTTP requests to API server
         - Extracts filename from Content-Disposition header if available
-        - Falls back to "gifts.db" as default filename
+        - Falls back to "gifts.db.gz" as default filename (the API serves gzip snapshots)
         - Shows file size in KB in the caption
+        - Remembers the snapshot ETag and Telegram file_id; on HTTP 304 the
+          already uploaded document is re-sent by file_id
         - Handles errors gracefully with user-friendly messages
     
     Скачивает файл базы данных с сервера и отправляет пользователю.
@@ -363,8 +409,20 @@ async def download_handler(message: Message):
     await message.answer("📥 Загружаю базу данных...")
     
     try:
+        headers = {}
+        if _last_db_snapshot["etag"] and _last_db_snapshot["file_id"]:
+            headers["If-None-Match"] = _last_db_snapshot["etag"]
+
         async with aiohttp.ClientSession() as sess:
-            async with sess.get(f"{config.API_URL}/db/download") as resp:
+            async with sess.get(f"{config.API_URL}/db/download", headers=headers) as resp:
+                if resp.status == 304:
+                    # БД не менялась — отправляем уже загруженный в Telegram файл
+                    await message.answer_document(
+                        _last_db_snapshot["file_id"],
+                        caption=_last_db_snapshot["caption"],
+                    )
+                    return
+
                 resp.raise_for_status()
                 
                 # Читаем содержимое файла
@@ -375,13 +433,17 @@ async def download_handler(message: Message):
                 if 'filename=' in content_disposition:
                     filename = content_disposition.split('filename=')[1].strip('"')
                 else:
-                    filename = "gifts.db"
+                    filename = "gifts.db.gz"
                 
                 # Отправляем файл пользователю напрямую из памяти
+                caption = f"✅ База данных ({len(db_content) // 1024} KB, gzip)"
                 db_file = BufferedInputFile(db_content, filename=filename)
-                await message.answer_document(
-                    db_file,
-                    caption=f"✅ База данных ({len(db_content) // 1024} KB)"
+                sent = await message.answer_document(db_file, caption=caption)
+
+                _last_db_snapshot.update(
+                    etag=resp.headers.get("ETag"),
+                    file_id=sent.document.file_id if sent.document else None,
+                    caption=caption,
                 )
                 
     except aiohttp.ClientResponseError as e:
@@ -29,7 +29,7 @@ async def help_handler(message: Message):
         "📋 <b>Доступные команды:</b>\n\n"
         
         "🎁 <b>Работа с гифтами:</b>\n"
-        "/gift_name — найти гифт по полному названию\n"
+        "/gift_name — найти гифт (или несколько) по полному названию\n"
         "/get_all_gifts — получить список всех гифтов\n\n"
         
         "⚙️ <b>Система:</b>\n"
@@ -0,0 +1,266 @@
+"""
+Кэш чтения гифтов в памяти процесса API.
+
+Перед `GET /gifts/{gift_name}` и `GET /gifts/` стоит LRU-кэш с TTL:
+записи по имени гифта и страницы списка по набору параметров запроса.
+Повторный запрос популярного гифта отвечается из памяти без сессии и
+запроса к SQLite.
+
+Инвалидация точечная:
+
+- запись по имени сбрасывается при изменении гифта с этим именем или
+  ключом (id, коллекция);
+- страница сбрасывается, если на ней есть изменённый гифт или если новая
+  версия гифта подходит под её фильтры (status / диапазон цены, для
+  курсорных страниц — и диапазон ID), т.е. может на неё попасть.
+
+Запись `upsert_gifts` (парсер, writer, повторный разбор архива) сообщает о
+записанных гифтах через `add_write_listener`; ручные PUT/PATCH сбрасывают
+кэш явно. Гифт, который ушёл из-под фильтра страницы с `offset` раньше неё,
+сдвигает страницу без инвалидации — такая неточность живёт не дольше TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from app.DB.writer import add_write_listener
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL = 30.0
+
+# Значение «нет в кэше»: None — закэшированный ответ «гифт не найден»
+MISSING = object()
+
+
+@dataclass(frozen=True)
+class PageScope:
+    """Фильтры страницы списка: какие гифты могут на неё попасть."""
+
+    status: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    # Курсорная страница: ID не меньше after_id и не больше last_id
+    # (last_id=None — страница неполная, на неё попадает любой ID дальше).
+    # Границы включительно: гифт другой коллекции с тем же ID может
+    # оказаться на странице по второй части курсора (id, collection).
+    after_id: Optional[int] = None
+    last_id: Optional[int] = None
+
+    def matches(self, record: dict) -> bool:
+        if self.status is not None and record.get("status") != self.status:
+            return False
+        price = record.get("price_ton")
+        if self.min_price is not None and (price is None or price < self.min_price):
+            return False
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        if self.after_id is not None:
+            gift_id = record.get("id")
+            if gift_id is None or gift_id < self.after_id:
+                return False
+            if self.last_id is not None and gift_id > self.last_id:
+                return False
+        return True
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    ids: Tuple[tuple, ...]
+    scope: Optional[PageScope]
+
+
+def gift_key(record: dict) -> tuple:
+    """Ключ гифта (id, коллекция): номера повторяются в разных коллекциях."""
+    return (record.get("id"), record.get("collection"))
+
+
+def name_key(name: str) -> tuple:
+    return ("name", name)
+
+
+def page_key(**params) -> tuple:
+    return ("page",) + tuple(sorted(params.items()))
+
+
+class GiftReadCache:
+    """
+    LRU-кэш на `max_entries` записей, каждая живёт не дольше `ttl` секунд.
+
+    Потокобезопасен: инвалидация приходит из потоков пула БД.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # Ключ гифта (id, коллекция) → ключи записей, в которых он есть
+        self._by_id: Dict[tuple, Set[Hashable]] = {}
+        # Ключи страниц: при записи гифта проверяются их фильтры
+        self._pages: Set[Hashable] = set()
+
+        # Растёт при каждой инвалидации: значение, прочитанное из БД до
+        # записи, не должно попасть в кэш после неё
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key: Hashable) -> Any:
+        """Значение по ключу или `MISSING`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        ids: Iterable[tuple] = (),
+        scope: Optional[PageScope] = None,
+        version: Optional[int] = None,
+    ) -> bool:
+        """
+        Сохранить значение.
+
+        `ids` — ключи `gift_key` гифтов, из которых собрано значение; `scope` — фильтры
+        страницы списка (для записей по имени не задаётся); `version` —
+        `self.version` до чтения из БД: если с тех пор были записи,
+        значение могло устареть и не сохраняется.
+        """
+        entry = _Entry(value, time.monotonic() + self.ttl, tuple(ids), scope)
+        with self._lock:
+            if version is not None and version != self._version:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for gift_id in entry.ids:
+                self._by_id.setdefault(gift_id, set()).add(key)
+            if scope is not None:
+                self._pages.add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evicted += 1
+        return True
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for gift_id in entry.ids:
+            keys = self._by_id.get(gift_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_id[gift_id]
+        self._pages.discard(key)
+
+    def invalidate_name(self, name: str) -> None:
+        with self._lock:
+            self._version += 1
+            if name_key(name) in self._entries:
+                self._remove(name_key(name))
+                self.invalidated += 1
+
+    def invalidate_gifts(self, records: Iterable[dict]) -> int:
+        """
+        Сбросить записи, которые могли устареть после записи гифтов `records`.
+
+        Возвращает число сброшенных записей.
+        """
+        records = list(records)
+        if not records:
+            return 0
+        with self._lock:
+            self._version += 1
+            stale = set()
+            for record in records:
+                stale.update(self._by_id.get(gift_key(record), ()))
+                if record.get("name") is not None:
+                    stale.add(name_key(record["name"]))
+            for key in self._pages:
+                if key not in stale and any(self._entries[key].scope.matches(r) for r in records):
+                    stale.add(key)
+            removed = 0
+            for key in stale:
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+            self.invalidated += removed
+        return removed
+
+    def clear(self) -> None:
+        """Сбросить всё (массовые изменения, например пересчёт редкости)."""
+        with self._lock:
+            self._version += 1
+            self.invalidated += len(self._entries)
+            self._entries.clear()
+            self._by_id.clear()
+            self._pages.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "pages": len(self._pages),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "invalidated": self.invalidated,
+                "hit_ratio": round(self.hits / requests, 3) if requests else 0.0,
+            }
+
+
+# Общий кэш API; None — кэш выключен.
+_default_cache: Optional[GiftReadCache] = None
+
+
+def _on_gifts_written(records) -> None:
+    if _default_cache is not None:
+        _default_cache.invalidate_gifts(records)
+
+
+add_write_listener(_on_gifts_written)
+
+
+def configure_read_cache(max_entries: int, ttl: float) -> Optional[GiftReadCache]:
+    """Включить кэш (вызывается при старте приложения); `max_entries` или `ttl` <= 0 — выключить."""
+    global _default_cache
+    _default_cache = GiftReadCache(max_entries, ttl) if max_entries > 0 and ttl > 0 else None
+    return _default_cache
+
+
+def get_read_cache() -> Optional[GiftReadCache]:
+    return _default_cache
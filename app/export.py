@@ -0,0 +1,108 @@
+"""
+Потоковая выгрузка всей таблицы `gifts` (NDJSON / CSV, опционально gzip).
+
+Строки читаются серверным курсором порциями по `yield_per` и сразу
+кодируются в байты, поэтому потребление памяти не зависит от размера
+таблицы. NDJSON кодируется orjson прямо из кортежей строк (datetime и
+GiftStatus он сериализует сам). Генераторы синхронные: StreamingResponse
+выполняет их в пуле потоков, не блокируя event loop.
+"""
+
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, Tuple
+
+import orjson
+from sqlalchemy import select
+
+from .DB.create_database import engine
+from .DB.models import Gift
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+EXPORT_COLUMNS = (
+    "id", "collection", "name", "model", "backdrop", "symbol", "sale_price", "price_ton",
+    "status", "rarity_score", "rarity_rank", "estimated_price", "date_added",
+)
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def iter_gift_rows(batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Tuple]:
+    """
+    Все строки таблицы по возрастанию (id, collection) кортежами в порядке `EXPORT_COLUMNS`.
+
+    Используется отдельное соединение (а не scoped_session): генератор
+    продвигается из разных потоков пула StreamingResponse.
+    """
+    columns = [Gift.__table__.c[name] for name in EXPORT_COLUMNS]
+    query = select(*columns).order_by(Gift.id, Gift.collection)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(query)
+        for partition in result.partitions():
+            yield from partition
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):  # GiftStatus
+        return value.value
+    return value
+
+
+def encode_ndjson(rows: Iterable[Tuple], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+    """Одна JSON-строка на гифт; байты отдаются порциями по `batch_size` строк."""
+    lines = []
+    for row in rows:
+        lines.append(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def encode_csv(rows: Iterable[Tuple], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+    """CSV с заголовком; байты отдаются порциями по `batch_size` строк."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Сжать поток байтов в gzip на лету."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 — формат gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_gifts(fmt: str = "ndjson", compress: bool = False) -> Iterator[bytes]:
+    """Собрать поток выгрузки в нужном формате."""
+    encoder = encode_csv if fmt == "csv" else encode_ndjson
+    stream = encoder(iter_gift_rows())
+    if compress:
+        stream = gzip_stream(stream)
+    return stream
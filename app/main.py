@@ -3,55 +3,202 @@ import asyncio
 import time
 import logging
 import uuid
+import base64
+import binascii
+import json
 
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional, Tuple, Union
 
 import aiohttp
 import uvicorn # uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
-from fastapi import BackgroundTasks, FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 import sqlalchemy
 # Импортируем модели и функции относительно пакета `app`
-from .DB.models import Gift
+from .DB.models import Gift, GiftStatus
+from .DB import repository
+from .DB.repository import run_db, configure_db_executor, shutdown_db_executor
 
 # Импортируем наши функции
-from .DB.create_database import connect_db, create_database
+from .DB.create_database import connect_db, create_database, sqlite_settings_report
 from .bot.config import Config
-from .parser.fragment import parse_fragment
+from .DB.writer import configure_gift_writer, close_gift_writer, get_gift_writer
+from .DB.snapshots import (
+    CHUNK_SIZE as SNAPSHOT_CHUNK_SIZE,
+    configure_snapshots,
+    get_snapshot_store,
+    start_snapshot_scheduler,
+    stop_snapshot_scheduler,
+)
+from .parser.fragment import parse_fragment_async
+from .export import EXPORT_FORMATS, export_gifts
+from .price_calculator import configure_trait_refresher, close_trait_refresher, get_trait_refresher
+from .cache import MISSING, PageScope, configure_read_cache, get_read_cache, gift_key, name_key, page_key
+from .parser.fetcher import configure_default_fetcher, close_default_fetcher
+from .parser.extractors import set_default_backend
+from .parser.archive import configure_page_archive, get_page_archive
+from .parser.http_cache import configure_http_cache, close_http_cache, get_http_cache
+from .parser.rate_limiter import configure_rate_limiter, get_rate_limiter
+from .parser.resilience import configure_resilience, get_circuit_breaker
+from .parser.jobs import configure_job_manager, close_job_manager, get_job_manager
+from .parser.pipeline import configure_extract_pool, shutdown_extract_pool, pipeline_stats
+from .parser.recrawl import configure_recrawl_scheduler, close_recrawl_scheduler, get_recrawl_scheduler
+from .DB.recrawl_store import recrawl_stats
+from .parser.discovery import DiscoveryError, configure_discovery, discover_collection_size
+from .DB import job_store
+from .DB.negative_cache import configure_negative_ttls, negative_cache_stats
 
 # Ensure logging is initialized (app package init also calls this)
 from app.logging_config import get_logger, new_error_id
 
 logger = get_logger(__name__)
 
-DB_PATH = (
-    "/home/ame/Programming/python/project/Telegram-GIFTs/gifts.db"
-)
-
 config = Config()
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Инициализация и освобождение общих ресурсов приложения."""
+    # Схема БД создаётся один раз при старте, а не на каждый спарсенный гифт
+    create_database()
+    sqlite_settings_report()
+    configure_db_executor(config.DB_EXECUTOR_WORKERS)
+    configure_gift_writer(config.WRITER_BATCH_SIZE, config.WRITER_FLUSH_MS / 1000)
+    configure_read_cache(config.READ_CACHE_MAX_ENTRIES, config.READ_CACHE_TTL)
+    configure_rate_limiter(
+        initial_rate=config.RATE_LIMIT_INITIAL,
+        min_rate=config.RATE_LIMIT_MIN,
+        max_rate=config.RATE_LIMIT_MAX,
+    )
+    configure_resilience(
+        attempts=config.FETCH_RETRY_ATTEMPTS,
+        base_delay=config.FETCH_RETRY_BASE_DELAY,
+        max_delay=config.FETCH_RETRY_MAX_DELAY,
+        failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+        cooldown=config.BREAKER_COOLDOWN,
+    )
+    configure_default_fetcher(config.FETCH_CONCURRENCY, config.FETCH_TIMEOUT)
+    set_default_backend(config.PARSER_BACKEND)
+    configure_page_archive(config.ARCHIVE_DIR, config.ARCHIVE_SEGMENT_MB)
+    configure_http_cache(config.HTTP_CACHE_PATH, config.HTTP_CACHE_MAX_ENTRIES)
+    configure_snapshots(config.SNAPSHOT_DIR, config.SNAPSHOT_KEEP, config.SNAPSHOT_INTERVAL_MIN * 60)
+    await start_snapshot_scheduler()
+    configure_negative_ttls(
+        not_found=config.NEGATIVE_TTL_NOT_FOUND_H,
+        insufficient_data=config.NEGATIVE_TTL_INSUFFICIENT_H,
+        network_error=config.NEGATIVE_TTL_NETWORK_ERROR_H,
+    )
+    configure_discovery(config.DISCOVERY_CACHE_TTL_H, config.DISCOVERY_HOLE_WINDOW)
+    configure_extract_pool(config.PIPELINE_EXTRACT_WORKERS)
+    configure_job_manager(
+        config.JOB_CHUNK_SIZE, config.JOB_CHUNK_WORKERS, config.JOB_CHECKPOINT_EVERY,
+        config.PIPELINE_QUEUE_SIZE,
+    )
+    # Задачи, прерванные перезапуском, продолжаются с последней контрольной точки
+    await get_job_manager().resume_unfinished()
+    configure_recrawl_scheduler(config.RECRAWL_BUDGET_PER_HOUR, config.RECRAWL_TICK_SECONDS)
+    await get_recrawl_scheduler().start()
+    configure_trait_refresher(config.TRAIT_REFRESH_SECONDS)
+    await get_trait_refresher().start()
+    yield
+    # Фоновые парсеры останавливаются первыми, пока writer и fetcher ещё открыты
+    await close_recrawl_scheduler()
+    await close_job_manager()
+    await close_trait_refresher()
+    shutdown_extract_pool()
+    await stop_snapshot_scheduler()
+    await close_default_fetcher()
+    close_http_cache()
+    await close_gift_writer()
+    shutdown_db_executor()
+
+
 app = FastAPI(
     title="Telegram Gifts Parser API",
     description=(
         "API для парсинга и управления гифтами с fragment.com"
     ),
     version="1.0.0",
+    lifespan=lifespan,
+    # Ответы кодируются orjson: в разы быстрее стандартного json на больших списках
+    default_response_class=ORJSONResponse,
 )
 
 
 class GiftBase(BaseModel):
     """Базовая модель данных гифта."""
 
-    id: int = Field(description="Уникальный идентификатор гифта")
+    id: int = Field(description="Номер гифта внутри коллекции")
+    collection: str = Field("", description="Slug коллекции (например: plushpepe)")
     name: str = Field(description="Название гифта")
     model: str = Field(description="Модель гифта")
     backdrop: str = Field(description="Фон гифта")
     symbol: str = Field(description="Символ гифта")
     # sale_price may be an integer price or a string status like 'Minted'
     sale_price: int | str | None = Field(description="Цена продажи или статус 'Minted'")
+    price_ton: Optional[float] = Field(None, description="Цена продажи в TON (если гифт продаётся)")
+    status: Optional[GiftStatus] = Field(None, description="Статус: for_sale / minted / unknown")
+
+
+class GiftPage(BaseModel):
+    """Страница гифтов при курсорной (keyset) пагинации."""
+
+    items: List[GiftBase] = Field(description="Гифты страницы, по возрастанию (id, collection)")
+    next_cursor: Optional[str] = Field(
+        None, description="Курсор следующей страницы (None — страниц больше нет)"
+    )
+
+
+class GiftLookup(BaseModel):
+    """Запрос массового поиска гифтов по именам и/или ID."""
+
+    names: List[str] = Field(
+        default_factory=list, max_length=5000, description="Полные имена гифтов (например: Plush Pepe #2790)"
+    )
+    ids: List[int] = Field(default_factory=list, max_length=5000, description="ID гифтов")
+
+
+class GiftLookupMissing(BaseModel):
+    names: List[str] = Field(default_factory=list, description="Имена, которых нет в БД")
+    ids: List[int] = Field(default_factory=list, description="ID, которых нет в БД")
+
+
+class GiftLookupResult(BaseModel):
+    """Результат массового поиска: найденные гифты и то, чего нет в БД."""
+
+    found: List[GiftBase] = Field(description="Найденные гифты в порядке запроса (без повторов)")
+    missing: GiftLookupMissing
+
+
+def encode_cursor(last_id: int, last_collection: str) -> str:
+    """Упаковать позицию keyset-пагинации в непрозрачный курсор."""
+    raw = json.dumps(
+        {"after_id": last_id, "after_collection": last_collection}, separators=(",", ":")
+    ).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, Optional[str]]:
+    """
+    Распаковать курсор в (id, коллекция); при некорректном значении — HTTP 400.
+
+    Курсоры без коллекции (выданные до составного ключа) продолжают с `id > after_id`.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        after_id = position["after_id"]
+        after_collection = position.get("after_collection")
+        if not isinstance(after_id, int):
+            raise ValueError(after_id)
+        if after_collection is not None and not isinstance(after_collection, str):
+            raise ValueError(after_collection)
+        return after_id, after_collection
+    except (binascii.Error, ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
 
 
 class GiftCreate(BaseModel):
@@ -68,19 +215,51 @@ class GiftCreate(BaseModel):
 class ParseTask(BaseModel):
     """Модель для запуска фоновой задачи парсинга."""
 
-    start_id: int = Field(gt=0, description="Начальный ID диапазона для парсинга")
-    end_id: int = Field(gt=0, description="Конечный ID диапазона для парсинга")
+    start_id: int = Field(1, gt=0, description="Начальный ID диапазона для парсинга")
+    end_id: Optional[int] = Field(
+        None,
+        gt=0,
+        description="Конечный ID диапазона (не задан — определяется автоматически по размеру коллекции)",
+    )
     user_selection_gifts: str = Field(description="Тип гифта для парсинга")
-    delay: float = Field(
-        default=1.0,
-        ge=0.1,
-        le=5.0,
-        description="Задержка между запросами в секундах (0.1-5.0)",
+    concurrency: int = Field(
+        default_factory=lambda: config.FETCH_CONCURRENCY,
+        ge=1,
+        le=64,
+        description="Число одновременных запросов к fragment.com (1-64)",
+    )
+
+
+class CollectionRange(BaseModel):
+    """Диапазон ID одной коллекции в многоколлекционной задаче."""
+
+    collection: str = Field(description="Тип гифта (например: lootbag)")
+    start_id: int = Field(1, gt=0, description="Начальный ID диапазона")
+    end_id: Optional[int] = Field(
+        None,
+        gt=0,
+        description="Конечный ID диапазона (не задан — определяется автоматически по размеру коллекции)",
+    )
+    weight: float = Field(
+        1.0,
+        gt=0,
+        le=100,
+        description="Вес коллекции: во сколько раз быстрее других она получает чанки",
     )
 
 
-# Глобальные переменные для управления задачами.
-active_tasks = {}
+class MultiParseTask(BaseModel):
+    """Модель для запуска одной задачи парсинга по нескольким коллекциям."""
+
+    collections: List[CollectionRange] = Field(
+        min_length=1, max_length=500, description="Коллекции и их диапазоны"
+    )
+    concurrency: int = Field(
+        default_factory=lambda: config.FETCH_CONCURRENCY,
+        ge=1,
+        le=64,
+        description="Общее число одновременных запросов к fragment.com на все коллекции (1-64)",
+    )
 
 
 class GiftUpgrade(BaseModel):
@@ -117,8 +296,22 @@ async def root():
             "docs": "/docs",
             "health": "/health",
             "gifts": "/gifts/",
+            "gifts_lookup": "/gifts/lookup",
+            "export": "/gifts/export",
             "parse": "/parse/",
             "batch_parse": "/parse/batch/",
+            "batch_parse_multi": "/parse/batch/multi/",
+            "discover": "/parse/discover/{collection}",
+            "tasks": "/tasks/",
+            "rate_limit": "/parse/rate-limit",
+            "circuit_breaker": "/parse/circuit-breaker",
+            "pipeline": "/parse/pipeline",
+            "http_cache": "/parse/http-cache",
+            "negative_cache": "/parse/negative-cache",
+            "recrawl": "/parse/recrawl",
+            "read_cache": "/cache/stats",
+            "traits": "/traits",
+            "db_download": "/db/download",
         },
     }
 
@@ -129,9 +322,8 @@ async def health_check():
 
     try:
         # 1. ✅ Проверяем соединение с БД
-        with connect_db() as session:
-            # 2. ✅ Пытаемся выполнить простой запрос
-            gift_count = session.query(Gift).count()
+        # 2. ✅ Пытаемся выполнить простой запрос (в пуле потоков БД)
+        gift_count = await run_db(repository.count_gifts)
 
         return {
             "status": "healthy",
@@ -145,36 +337,202 @@ async def health_check():
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера (id={err_id})")
 
 
-@app.get("/gifts/", response_model=List[GiftBase])
+def cached(key):
+    """Значение из кэша чтения или MISSING (кэш выключен или записи нет)."""
+    cache = get_read_cache()
+    return cache.get(key) if cache is not None else MISSING
+
+
+def cache_version() -> int:
+    """Версия кэша чтения до запроса к БД (см. `GiftReadCache.put`)."""
+    cache = get_read_cache()
+    return cache.version if cache is not None else 0
+
+
+def remember_gift(name: str, gift: Optional[dict], version: int) -> None:
+    cache = get_read_cache()
+    if cache is not None:
+        # «Не найден» тоже кэшируется: его сбросит запись гифта с этим именем
+        cache.put(name_key(name), gift, ids=(gift_key(gift),) if gift else (), version=version)
+
+
+def remember_page(key, gifts: List[dict], scope: PageScope, value, version: int) -> None:
+    cache = get_read_cache()
+    if cache is not None:
+        cache.put(key, value, ids=[gift_key(gift) for gift in gifts], scope=scope, version=version)
+
+
+def forget_gift(name: Optional[str], gift: Optional[dict]) -> None:
+    """Сбросить кэш чтения после ручного изменения гифта (старое имя и новая версия)."""
+    cache = get_read_cache()
+    if cache is None:
+        return
+    if name is not None:
+        cache.invalidate_name(name)
+    if gift is not None:
+        cache.invalidate_gifts([gift])
+
+
+@app.get("/gifts/", response_model=Union[GiftPage, List[GiftBase]])
 async def get_all_gifts(
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    status: Optional[GiftStatus] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Literal["id", "price_asc", "price_desc"] = "id",
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None
 ):
     """
     Получить список всех гифтов из базы данных
+
+    - **status**: фильтр по статусу (for_sale / minted / unknown)
+    - **min_price** / **max_price**: диапазон цены в TON (по индексу `price_ton`)
+    - **sort**: `id` (по умолчанию), `price_asc` или `price_desc`
+
+    Курсорный режим (рекомендуется для обхода всей таблицы): передайте
+    `after_id=0` для первой страницы, затем `cursor=<next_cursor>` из ответа.
+    Ответ — объект `{items, next_cursor}`, время страницы не зависит от глубины.
+    Без `after_id`/`cursor` ответ — прежний список с `limit`/`offset`.
     """
-    try:
-        with connect_db() as session:
-            gifts = session.query(Gift).order_by(Gift.id).limit(limit).offset(offset).all()
-            return [
-                GiftBase(
-                    id=g.id,
-                    name=g.name,
-                    model=g.model,
-                    backdrop=g.backdrop,
-                    symbol=g.symbol,
-                    sale_price=g.sale_price
-                    
-                    
+    if cursor is not None or after_id is not None:
+        if sort != "id" or offset:
+            raise HTTPException(
+                status_code=400,
+                detail="Курсорная пагинация поддерживает только sort=id и не сочетается с offset"
+            )
+        start_after, start_collection = decode_cursor(cursor) if cursor is not None else (after_id, None)
+        key = page_key(
+            after_id=start_after, after_collection=start_collection,
+            limit=limit, status=status, min_price=min_price, max_price=max_price,
+        )
+        try:
+            page = cached(key)
+            if page is MISSING:
+                version = cache_version()
+                page = await run_db(
+                    repository.list_gifts_after,
+                    after_id=start_after,
+                    after_collection=start_collection,
+                    limit=limit,
+                    status=status,
+                    min_price=min_price,
+                    max_price=max_price,
                 )
-                for g in gifts
-            ]
+                gifts, has_more = page
+                remember_page(key, gifts, PageScope(
+                    status, min_price, max_price,
+                    after_id=start_after,
+                    last_id=gifts[-1]["id"] if has_more and gifts else None,
+                ), page, version)
+            gifts, has_more = page
+        except Exception as e:
+            err_id = new_error_id()
+            logger.exception("Ошибка при получении данных из БД (%s)", err_id)
+            raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера (id={err_id})")
+        # Словари из БД уже в формате GiftBase: отдаём их orjson напрямую,
+        # без построения моделей и повторной валидации response_model
+        return ORJSONResponse({
+            "items": gifts,
+            "next_cursor": (
+                encode_cursor(gifts[-1]["id"], gifts[-1]["collection"]) if has_more and gifts else None
+            ),
+        })
+
+    key = page_key(
+        limit=limit, offset=offset, status=status, min_price=min_price, max_price=max_price, sort=sort
+    )
+    try:
+        gifts = cached(key)
+        if gifts is MISSING:
+            version = cache_version()
+            gifts = await run_db(
+                repository.list_gifts,
+                limit=limit,
+                offset=offset,
+                status=status,
+                min_price=min_price,
+                max_price=max_price,
+                sort=sort,
+            )
+            remember_page(key, gifts, PageScope(status, min_price, max_price), gifts, version)
+        return ORJSONResponse(gifts)
     except Exception as e:
         err_id = new_error_id()
         logger.exception("Ошибка при получении данных из БД (%s)", err_id)
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера (id={err_id})")
 
 
+@app.get("/gifts/export")
+async def export_all_gifts(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    gzip: bool = False
+):
+    """
+    Потоковая выгрузка всего каталога гифтов
+
+    - **format**: `ndjson` (по умолчанию) или `csv`
+    - **gzip**: сжать выгрузку в gzip (файл `.gz`)
+
+    Строки читаются серверным курсором порциями и сразу отдаются клиенту,
+    поэтому память не зависит от размера таблицы.
+    """
+    media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"gifts.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        export_gifts(fmt, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@app.post("/gifts/lookup", response_model=GiftLookupResult)
+async def lookup_gifts(lookup: GiftLookup):
+    """
+    Найти много гифтов за один запрос
+
+    - **names**: полные имена гифтов
+    - **ids**: ID гифтов
+
+    Вместо сотен `GET /gifts/{gift_name}` — несколько запросов `IN (...)`
+    пачками по 500 значений. В ответе `found` — найденные гифты в порядке
+    запроса (гифт, указанный и по имени, и по ID, — один раз; по ID
+    находятся гифты всех коллекций с этим номером), `missing` — имена и
+    ID, которых нет в БД.
+    """
+    if not lookup.names and not lookup.ids:
+        raise HTTPException(status_code=400, detail="Укажите хотя бы одно имя или ID")
+    try:
+        by_name, by_id = await run_db(repository.lookup_gifts, lookup.names, lookup.ids)
+    except Exception as e:
+        err_id = new_error_id()
+        logger.exception("Ошибка массового поиска гифтов в БД (%s)", err_id)
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера (id={err_id})")
+
+    found = {}
+    missing_names, missing_ids = [], []
+    for name in dict.fromkeys(lookup.names):
+        gift = by_name.get(name)
+        if gift is None:
+            missing_names.append(name)
+        else:
+            found.setdefault(gift_key(gift), gift)
+    for gift_id in dict.fromkeys(lookup.ids):
+        gifts = by_id.get(gift_id)
+        if not gifts:
+            missing_ids.append(gift_id)
+        for gift in gifts or ():
+            found.setdefault(gift_key(gift), gift)
+    return ORJSONResponse({
+        "found": list(found.values()),
+        "missing": {"names": missing_names, "ids": missing_ids},
+    })
+
+
 @app.get("/gifts/{gift_name}", response_model=GiftBase)
 async def get_gift_by_id(gift_name: str):
     """
@@ -183,23 +541,19 @@ async def get_gift_by_id(gift_name: str):
     - **gift_name**: Имя гифта для поиска в базе данных (например: "Plush Pepe #2790")
     """
     try:
-        with connect_db() as session:
-            gift = session.query(Gift).filter(Gift.name == gift_name).first()
-            if not gift:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Гифт с именем '{gift_name}' не найден в базе данных"
-                )
-
-            return GiftBase(
-                id=gift.id,
-                name=gift.name,
-                model=gift.model,
-                backdrop=gift.backdrop,
-                symbol=gift.symbol,
-                sale_price=gift.sale_price
+        gift = cached(name_key(gift_name))
+        if gift is MISSING:
+            version = cache_version()
+            gift = await run_db(repository.get_gift_by_name, gift_name)
+            remember_gift(gift_name, gift, version)
+        if not gift:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Гифт с именем '{gift_name}' не найден в базе данных"
             )
 
+        return GiftBase(**gift)
+
     except HTTPException:
         raise
     except Exception as e:
@@ -217,7 +571,7 @@ async def parse_single_gift(gift_data: GiftCreate):
     - **user_selection_gifts**: Тип гифта (например: lootbag)
     """
     try:
-        result = parse_fragment(gift_data.gift_id, gift_data.user_selection_gifts)
+        result = await parse_fragment_async(gift_data.gift_id, gift_data.user_selection_gifts)
 
         if not result:
             raise HTTPException(
@@ -225,14 +579,7 @@ async def parse_single_gift(gift_data: GiftCreate):
                 detail=f"Гифт с ID {gift_data.gift_id} не найден или содержит недостаточно данных для парсинга"
             )
 
-        return GiftBase(
-            id=result["number_iteration"],
-            name=result["name"],
-            model=result["model"],
-            backdrop=result["backdrop"],
-            symbol=result["symbol"],
-            sale_price=result["sale_price"]
-        )
+        return GiftBase(**{field: result[field] for field in repository.GIFT_FIELDS})
 
     except HTTPException:
         raise
@@ -247,51 +594,20 @@ async def update_gift_by_name(gift_name: str, gift_data: GiftUpgrade):
     """
     Ручное обновление гифта по имени
     - **gift_name**: имя гифта для обновления
+
+    `estimated_price` пересчитывается при следующем обновлении коллекции (см. `/traits`).
     """
     try:
-        with connect_db() as session:
-            # Ищем гифт по имени
-            gift = session.query(Gift).filter(Gift.name == gift_name).first()
-            if not gift:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Gift with name '{gift_name}' not found"
-                )
-            
-            # Обновляем поля гифта
-            gift.name = gift_data.name
-            gift.model = gift_data.model
-            gift.backdrop = gift_data.backdrop
-            gift.symbol = gift_data.symbol
-            
-            # Обрабатываем специальные поля
-            if isinstance(gift_data.sale_price, (int, str)) or gift_data.sale_price is None:
-                gift.sale_price = str(gift_data.sale_price) if gift_data.sale_price is not None else None
-            
-            if gift_data.rarity_score is not None:
-                gift.rarity_score = gift_data.rarity_score
-            
-            if gift_data.estimated_price is not None:
-                gift.estimated_price = gift_data.estimated_price
-            
-            # Сохраняем изменения
-            try:
-                session.commit()
-                session.refresh(gift)
-            except Exception as e:
-                session.rollback()
-                logger.exception("Ошибка при сохранении изменений: %s", str(e))
-                raise HTTPException(status_code=500, detail="Database error while updating gift")
-
-            # Возвращаем обновленные данные
-            return GiftBase(
-                id=gift.id,
-                name=gift.name,
-                model=gift.model,
-                backdrop=gift.backdrop,
-                symbol=gift.symbol,
-                sale_price=gift.sale_price
+        gift = await run_db(repository.update_gift, gift_name, gift_data.model_dump())
+        forget_gift(gift_name, gift)
+        if not gift:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Gift with name '{gift_name}' not found"
             )
+
+        # Возвращаем обновленные данные
+        return GiftBase(**gift)
     except HTTPException:
         raise
     except Exception as e:
@@ -312,38 +628,12 @@ async def patch_gift(name: Optional[str], patch: GiftPatch):
         if not data:
             raise HTTPException(status_code=400, detail="Нет полей для обновления")
 
-        with connect_db() as session:
-            # Ищем по числовому полю id в модели
-            gift = session.query(Gift).filter(Gift.name == name).first()
-            if not gift:
-                raise HTTPException(status_code=404, detail=f"Гифт с именем {name} не найден")
-
-            # Обновляем только переданные поля
-            if "name" in data:
-                gift.name = data["name"]
-            if "sale_price" in data:
-                # Сохраняем как строку — это позволяет хранить статусы ('Minted') и числа
-                gift.sale_price = str(data["sale_price"]) if data["sale_price"] is not None else None
-
-            session.commit()
-            session.refresh(gift)
-
-            # Приводим sale_price к int для ответа (если необходимо)
-            sp = gift.sale_price
-            try:
-                sp = int(sp) if sp is not None else None
-            except Exception:
-                # если хранится строка нечислового формата (например 'Minted'), оставим как есть
-                pass
-
-            return GiftBase(
-                id=gift.id,
-                name=gift.name,
-                model=gift.model,
-                backdrop=gift.backdrop,
-                symbol=gift.symbol,
-                sale_price=sp
-            )
+        gift = await run_db(repository.patch_gift, name, data)
+        forget_gift(name, gift)
+        if not gift:
+            raise HTTPException(status_code=404, detail=f"Гифт с именем {name} не найден")
+
+        return GiftBase(**gift)
     except HTTPException:
         raise
     except Exception as e:
@@ -352,153 +642,464 @@ async def patch_gift(name: Optional[str], patch: GiftPatch):
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера (id={err_id})")
 
 
+def parse_range_header(range_header: str, size: int) -> Optional[tuple]:
+    """
+    Разобрать заголовок `Range` (один диапазон байт) в пару (start, end) включительно.
+
+    Неподдерживаемые формы (несколько диапазонов, другие единицы) игнорируются —
+    возвращается None и отдаётся весь файл. Невыполнимый диапазон — HTTP 416.
+    """
+    units, _, spec = range_header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # bytes=-N — последние N байт
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    if start < 0 or start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Запрошенный диапазон недоступен",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path: str, start: int, end: int):
+    """Читать файл кусками от `start` до `end` включительно; файл закрывается по завершении."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(SNAPSHOT_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@app.post("/db/snapshot")
+async def create_db_snapshot():
+    """Сделать снимок БД прямо сейчас (если БД не менялась, вернётся прежний снимок)."""
+    snapshot = await run_db(get_snapshot_store().take)
+    return snapshot.to_dict()
+
+
 @app.get("/db/download")
-def download_db():
-    if not os.path.isfile(DB_PATH):
-        raise HTTPException(status_code=404, detail="Database file not found")
-    file_like = open(DB_PATH, mode="rb")
-    return StreamingResponse(file_like, media_type="application/octet-stream", headers={
-        "Content-Disposition": f"attachment; filename={os.path.basename(DB_PATH)}"
-    })
+async def download_db(
+    fresh: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+):
+    """
+    Скачать сжатый (gzip) согласованный снимок БД
+
+    - **fresh**: сначала сделать новый снимок, а не отдавать последний готовый
+
+    Ответ содержит `ETag` (sha256 содержимого): с `If-None-Match` сервер
+    вернёт 304, если БД не изменилась. Поддерживается `Range` (один
+    диапазон) и `If-Range` для докачки прерванной загрузки.
+    """
+    store = get_snapshot_store()
+    snapshot = None if fresh else await run_db(store.latest)
+    if snapshot is None:
+        snapshot = await run_db(store.take)
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename={snapshot.filename}",
+    }
+    if if_none_match and snapshot.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    size = snapshot.size
+    byte_range = None
+    # If-Range: докачка только если файл не изменился с начала загрузки
+    if range_header and (not if_range or if_range.strip() == snapshot.etag):
+        byte_range = parse_range_header(range_header, size)
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        iter_file_range(snapshot.path, start, end),
+        status_code=status_code,
+        media_type="application/gzip",
+        headers=headers,
+    )
 
 
 ##############################################################
 # Фоновый парсинг диапазона гифтов
 ##############################################################
 
-async def background_parsing(
-    task_id: str,
-    start_id: int,
-    end_id: int,
-    user_selection_gifts: str,
-    delay: float
-):
-    """
-    Фоновая задача для массового парсинга диапазона гифтов
+async def discover_or_502(collection: str, refresh: bool = False):
+    """Определить размер коллекции; если fragment.com не отвечает — HTTP 502."""
+    try:
+        return await discover_collection_size(collection, refresh=refresh)
+    except DiscoveryError as e:
+        logger.warning("Автоопределение размера %s не удалось: %s", collection, e)
+        raise HTTPException(status_code=502, detail="fragment.com не отвечает, размер коллекции не определён")
 
-    - **task_id**: Уникальный идентификатор задачи
-    - **start_id**: Начальный ID диапазона
-    - **end_id**: Конечный ID диапазона
-    - **user_selection_gifts**: Тип гифтов
-    - **delay**: Задержка между запросами
-    """
-    success = 0
-    failed = 0
 
-    for gift_id in range(start_id, end_id + 1):
-        try:
-            result = parse_fragment(gift_id, user_selection_gifts)
-            if result:
-                success += 1
-            else:
-                failed += 1
-
-            # Обновляем прогресс задачи
-            active_tasks[task_id] = {
-                "current": gift_id,
-                "total": end_id - start_id + 1,
-                "success": success,
-                "failed": failed,
-                "status": "running",
-                "progress": f"{((gift_id - start_id + 1) / (end_id - start_id + 1)) * 100:.1f}%"
-            }
-
-            await asyncio.sleep(delay)
+@app.get("/parse/discover/{collection}")
+async def discover_collection(collection: str, refresh: bool = False):
+    """
+    Определить максимальный существующий ID коллекции
 
-        except Exception as e:
-            failed += 1
-            err_id = new_error_id()
-            logger.exception("Ошибка при парсинге гифта %s (%s)", gift_id, err_id)
+    - **collection**: Тип гифтов (например: lootbag)
+    - **refresh**: искать заново, не используя кэш
 
-    # Завершаем задачу
-    active_tasks[task_id]["status"] = "completed"
-    active_tasks[task_id]["completed_at"] = time.time()
+    Экспоненциальный поиск и бинарный поиск по ID — O(log n) запросов.
+    Результат кэшируется на DISCOVERY_CACHE_TTL_H часов.
+    """
+    result = await discover_or_502(collection, refresh=refresh)
+    return {
+        "collection": result.collection,
+        "max_id": result.max_id,
+        "probes": result.probes,
+        "cached": result.cached,
+        "discovered_at": result.discovered_at,
+    }
 
 
 @app.post("/parse/batch/")
-async def start_batch_parsing(task: ParseTask, background_tasks: BackgroundTasks):
+async def start_batch_parsing(task: ParseTask):
     """
     Запустить фоновую задачу для парсинга диапазона гифтов
 
     - **start_id**: Начальный ID диапазона
     - **end_id**: Конечный ID диапазона
     - **user_selection_gifts**: Тип гифтов
-    - **delay**: Задержка между запросами (по умолчанию 1.0 секунда)
+    - **concurrency**: Число одновременных запросов (по умолчанию FETCH_CONCURRENCY)
+
+    Если `end_id` не задан, диапазон определяется автоматически: до
+    максимального существующего ID коллекции (см. `/parse/discover/{collection}`).
+
+    Задача и её контрольные точки хранятся в БД: после перезапуска API
+    парсинг продолжается с места остановки. Прогресс — `GET /tasks/{task_id}`.
     """
-    if task.start_id > task.end_id:
+    end_id = task.end_id
+    if end_id is None:
+        discovery = await discover_or_502(task.user_selection_gifts)
+        if discovery.max_id < task.start_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"В коллекции {task.user_selection_gifts} нет гифтов с ID >= {task.start_id}"
+            )
+        end_id = discovery.max_id
+
+    if task.start_id > end_id:
         raise HTTPException(
             status_code=400,
             detail="Начальный ID не может быть больше конечного ID"
         )
 
-    task_id = f"task_{int(time.time())}"
+    job = await get_job_manager().submit(
+        task.user_selection_gifts, task.start_id, end_id, task.concurrency
+    )
 
-    active_tasks[task_id] = {
-        "current": task.start_id,
-        "total": task.end_id - task.start_id + 1,
-        "success": 0,
-        "failed": 0,
-        "status": "starting",
-        "progress": "0%",
-        "started_at": time.time()
+    return {
+        "task_id": job["task_id"],
+        "message": "Задача массового парсинга запущена",
+        "details": {
+            "range": job["range"],
+            "type": task.user_selection_gifts,
+            "concurrency": task.concurrency,
+            "chunks": sum(job["chunks"].values()),
+        }
     }
 
-    background_tasks.add_task(
-        background_parsing,
-        task_id, task.start_id, task.end_id, task.user_selection_gifts, task.delay
-    )
+
+@app.post("/parse/batch/multi/")
+async def start_multi_batch_parsing(task: MultiParseTask):
+    """
+    Запустить одну фоновую задачу парсинга по нескольким коллекциям
+
+    - **collections**: список `{collection, start_id, end_id, weight}`
+    - **concurrency**: Общее число одновременных запросов на все коллекции
+
+    Все диапазоны обрабатываются одной задачей с общими `concurrency` и
+    лимитером запросов. Чанки коллекций берутся по очереди взвешенно-
+    справедливо: коллекция с весом 2 получает вдвое больше запросов, чем с
+    весом 1, а маленькие коллекции не ждут окончания больших. Если `end_id`
+    не задан, он определяется автоматически (как в `/parse/batch/`).
+    Прогресс по каждой коллекции — `collections` в `GET /tasks/{task_id}`.
+    """
+    names = [item.collection for item in task.collections]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Коллекции указаны несколько раз: {', '.join(duplicates)}"
+        )
+
+    unknown = [item for item in task.collections if item.end_id is None]
+    discovered = await asyncio.gather(*(discover_or_502(item.collection) for item in unknown))
+    end_ids = {item.collection: result.max_id for item, result in zip(unknown, discovered)}
+
+    ranges = []
+    for item in task.collections:
+        end_id = item.end_id if item.end_id is not None else end_ids[item.collection]
+        if item.start_id > end_id:
+            if item.end_id is None:
+                # Коллекция меньше запрошенного начала — парсить нечего
+                logger.info("В коллекции %s нет гифтов с ID >= %s, пропускаем", item.collection, item.start_id)
+                continue
+            raise HTTPException(
+                status_code=400,
+                detail=f"{item.collection}: начальный ID не может быть больше конечного ID"
+            )
+        ranges.append((item.collection, item.start_id, end_id, item.weight))
+    if not ranges:
+        raise HTTPException(status_code=400, detail="Ни в одной коллекции нет гифтов в заданных диапазонах")
+
+    job = await get_job_manager().submit_many(ranges, task.concurrency)
 
     return {
-        "task_id": task_id,
+        "task_id": job["task_id"],
         "message": "Задача массового парсинга запущена",
         "details": {
-            "range": f"{task.start_id}-{task.end_id}",
-            "type": task.user_selection_gifts,
-            "delay": task.delay
+            "collections": {
+                name: {"range": item["range"], "weight": item["weight"]}
+                for name, item in job["collections"].items()
+            },
+            "concurrency": task.concurrency,
+            "chunks": sum(job["chunks"].values()),
         }
     }
 
 
-# @app.get("/tasks/{task_id}")
-# async def get_task_status(task_id: str):
-#     """
-#     Получить статус и прогресс фоновой задачи парсинга
-#
-#     - **task_id**: Идентификатор задачи полученный при запуске парсинга
-#     """
-#     if task_id not in active_tasks:
-#         raise HTTPException(
-#             status_code=404,
-#             detail=f"Задача с ID {task_id} не найдена"
-#         )
-#
-#     return active_tasks[task_id]
-
-# @app.get("/tasks/")
-# async def get_all_tasks():
-#     """
-#     Получить список всех активных и завершенных задач
-#     """
-#     return {
-#         "active_tasks": {
-#             task_id: info for task_id, info in active_tasks.items()
-#             if info.get("status") != "completed"
-#         },
-#         "completed_tasks": {
-#             task_id: info for task_id, info in active_tasks.items()
-#             if info.get("status") == "completed"
-#         },
-#         "total_tasks": len(active_tasks)
-#     }
-
-
-async def get_gifts():
-    """
-    Получить список гифтов через API (возвращает JSON).
+@app.get("/parse/rate-limit")
+async def get_rate_limit_state():
+    """
+    Состояние адаптивного лимитера запросов к fragment.com
+
+    Текущая скорость (req/s), доступные токены и последние случаи троттлинга.
+    """
+    return get_rate_limiter().snapshot()
+
+
+@app.get("/parse/circuit-breaker")
+async def get_circuit_breaker_state():
+    """
+    Состояние предохранителя запросов к fragment.com
+
+    `open` — сервер недоступен, все воркеры ждут `open_for` секунд;
+    `half_open` — идёт пробный запрос. Последние срабатывания — в `recent_opens`.
+    """
+    return get_circuit_breaker().snapshot()
+
+
+@app.get("/parse/pipeline")
+async def get_pipeline_state():
+    """
+    Метрики конвейера парсинга (загрузка → разбор → запись)
+
+    Глубина очереди страниц на разбор (текущая, пиковая, средняя), число
+    страниц в работе на каждой стадии и очередь writer'а. Очередь разбора
+    постоянно заполнена — не хватает процессов разбора
+    (PIPELINE_EXTRACT_WORKERS); пуста — узкое место в сети или лимитере;
+    растёт `writer_pending` — не успевает запись в БД.
+    """
+    return pipeline_stats()
+
+
+@app.get("/parse/http-cache")
+async def get_http_cache_stats():
+    """
+    Статистика кэша условных запросов к fragment.com
+
+    `hits` — ответы 304 (запись взята из кэша без загрузки и разбора),
+    `misses` — страницы без записи в кэше, `revalidated` — страница
+    изменилась с прошлого запроса. Кэш выключен, если HTTP_CACHE_PATH пуст.
+    """
+    cache = get_http_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(cache.stats)}
+
+
+@app.get("/traits")
+async def get_trait_refresh_state():
+    """
+    Состояние пересчёта редкости и оценочных цен коллекций
+
+    `pending` — коллекции с новыми или изменившимися гифтами, ждущие
+    пересчёта (раз в TRAIT_REFRESH_SECONDS и после каждой задачи парсинга),
+    `last` — итоги последних пересчётов.
+    """
+    return get_trait_refresher().stats()
+
+
+@app.post("/traits/refresh")
+async def refresh_traits(collection: Optional[str] = None):
+    """
+    Пересчитать редкость и оценочные цены гифтов сейчас
+
+    - **collection**: slug или название коллекции (`plushpepe` или `Plush Pepe`); не задано — все коллекции
+
+    Частоты трейтов (model / backdrop / symbol) считаются по всей коллекции
+    разом: `rarity_score = -Σ log(частота трейта)`, `rarity_rank` — место по
+    редкости (1 — самый редкий). `estimated_price` — флор выставленных на
+    продажу гифтов с той же комбинацией трейтов, иначе наибольший флор пар
+    трейтов, отдельных трейтов, коллекции. Записываются только изменившиеся строки.
+    """
+    try:
+        results = await get_trait_refresher().refresh([collection] if collection else None)
+    except Exception as e:
+        err_id = new_error_id()
+        logger.exception("Ошибка пересчёта редкости (%s)", err_id)
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера (id={err_id})")
+    return {
+        "collections": len(results),
+        "gifts": sum(result["gifts"] for result in results),
+        "rarity_updated": sum(result["rarity_updated"] for result in results),
+        "estimates_updated": sum(result["estimates_updated"] for result in results),
+        "results": results,
+    }
+
+
+@app.get("/cache/stats")
+async def get_read_cache_stats():
+    """
+    Статистика кэша чтения гифтов (`GET /gifts/`, `GET /gifts/{gift_name}`)
+
+    `hit_ratio` — доля ответов из памяти; `evicted` — вытеснено по LRU
+    (кэшу не хватает READ_CACHE_MAX_ENTRIES), `expired` — истёк TTL,
+    `invalidated` — сброшено после записи гифтов. Кэш выключен, если
+    READ_CACHE_MAX_ENTRIES или READ_CACHE_TTL равны 0.
+    """
+    cache = get_read_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/parse/negative-cache")
+async def get_negative_cache_stats(collection: Optional[str] = None):
+    """
+    Статистика негативного кэша: сколько ID записано по каждому исходу
+
+    - **collection**: ограничить одной коллекцией (например, `lootbag`)
+
+    `active` — записи, TTL которых ещё не истёк: такие ID задачи пропускают.
+    """
+    return await run_db(negative_cache_stats, collection)
+
+
+@app.get("/parse/archive")
+async def get_archive_stats():
+    """
+    Состояние архива сырых страниц
+
+    Число и размер сегментов; архив выключен, если не задан ARCHIVE_DIR.
+    Повторный разбор: `python -m app.parser.archive reparse`.
+    """
+    archive = get_page_archive()
+    if archive is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(archive.stats)}
+
+
+@app.get("/parse/recrawl")
+async def get_recrawl_state():
+    """
+    Состояние планировщика обновлений цен
+
+    Бюджет запросов в час, счётчики проверок и изменений, размер очереди и
+    число просроченных гифтов по статусам.
+    """
+    stats = get_recrawl_scheduler().stats()
+    stats["queue"] = await run_db(recrawl_stats)
+    return stats
+
+
+@app.get("/tasks/")
+async def get_all_tasks(limit: int = Query(100, ge=1, le=1000)):
+    """
+    Получить список задач парсинга (последние `limit`, от новых к старым)
+    """
+    jobs = await run_db(job_store.list_jobs, limit)
+    return {
+        "active_tasks": [job for job in jobs if job["status"] not in job_store.FINISHED_STATUSES],
+        "finished_tasks": [job for job in jobs if job["status"] in job_store.FINISHED_STATUSES],
+        "total_tasks": len(jobs),
+    }
+
+
+@app.get("/tasks/{task_id}")
+async def get_task_status(task_id: str):
+    """
+    Получить статус и прогресс фоновой задачи парсинга
+
+    - **task_id**: Идентификатор задачи полученный при запуске парсинга
+    """
+    job = await run_db(job_store.get_job, task_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Задача с ID {task_id} не найдена"
+        )
+    return job
+
+
+async def _control_task(task_id: str, action) -> dict:
+    status = await action(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Задача с ID {task_id} не найдена")
+    return await run_db(job_store.get_job, task_id)
+
+
+@app.post("/tasks/{task_id}/pause")
+async def pause_task(task_id: str):
+    """Приостановить задачу: воркеры дописывают текущее окно и сохраняют контрольную точку."""
+    return await _control_task(task_id, get_job_manager().pause)
+
+
+@app.post("/tasks/{task_id}/resume")
+async def resume_task(task_id: str):
+    """Продолжить приостановленную задачу с контрольной точки."""
+    return await _control_task(task_id, get_job_manager().resume)
+
+
+@app.post("/tasks/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    """Отменить задачу; уже записанные гифты остаются в БД."""
+    return await _control_task(task_id, get_job_manager().cancel)
+
+
+async def get_gifts(page_size: int = 500):
+    """
+    Получить список всех гифтов через API (возвращает JSON).
+
+    Таблица обходится курсорной пагинацией страницами по `page_size`.
     """
+    gifts = []
+    params = {"after_id": 0, "limit": page_size}
     async with aiohttp.ClientSession() as session:
-        async with session.get(f"{config.API_URL}/gifts/") as response:
-            return await response.json()
+        while True:
+            async with session.get(f"{config.API_URL}/gifts/", params=params) as response:
+                page = await response.json()
+            gifts.extend(page["items"])
+            if not page["next_cursor"]:
+                return gifts
+            params = {"cursor": page["next_cursor"], "limit": page_size}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+"""
+Архив сырых страниц fragment.com для повторного разбора без сети.
+
+Страницы дописываются в сегментные файлы `segment-NNNNNN.bin`: каждая
+запись — отдельно сжатый (zlib) HTML, поэтому её можно прочитать по
+смещению, не распаковывая сегмент целиком. Рядом лежит индекс
+`segment-NNNNNN.idx` — строки вида
+
+    collection \\t gift_id \\t fetched_at \\t status \\t offset \\t length
+
+Оба файла только дописываются; когда сегмент превышает `segment_bytes`,
+начинается новый. Запись в индекс делается после записи данных, поэтому
+оборванная запись в конце сегмента просто не попадает в индекс.
+
+Повторный разбор (`python -m app.parser.archive reparse`) прогоняет
+последние версии страниц через текущий экстрактор в пуле процессов и
+записывает результат в БД.
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+SEGMENT_RE = re.compile(r"^segment-(\d{6})\.bin$")
+# Сколько страниц отдаётся одному процессу за раз при повторном разборе
+REPARSE_TASK_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class ArchiveEntry:
+    """Строка индекса архива."""
+
+    collection: str
+    gift_id: int
+    fetched_at: str
+    status: int
+    segment: str
+    offset: int
+    length: int
+
+
+class PageArchive:
+    """Append-only архив страниц в каталоге `directory`."""
+
+    def __init__(self, directory: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES, level: int = 6):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        self._segment: Optional[int] = None
+        self.appended = 0
+        self.bytes_written = 0
+
+    def _segment_path(self, number: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"segment-{number:06d}.{suffix}")
+
+    def segments(self) -> List[str]:
+        """Пути сегментных файлов по порядку."""
+        if not os.path.isdir(self.directory):
+            return []
+        return [
+            os.path.join(self.directory, name)
+            for name in sorted(os.listdir(self.directory))
+            if SEGMENT_RE.match(name)
+        ]
+
+    def _current_segment(self) -> int:
+        if self._segment is None:
+            os.makedirs(self.directory, exist_ok=True)
+            existing = self.segments()
+            self._segment = int(SEGMENT_RE.match(os.path.basename(existing[-1])).group(1)) if existing else 1
+        path = self._segment_path(self._segment, "bin")
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+            self._segment += 1
+        return self._segment
+
+    def append(self, collection: str, gift_id: int, status: int, html: str,
+               fetched_at: Optional[datetime] = None) -> ArchiveEntry:
+        """Дописать страницу в архив (потокобезопасно)."""
+        data = zlib.compress(html.encode("utf-8"), self.level)
+        fetched = (fetched_at or datetime.now()).isoformat(timespec="seconds")
+        with self._lock:
+            number = self._current_segment()
+            with open(self._segment_path(number, "bin"), "ab") as segment:
+                offset = segment.tell()
+                segment.write(data)
+            entry = ArchiveEntry(collection, gift_id, fetched, status,
+                                 f"segment-{number:06d}.bin", offset, len(data))
+            with open(self._segment_path(number, "idx"), "a", encoding="utf-8") as index:
+                index.write(f"{collection}\t{gift_id}\t{fetched}\t{status}\t{offset}\t{len(data)}\n")
+            self.appended += 1
+            self.bytes_written += len(data)
+        return entry
+
+    def iter_entries(self, collection: Optional[str] = None) -> Iterator[ArchiveEntry]:
+        """Все записи индекса в порядке добавления."""
+        for segment_path in self.segments():
+            index_path = segment_path[:-len(".bin")] + ".idx"
+            if not os.path.exists(index_path):
+                continue
+            segment = os.path.basename(segment_path)
+            with open(index_path, encoding="utf-8") as index:
+                for line in index:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) != 6:
+                        continue  # оборванная строка
+                    if collection is not None and parts[0] != collection:
+                        continue
+                    yield ArchiveEntry(parts[0], int(parts[1]), parts[2], int(parts[3]),
+                                       segment, int(parts[4]), int(parts[5]))
+
+    def latest_entries(self, collection: Optional[str] = None) -> List[ArchiveEntry]:
+        """Последняя успешно скачанная версия каждой страницы (collection, gift_id)."""
+        latest: Dict[tuple, ArchiveEntry] = {}
+        for entry in self.iter_entries(collection):
+            if entry.status != 200:
+                continue
+            key = (entry.collection, entry.gift_id)
+            if key not in latest or entry.fetched_at >= latest[key].fetched_at:
+                latest[key] = entry
+        return list(latest.values())
+
+    def read(self, entry: ArchiveEntry) -> str:
+        return read_entries(self.directory, [entry])[0]
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        return {
+            "directory": self.directory,
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(path) for path in segments),
+            "appended": self.appended,
+        }
+
+
+def read_entries(directory: str, entries: List[ArchiveEntry]) -> List[str]:
+    """Прочитать HTML записей (записи одного сегмента читаются через один файл)."""
+    pages = []
+    handles = {}
+    try:
+        for entry in entries:
+            handle = handles.get(entry.segment)
+            if handle is None:
+                handle = handles[entry.segment] = open(os.path.join(directory, entry.segment), "rb")
+            handle.seek(entry.offset)
+            pages.append(zlib.decompress(handle.read(entry.length)).decode("utf-8"))
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return pages
+
+
+def _reparse_entries(directory: str, entries: List[ArchiveEntry], backend: Optional[str]) -> List[dict]:
+    """Разобрать записи архива текущим экстрактором (выполняется в процессе пула)."""
+    from app.DB.models import normalize_slug
+    from .fragment import extract_gift_data
+
+    records = []
+    for entry, html in zip(entries, read_entries(directory, entries)):
+        gift = extract_gift_data(html, entry.gift_id, backend)
+        if gift is not None:
+            gift["collection"] = normalize_slug(entry.collection)
+            records.append(gift)
+    return records
+
+
+def reparse_archive(
+    archive: PageArchive,
+    collection: Optional[str] = None,
+    workers: Optional[int] = None,
+    backend: Optional[str] = None,
+    write: bool = True,
+) -> dict:
+    """
+    Прогнать последние версии страниц через экстрактор и записать гифты в БД.
+
+    Разбор идёт в `ProcessPoolExecutor` (по умолчанию — по числу ядер),
+    запись — пачками через `upsert_gifts` в основном процессе.
+    """
+    from app.DB.writer import upsert_gifts
+
+    started = time.perf_counter()
+    entries = sorted(archive.latest_entries(collection), key=lambda e: (e.segment, e.offset))
+    tasks = [entries[i:i + REPARSE_TASK_SIZE] for i in range(0, len(entries), REPARSE_TASK_SIZE)]
+    parsed = written = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_reparse_entries, archive.directory, task, backend) for task in tasks]
+        for future in as_completed(futures):
+            records = future.result()
+            parsed += len(records)
+            if write and records:
+                written += upsert_gifts(records)
+    result = {
+        "pages": len(entries),
+        "parsed": parsed,
+        "written": written,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info("Повторный разбор архива: %s", result)
+    return result
+
+
+# Общий архив; None — архивирование выключено.
+_default_archive: Optional[PageArchive] = None
+
+
+def configure_page_archive(directory: Optional[str], segment_mb: int = 64) -> Optional[PageArchive]:
+    """Включить архив страниц в каталоге `directory` (пустой — выключить)."""
+    global _default_archive
+    _default_archive = PageArchive(directory, segment_mb * 1024 * 1024) if directory else None
+    return _default_archive
+
+
+def get_page_archive() -> Optional[PageArchive]:
+    return _default_archive
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.bot.config import Config
+    from app.logging_config import init_logging
+
+    init_logging()
+    config = Config()
+    parser = argparse.ArgumentParser(prog="python -m app.parser.archive")
+    parser.add_argument("--dir", default=config.ARCHIVE_DIR or "archive", help="каталог архива")
+    commands = parser.add_subparsers(dest="command", required=True)
+    reparse = commands.add_parser("reparse", help="разобрать архив заново и записать в БД")
+    reparse.add_argument("--collection", help="только одна коллекция (slug)")
+    reparse.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — ядра)")
+    reparse.add_argument("--backend", default=None, help="бэкенд экстрактора: stream или bs4")
+    reparse.add_argument("--dry-run", action="store_true", help="только разобрать, не записывать в БД")
+    commands.add_parser("stats", help="размер архива")
+    args = parser.parse_args(argv)
+
+    archive = PageArchive(args.dir)
+    if args.command == "stats":
+        logger.info("Архив страниц: %s", archive.stats())
+        return 0
+
+    from app.DB.create_database import create_database
+
+    create_database()
+    # Итог разбора reparse_archive пишет в лог сама
+    reparse_archive(
+        archive, collection=args.collection, workers=args.workers,
+        backend=args.backend, write=not args.dry_run,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
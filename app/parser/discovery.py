@@ -0,0 +1,157 @@
+"""
+Автоопределение размера коллекции (максимального существующего ID).
+
+Гифты коллекции нумеруются подряд с 1, но в нумерации встречаются редкие
+дыры. Поиск идёт в два этапа:
+
+1. экспоненциальный (galloping): от известной нижней границы шаг удваивается,
+   пока ID существуют — так находится первая заведомо пустая точка;
+2. бинарный поиск между последней живой и первой пустой точкой.
+
+ID считается «живым», если существует хотя бы один гифт в окне
+`[id, id + hole_window)` — одиночные дыры не ломают монотонность.
+Нужно O(log n) запросов вместо сплошного перебора. Результат кэшируется
+в таблице `collection_sizes` и служит подсказкой для следующего поиска.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import aiohttp
+
+from app.DB.collection_sizes import get_collection_size, save_collection_size
+from app.DB.repository import run_db
+from app.logging_config import get_logger
+from .fetcher import FragmentFetcher, get_default_fetcher
+from .fragment import build_gift_url, extract_gift_data
+
+logger = get_logger(__name__)
+
+
+DEFAULT_HOLE_WINDOW = 5
+DEFAULT_CACHE_TTL = timedelta(hours=24)
+
+
+class DiscoveryError(Exception):
+    """Пробы не дали ответа (сеть/перегрузка), размер коллекции неизвестен."""
+
+
+@dataclass
+class DiscoveryResult:
+    collection: str
+    max_id: int
+    probes: int
+    cached: bool = False
+    discovered_at: Optional[datetime] = None
+
+
+class CollectionProber:
+    """Пробы существования гифтов одной коллекции с подсчётом запросов."""
+
+    def __init__(self, collection: str, fetcher: Optional[FragmentFetcher] = None,
+                 hole_window: int = DEFAULT_HOLE_WINDOW):
+        self.collection = collection
+        self.fetcher = fetcher or get_default_fetcher()
+        self.hole_window = max(1, hole_window)
+        self.probes = 0
+        self._known: Dict[int, bool] = {}
+
+    async def exists(self, gift_id: int) -> bool:
+        """Есть ли на fragment.com гифт с этим ID (данные не сохраняются)."""
+        if gift_id in self._known:
+            return self._known[gift_id]
+        url = build_gift_url(gift_id, self.collection)
+        self.probes += 1
+        # Временные сбои уже повторены fetcher'ом; если и они не помогли — ответа нет
+        try:
+            response = await self.fetcher.fetch(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise DiscoveryError(f"Не удалось проверить {url}: {e!r}") from e
+        if response.status == 404:
+            result = False
+        elif response.status == 200:
+            gift = await asyncio.to_thread(extract_gift_data, response.text, gift_id)
+            result = gift is not None
+        else:
+            raise DiscoveryError(f"Не удалось проверить {url}: HTTP {response.status}")
+        self._known[gift_id] = result
+        return result
+
+    async def alive(self, gift_id: int) -> bool:
+        """Есть ли хотя бы один гифт в окне `[gift_id, gift_id + hole_window)`."""
+        for candidate in range(gift_id, gift_id + self.hole_window):
+            if await self.exists(candidate):
+                return True
+        return False
+
+    async def find_max_id(self, hint: Optional[int] = None) -> int:
+        """Максимальный существующий ID (0 — коллекция пуста)."""
+        low = hint if hint and hint > 1 and await self.alive(hint) else 1
+        if not await self.alive(low):
+            return 0
+
+        # Экспоненциальная фаза: low жив, ищем первую пустую точку high
+        step = 1
+        high = low + step
+        while await self.alive(high):
+            low = high
+            step *= 2
+            high = low + step
+
+        # Бинарная фаза: alive(low) и не alive(high)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if await self.alive(middle):
+                low = middle
+            else:
+                high = middle
+
+        # alive(low) и не alive(low + 1): в окне low единственный живой ID — сам low
+        return low
+
+
+# Один поиск на коллекцию одновременно: параллельные запросы ждут общий результат
+_locks: Dict[str, asyncio.Lock] = {}
+_cache_ttl = DEFAULT_CACHE_TTL
+_hole_window = DEFAULT_HOLE_WINDOW
+
+
+def configure_discovery(cache_ttl_hours: float, hole_window: int) -> None:
+    """Задать срок жизни кэша и окно допуска дыр (вызывается при старте приложения)."""
+    global _cache_ttl, _hole_window
+    _cache_ttl = timedelta(hours=cache_ttl_hours)
+    _hole_window = hole_window
+
+
+async def discover_collection_size(
+    collection: str,
+    refresh: bool = False,
+    fetcher: Optional[FragmentFetcher] = None,
+) -> DiscoveryResult:
+    """
+    Найти максимальный ID коллекции `collection` (slug, например `lootbag`).
+
+    Свежий результат берётся из кэша; устаревший используется как нижняя
+    граница для нового поиска. `refresh=True` — искать заново в любом случае.
+    """
+    lock = _locks.setdefault(collection, asyncio.Lock())
+    async with lock:
+        cached = await run_db(get_collection_size, collection)
+        if (
+            cached is not None
+            and not refresh
+            and datetime.now() - cached["discovered_at"] < _cache_ttl
+        ):
+            return DiscoveryResult(
+                collection, cached["max_id"], 0, cached=True, discovered_at=cached["discovered_at"]
+            )
+
+        prober = CollectionProber(collection, fetcher=fetcher, hole_window=_hole_window)
+        max_id = await prober.find_max_id(hint=cached["max_id"] if cached else None)
+        saved = await run_db(save_collection_size, collection, max_id, prober.probes)
+        logger.info(
+            "Коллекция %s: максимальный ID %s (%s проб)", collection, max_id, prober.probes
+        )
+        return DiscoveryResult(collection, max_id, prober.probes, discovered_at=saved["discovered_at"])
@@ -0,0 +1,268 @@
+"""
+Извлечение полей гифта из HTML страницы fragment.com.
+
+Нужны только заголовок, ячейка с ценой и три ссылки с трейтами, поэтому
+кроме BeautifulSoup (полное дерево, запасной вариант) есть потоковый
+бэкенд на `html.parser`, который не строит дерево и останавливается,
+как только все поля найдены.
+
+Проверка совпадения бэкендов на сохранённых страницах из `samples/`:
+
+    python -m app.parser.extractors
+"""
+
+import os
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+from app.logging_config import get_logger, init_logging
+
+logger = get_logger(__name__)
+
+
+TITLE_CLASS = "tm-section-header-title"
+PRICE_CLASS = "table-cell-value tm-value icon-before icon-ton"
+TRAIT_LINK_CLASS = "table-cell-value-link"
+TRAITS_NEEDED = 3
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), "samples")
+
+
+@dataclass
+class RawGiftFields:
+    """Сырые (необработанные) значения полей со страницы гифта."""
+
+    title: Optional[str] = None
+    price: Optional[str] = None
+    traits: List[str] = field(default_factory=list)
+
+
+def extract_with_bs4(html: str) -> RawGiftFields:
+    """Полный разбор страницы через BeautifulSoup (исходная реализация)."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    title_tag = soup.find(class_=TITLE_CLASS)
+    price_tag = soup.find(class_=PRICE_CLASS)
+    links = soup.find_all("a", class_=TRAIT_LINK_CLASS, limit=TRAITS_NEEDED)
+
+    return RawGiftFields(
+        title=title_tag.text if title_tag else None,
+        price=price_tag.text if price_tag else None,
+        traits=[tag.text for tag in links],
+    )
+
+
+class _Done(Exception):
+    """Сигнал досрочной остановки потокового парсера."""
+
+
+# Теги без закрывающей пары не попадают в стек открытых элементов
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+
+# Пробельные символы, которые BeautifulSoup считает пустым текстом
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+class _Capture:
+    __slots__ = ("slot", "level", "parts")
+
+    def __init__(self, slot: str, level: int):
+        self.slot = slot
+        # Глубина стека открытых тегов, на которой начался элемент
+        self.level = level
+        self.parts: List[str] = []
+
+
+class _StreamingGiftParser(HTMLParser):
+    """
+    Потоковый токенизатор: собирает текст нужных элементов без построения
+    дерева и бросает `_Done`, когда найдены все поля.
+
+    Закрывающие теги обрабатываются так же, как в BeautifulSoup: тег без
+    открытой пары игнорируется, а закрытие внешнего тега закрывает и все
+    вложенные незакрытые.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.result = RawGiftFields()
+        self._stack: List[str] = []
+        self._captures: List[_Capture] = []
+        self._title_seen = False
+        self._price_seen = False
+        self._traits_seen = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            return
+        self._stack.append(tag)
+
+        class_attr = None
+        for name, value in attrs:
+            if name == "class":
+                class_attr = value
+                break
+        if not class_attr:
+            return
+
+        level = len(self._stack)
+        classes = class_attr.split()
+        if not self._title_seen and TITLE_CLASS in classes:
+            self._title_seen = True
+            self._captures.append(_Capture("title", level))
+        if not self._price_seen and " ".join(classes) == PRICE_CLASS:
+            self._price_seen = True
+            self._captures.append(_Capture("price", level))
+        if tag == "a" and self._traits_seen < TRAITS_NEEDED and TRAIT_LINK_CLASS in classes:
+            self._traits_seen += 1
+            self._captures.append(_Capture("trait", level))
+
+    def handle_startendtag(self, tag, attrs):
+        # <tag/> не содержит текста и не меняет стек
+        return
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS or tag not in self._stack:
+            return
+        while self._stack.pop() != tag:
+            pass
+        if not self._captures:
+            return
+
+        depth = len(self._stack)
+        still_open = []
+        for capture in self._captures:
+            if capture.level <= depth:
+                still_open.append(capture)
+            else:
+                self._store(capture)
+        self._captures = still_open
+        if self._is_complete():
+            raise _Done
+
+    def handle_data(self, data):
+        if not self._captures:
+            return
+        if not data.strip(_ASCII_SPACES):
+            # Как BeautifulSoup: текст из одних пробелов сжимается до одного символа
+            data = "\n" if "\n" in data else " "
+        for capture in self._captures:
+            capture.parts.append(data)
+
+    def _store(self, capture: _Capture) -> None:
+        text = "".join(capture.parts)
+        if capture.slot == "title":
+            self.result.title = text
+        elif capture.slot == "price":
+            self.result.price = text
+        else:
+            self.result.traits.append(text)
+
+    def _is_complete(self) -> bool:
+        return (
+            not self._captures
+            and self.result.title is not None
+            and self.result.price is not None
+            and len(self.result.traits) == TRAITS_NEEDED
+        )
+
+    def finish(self) -> RawGiftFields:
+        # Незакрытые элементы в конце документа отдают накопленный текст,
+        # как это делает BeautifulSoup
+        for capture in self._captures:
+            self._store(capture)
+        self._captures = []
+        return self.result
+
+
+def extract_streaming(html: str) -> RawGiftFields:
+    """Быстрый разбор без построения дерева с ранней остановкой."""
+    parser = _StreamingGiftParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _Done:
+        pass
+    return parser.finish()
+
+
+EXTRACTORS: Dict[str, Callable[[str], RawGiftFields]] = {
+    "stream": extract_streaming,
+    "bs4": extract_with_bs4,
+}
+
+DEFAULT_BACKEND = "stream"
+
+
+def set_default_backend(name: str) -> None:
+    """Выбрать бэкенд по умолчанию (вызывается при старте приложения)."""
+    global DEFAULT_BACKEND
+    get_extractor(name)
+    DEFAULT_BACKEND = name
+
+
+def get_extractor(name: Optional[str] = None) -> Callable[[str], RawGiftFields]:
+    """Вернуть функцию-экстрактор по имени бэкенда (по умолчанию `stream`)."""
+    name = name or DEFAULT_BACKEND
+    try:
+        return EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(
+            f"Неизвестный бэкенд парсинга '{name}', доступны: {', '.join(EXTRACTORS)}"
+        ) from None
+
+
+def extract_fields(html: str, backend: Optional[str] = None) -> RawGiftFields:
+    """
+    Извлечь поля выбранным бэкендом.
+
+    Если быстрый бэкенд падает на нестандартной разметке, страница
+    повторно разбирается через BeautifulSoup.
+    """
+    extractor = get_extractor(backend)
+    if extractor is extract_with_bs4:
+        return extractor(html)
+    try:
+        return extractor(html)
+    except Exception:
+        logger.exception("Бэкенд %s не смог разобрать страницу, используем bs4", backend or DEFAULT_BACKEND)
+        return extract_with_bs4(html)
+
+
+def compare_backends(samples_dir: str = SAMPLES_DIR) -> List[str]:
+    """
+    Прогнать все сохранённые страницы через все бэкенды и вернуть список
+    файлов, на которых результат `extract_gift_data` различается.
+    """
+    from .fragment import extract_gift_data
+
+    mismatched = []
+    for filename in sorted(os.listdir(samples_dir)):
+        if not filename.endswith(".html"):
+            continue
+        with open(os.path.join(samples_dir, filename), encoding="utf-8") as f:
+            html = f.read()
+        results = {name: extract_gift_data(html, 1, backend=name) for name in EXTRACTORS}
+        reference = results["bs4"]
+        for name, result in results.items():
+            if result != reference:
+                logger.error("%s: бэкенд %s вернул %r, bs4 — %r", filename, name, result, reference)
+                mismatched.append(filename)
+                break
+        else:
+            logger.info("%s: OK %r", filename, reference)
+    return mismatched
+
+
+if __name__ == "__main__":
+    import sys
+
+    init_logging()
+    sys.exit(1 if compare_backends() else 0)
@@ -0,0 +1,193 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import aiohttp
+
+from app.logging_config import get_logger
+from .rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+from .resilience import get_circuit_breaker, get_retry_policy, is_transient_status
+
+logger = get_logger(__name__)
+
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"
+}
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 10.0
+
+
+@dataclass
+class FetchResponse:
+    """
+    Результат одного запроса к fragment.com.
+
+    Тело хранится байтами (`body`): конвейер парсинга передаёт их в пул
+    процессов как есть, а `text` декодируется только по требованию.
+    """
+
+    url: str
+    status: int
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+    encoding: str = "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.body.decode(self.encoding, errors="replace")
+
+
+class FragmentFetcher:
+    """
+    Асинхронный клиент fragment.com с общим пулом соединений.
+
+    Одна `aiohttp.ClientSession` переиспользуется всеми запросами (keep-alive),
+    число одновременных запросов ограничено семафором `concurrency`, темп
+    запросов задаёт общий `AdaptiveRateLimiter`, а повторы и паузы при
+    недоступности сервера — `app.parser.resilience`.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        keepalive_timeout: float = 30.0,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency должен быть >= 1")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self._rate_limiter = rate_limiter
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.retries = 0
+
+    @property
+    def rate_limiter(self) -> AdaptiveRateLimiter:
+        return self._rate_limiter or get_rate_limiter()
+
+    async def start(self) -> None:
+        """Создать сессию и пул соединений (вызывается лениво при первом запросе)."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.concurrency,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self) -> None:
+        """Закрыть сессию и освободить соединения пула."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self) -> "FragmentFetcher":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResponse:
+        """
+        Выполнить GET-запрос через общий пул с повторами временных сбоев.
+
+        `headers` дополняют общие заголовки сессии (например, условные
+        `If-None-Match` / `If-Modified-Since` из HTTP-кэша).
+
+        Сетевые ошибки и 408/429/5xx повторяются по `RetryPolicy`, перед
+        каждой попыткой запрос ждёт общий предохранитель. Если попытки
+        кончились, ошибка сети (`aiohttp.ClientError`, `asyncio.TimeoutError`)
+        пробрасывается, а HTTP-статус возвращается как есть.
+        """
+        policy = get_retry_policy()
+        breaker = get_circuit_breaker()
+        for attempt in range(1, policy.attempts + 1):
+            await breaker.wait()
+            try:
+                response = await self._fetch_once(url, headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure(type(e).__name__)
+                if attempt == policy.attempts:
+                    raise
+                reason = repr(e)
+            else:
+                if not is_transient_status(response.status):
+                    breaker.record_success()
+                    return response
+                breaker.record_failure(f"HTTP {response.status}")
+                if attempt == policy.attempts:
+                    return response
+                reason = f"HTTP {response.status}"
+            self.retries += 1
+            delay = policy.delay(attempt)
+            logger.info("Повтор %s через %.1f с (%s, попытка %s/%s)", url, delay, reason, attempt, policy.attempts)
+            await asyncio.sleep(delay)
+
+    async def _fetch_once(self, url: str, headers: Optional[Dict[str, str]]) -> FetchResponse:
+        """
+        Один GET-запрос через общий пул.
+
+        Каждый ответ (и таймаут) сообщается лимитеру для подстройки скорости.
+        """
+        await self.start()
+        limiter = self.rate_limiter
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            await limiter.acquire()
+            started = loop.time()
+            try:
+                async with self._session.get(url, headers=headers) as response:
+                    body = await response.read()
+                    encoding = response.get_encoding() if body else "utf-8"
+            except asyncio.TimeoutError:
+                limiter.on_throttle("timeout")
+                raise
+            limiter.record_response(response.status, response.headers.get("Retry-After"))
+            return FetchResponse(
+                url=url,
+                status=response.status,
+                body=body,
+                headers=dict(response.headers),
+                elapsed=loop.time() - started,
+                encoding=encoding,
+            )
+
+
+# Общий экземпляр для API и фоновых задач.
+_default_fetcher: Optional[FragmentFetcher] = None
+
+
+def configure_default_fetcher(concurrency: int, timeout: float = DEFAULT_TIMEOUT) -> FragmentFetcher:
+    """Задать параметры общего клиента (вызывается при старте приложения)."""
+    global _default_fetcher
+    _default_fetcher = FragmentFetcher(concurrency=concurrency, timeout=timeout)
+    return _default_fetcher
+
+
+def get_default_fetcher() -> FragmentFetcher:
+    """Вернуть общий клиент, создав его с настройками по умолчанию при необходимости."""
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = FragmentFetcher()
+    return _default_fetcher
+
+
+async def close_default_fetcher() -> None:
+    """Закрыть общий клиент (вызывается при остановке приложения)."""
+    if _default_fetcher is not None:
+        await _default_fetcher.close()
@@ -1,5 +1,9 @@
 import requests, time
-from bs4 import BeautifulSoup
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
 from requests.exceptions import RequestException
 import logging
 
@@ -8,76 +12,238 @@ from app.logging_config import get_logger
 logger = get_logger(__name__)
 
 # Импортируем модули БД относительно пакета app
-from ..DB.create_database import start_database, create_database
+from ..DB.create_database import create_database
+from ..DB.models import ParseOutcome, normalize_slug, parse_sale_price, split_gift_name
+from ..DB.repository import run_db
+from ..DB.writer import GiftBatchWriter, upsert_gifts
+from .archive import get_page_archive
+from .extractors import extract_fields
+from .fetcher import HEADERS, FragmentFetcher, get_default_fetcher
+from .http_cache import get_http_cache
+from .rate_limiter import get_rate_limiter
+from .resilience import get_circuit_breaker, get_retry_policy, is_transient_status
+
+
+def build_gift_url(gift_id: int, user_selection_gifts: str) -> str:
+    """Собрать URL страницы гифта на fragment.com."""
+    return f"https://fragment.com/gift/{user_selection_gifts}-{gift_id}"
+
+
+def extract_gift_data(html: str, gift_id: int, backend: Optional[str] = None) -> Optional[dict]:
+    """
+    Извлекает данные гифта из HTML страницы fragment.com
+
+    - **backend**: бэкенд из `extractors.EXTRACTORS` (по умолчанию потоковый)
+
+    Кроме сырого `sale_price` возвращает разобранные `price_ton` и `status`.
+    Возвращает None, если на странице недостаточно данных.
+    """
+    fields = extract_fields(html, backend)
+
+    name_gift_id = fields.title.strip() if fields.title is not None else None
+    sale_price = fields.price.replace("TON", "").strip() if fields.price is not None else "Minted"
+
+    traits = [text.strip() for text in fields.traits]
+    if len(traits) < 3 or not all(traits[:3]):
+        logger.info("Пропускаем Gift #%s — недостаточно данных", gift_id)
+        return None
+
+    price_ton, status = parse_sale_price(sale_price)
+
+    return {
+        "id": gift_id,
+        "name": name_gift_id,
+        "model": traits[0],
+        "backdrop": traits[1],
+        "symbol": traits[2],
+        "sale_price": sale_price,
+        "price_ton": price_ton,
+        "status": status
+    }
+
+
+def save_gift_data(gift_data: dict) -> bool:
+    """
+    Сохранить данные гифта в БД (upsert по коллекции и `id`). Возвращает False при ошибке записи.
 
+    Схема БД должна быть создана заранее (`create_database()` при старте).
+    """
+    try:
+        upsert_gifts([gift_data])
+    except Exception as e:
+        logger.exception("Ошибка при сохранении Gift #%s в БД: %s", gift_data["id"], e)
+        return False
+    return True
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"
-}
 
 def parse_fragment(
-    gift_id: int, 
+    gift_id: int,
     user_selection_gifts: str
-    ):  
-    
+    ):
+
     """
     Парсит данные о гифте по ID с fragment.com
     """
 
-    url = f"https://fragment.com/gift/{user_selection_gifts}-{gift_id}"
-    
+    url = build_gift_url(gift_id, user_selection_gifts)
+    limiter = get_rate_limiter()
+    cache = get_http_cache()
+    entry = cache.lookup(url) if cache is not None else None
+
+    policy = get_retry_policy()
+    breaker = get_circuit_breaker()
+    headers = {**HEADERS, **entry.conditional_headers()} if entry else HEADERS
+
+    for attempt in range(1, policy.attempts + 1):
+        breaker.wait_blocking()
+        try:
+            limiter.acquire_blocking()
+            try:
+                response = requests.get(url, headers=headers, timeout=10)
+            except requests.Timeout:
+                limiter.on_throttle("timeout")
+                raise
+            limiter.record_response(response.status_code, response.headers.get("Retry-After"))
+        except RequestException as e:
+            breaker.record_failure(type(e).__name__)
+            error = e
+        else:
+            if not is_transient_status(response.status_code):
+                breaker.record_success()
+                break
+            breaker.record_failure(f"HTTP {response.status_code}")
+            error = f"HTTP {response.status_code}"
+        if attempt == policy.attempts:
+            logger.warning("Ошибка запроса %s: %s", url, error)
+            return None
+        time.sleep(policy.delay(attempt))
+
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
         response.raise_for_status()
     except RequestException as e:
         logger.warning("Ошибка запроса %s: %s", url, e)
         return None
-    
-    soup = BeautifulSoup(response.text, "html.parser")
-    
-    name_gift_id_tag = soup.find(class_="tm-section-header-title")
-    name_gift_id = name_gift_id_tag.text.strip() if name_gift_id_tag else None
-    
-    sale_price_teg = soup.find(class_="table-cell-value tm-value icon-before icon-ton")
-    sale_price = sale_price_teg.text.replace("TON", "").strip() if sale_price_teg else "Minted"
-    
-    tags = soup.find_all("a", class_="table-cell-value-link")
-    if len(tags) < 3 or not all(tags[i].text.strip() for i in range(3)):
-        logger.info("Пропускаем Gift #%s — недостаточно данных", gift_id)
+
+    if response.status_code == 304 and entry is not None:
+        gift_data = cache.hit(entry)
+    else:
+        archive = get_page_archive()
+        if archive is not None:
+            archive.append(user_selection_gifts, gift_id, response.status_code, response.text)
+
+        gift_data = extract_gift_data(response.text, gift_id)
+        if cache is not None:
+            cache.store(url, response.headers, gift_data, entry is not None)
+        if gift_data is None:
+            return None
+
+    # Номер гифта уникален только внутри коллекции: пишем его вместе со slug
+    gift_data = {**gift_data, "collection": normalize_slug(user_selection_gifts)}
+    if not save_gift_data(gift_data):
         return None
-    
-    model = tags[0].text.strip()
-    backdrop = tags[1].text.strip()
-    symbol = tags[2].text.strip()
-    
-    gift_data = {
-        "id": gift_id,
-        "name": name_gift_id,
-        "model": model,
-        "backdrop": backdrop,
-        "symbol": symbol,
-        "sale_price": sale_price
-    }
-    
+    # Возвращаем собранные данные после успешного сохранения
+    return gift_data
+
+
+@dataclass
+class ParseResult:
+    """Итог разбора одного ID: исход и данные гифта (только при `ParseOutcome.OK`)."""
+
+    outcome: ParseOutcome
+    gift: Optional[dict] = None
+    http_status: Optional[int] = None
+
+
+def outcome_for_status(status: int) -> ParseOutcome:
+    """
+    Исход для ответа без страницы гифта (всё, кроме 200).
+
+    Повторять имеет смысл только временные статусы (`is_transient_status`);
+    прочие отказы (403, 410, ...) окончательны, как и 404.
+    """
+    if status == 404:
+        return ParseOutcome.NOT_FOUND
+    if is_transient_status(status):
+        return ParseOutcome.HTTP_ERROR
+    return ParseOutcome.HTTP_REJECTED
+
+
+async def parse_gift_async(
+    gift_id: int,
+    user_selection_gifts: str,
+    fetcher: Optional[FragmentFetcher] = None,
+    writer: Optional[GiftBatchWriter] = None,
+) -> ParseResult:
+    """
+    Асинхронный разбор гифта с fragment.com с указанием исхода.
+
+    Запрос идёт через `FragmentFetcher`, а разбор HTML и запись в БД
+    выполняются в потоках (запись — в пуле БД), чтобы не блокировать
+    event loop. Если передан
+    `writer`, запись ставится в его очередь и попадает в БД пачкой;
+    исход `OK` возвращается только после коммита этой пачки.
+
+    Исход (404, недостаточно данных, сетевая ошибка и т.д.) нужен
+    задачам массового парсинга для негативного кэша. Если включён HTTP-кэш,
+    запрос условный, и на 304 запись берётся из кэша без разбора.
+    """
+    fetcher = fetcher or get_default_fetcher()
+    url = build_gift_url(gift_id, user_selection_gifts)
+    cache = get_http_cache()
+    entry = await asyncio.to_thread(cache.lookup, url) if cache is not None else None
+
     try:
-        create_database()
-        start_database(
-            id=gift_id,
-            name=name_gift_id,
-            model=model,
-            backdrop=backdrop,
-            symbol=symbol,
-            sale_price=sale_price,
-        )
-    except Exception as e:
-        logger.exception("Ошибка при сохранении Gift #%s в БД: %s", gift_id, e)
-        return None
+        response = await fetcher.fetch(url, headers=entry.conditional_headers() if entry else None)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning("Ошибка запроса %s: %r", url, e)
+        return ParseResult(ParseOutcome.NETWORK_ERROR)
+
+    if response.status == 304 and entry is not None:
+        # Страница не изменилась: тело не передавалось, запись берём из кэша
+        gift_data = await asyncio.to_thread(cache.hit, entry)
+    elif response.status != 200:
+        logger.warning("Ошибка запроса %s: HTTP %s", url, response.status)
+        return ParseResult(outcome_for_status(response.status), http_status=response.status)
+    else:
+        archive = get_page_archive()
+        if archive is not None:
+            # Сырой HTML сохраняется, чтобы после правок экстрактора разобрать его заново без сети
+            await asyncio.to_thread(archive.append, user_selection_gifts, gift_id, response.status, response.text)
+
+        gift_data = await asyncio.to_thread(extract_gift_data, response.text, gift_id)
+        if cache is not None:
+            await asyncio.to_thread(cache.store, url, response.headers, gift_data, entry is not None)
+        if gift_data is None:
+            return ParseResult(ParseOutcome.INSUFFICIENT_DATA, http_status=response.status)
+
+    gift_data = {**gift_data, "collection": normalize_slug(user_selection_gifts)}
+    if writer is not None:
+        saved = await (await writer.put(gift_data))
     else:
-        # Возвращаем собранные данные после успешного сохранения
-        return gift_data
-    
+        saved = await run_db(save_gift_data, gift_data)
+    if not saved:
+        return ParseResult(ParseOutcome.DB_ERROR, http_status=response.status)
+    return ParseResult(ParseOutcome.OK, gift_data, response.status)
+
+
+async def parse_fragment_async(
+    gift_id: int,
+    user_selection_gifts: str,
+    fetcher: Optional[FragmentFetcher] = None,
+    writer: Optional[GiftBatchWriter] = None,
+):
+    """
+    Асинхронный вариант `parse_fragment` поверх общего пула соединений.
+
+    Возвращает данные гифта или None (подробный исход — `parse_gift_async`).
+    """
+    result = await parse_gift_async(gift_id, user_selection_gifts, fetcher=fetcher, writer=writer)
+    return result.gift
+
+
 if __name__ == "__main__":
     # Для тестирования можно задать значение по умолчанию
+    create_database()
     for num in range(1, 10):
         data = parse_fragment(num, "lootbag")  # Передаем оба параметра
         if data:
@@ -85,4 +251,4 @@ if __name__ == "__main__":
                 logger.info("%s: %s", key, value)
         time.sleep(1)
 
-    # конец модуля
\ No newline at end of file
+    # конец модуля
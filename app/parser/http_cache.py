@@ -0,0 +1,222 @@
+"""
+Кэш условных запросов к fragment.com.
+
+Для каждой страницы гифта хранятся валидаторы ответа (`ETag`,
+`Last-Modified`) и уже разобранная запись гифта. При повторном запросе
+отправляются `If-None-Match` / `If-Modified-Since`; на ответ 304 тело не
+передаётся, и запись берётся из кэша без разбора HTML.
+
+Кэш лежит в отдельном файле SQLite (не в `gifts.db`), размер ограничен
+числом записей: при переполнении вытесняются давно не использованные
+(LRU по `used_at`). Страницы без валидаторов не кэшируются.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.DB.models import GiftStatus
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+DEFAULT_MAX_ENTRIES = 200_000
+# При переполнении вытесняется сразу часть записей, а не по одной на вставку
+EVICT_FRACTION = 0.1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    record TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_http_cache_used_at ON http_cache (used_at);
+"""
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Валидаторы страницы и разобранная запись гифта."""
+
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    record: dict
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def validators(headers) -> Optional[tuple]:
+    """(ETag, Last-Modified) из заголовков ответа; None, если их нет."""
+    # FetchResponse.headers — обычный dict, регистр имён не нормализован
+    lowered = {name.lower(): value for name, value in headers.items()}
+    etag = lowered.get("etag")
+    last_modified = lowered.get("last-modified")
+    return (etag, last_modified) if etag or last_modified else None
+
+
+def _dump_record(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False)
+
+
+def _load_record(raw: str) -> dict:
+    record = json.loads(raw)
+    if record.get("status") is not None:
+        record["status"] = GiftStatus(record["status"])
+    return record
+
+
+class HttpCache:
+    """
+    Кэш в файле SQLite `path` не больше `max_entries` записей.
+
+    Методы синхронные и потокобезопасные; из async-кода их вызывают
+    через `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stored = 0
+        self.evicted = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._count = self._conn.execute("SELECT COUNT(*) FROM http_cache").fetchone()[0]
+        return self._conn
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Запись для `url`, если есть (без учёта в счётчиках)."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT etag, last_modified, record FROM http_cache WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(url, row[0], row[1], _load_record(row[2]))
+
+    def hit(self, entry: CacheEntry) -> dict:
+        """Ответ 304: отметить использование записи и вернуть её."""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE http_cache SET used_at = ? WHERE url = ?", (time.time(), entry.url)
+            )
+            self.hits += 1
+        return entry.record
+
+    def store(self, url: str, headers, record: Optional[dict], had_entry: bool = False) -> bool:
+        """
+        Ответ 200: сохранить запись с валидаторами ответа.
+
+        `had_entry` — запрос был условным, но страница изменилась. Без
+        валидаторов или без записи (страница не разобрана) старая запись
+        удаляется.
+        """
+        found = validators(headers)
+        with self._lock:
+            conn = self._connect()
+            if had_entry:
+                self.revalidated += 1
+            else:
+                self.misses += 1
+            if found is None or record is None:
+                if had_entry:
+                    self._count -= conn.execute("DELETE FROM http_cache WHERE url = ?", (url,)).rowcount
+                return False
+            now = time.time()
+            conn.execute(
+                "INSERT INTO http_cache (url, etag, last_modified, record, stored_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, "
+                "last_modified = excluded.last_modified, record = excluded.record, "
+                "stored_at = excluded.stored_at, used_at = excluded.used_at",
+                (url, found[0], found[1], _dump_record(record), now, now),
+            )
+            self.stored += 1
+            if not had_entry:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict(conn)
+        return True
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        target = int(self.max_entries * (1 - EVICT_FRACTION))
+        excess = self._count - target
+        conn.execute(
+            "DELETE FROM http_cache WHERE url IN "
+            "(SELECT url FROM http_cache ORDER BY used_at LIMIT ?)",
+            (excess,),
+        )
+        self._count = conn.execute("SELECT COUNT(*) FROM http_cache").fetchone()[0]
+        self.evicted += excess
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._connect()
+            requests = self.hits + self.misses + self.revalidated
+            return {
+                "path": self.path,
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "stored": self.stored,
+                "evicted": self.evicted,
+                "hit_ratio": round(self.hits / requests, 3) if requests else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+
+
+# Общий кэш; None — условные запросы выключены.
+_default_cache: Optional[HttpCache] = None
+
+
+def configure_http_cache(path: Optional[str], max_entries: int = DEFAULT_MAX_ENTRIES) -> Optional[HttpCache]:
+    """Включить кэш в файле `path` (пустой — выключить)."""
+    global _default_cache
+    close_http_cache()
+    _default_cache = HttpCache(path, max_entries) if path else None
+    return _default_cache
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    return _default_cache
+
+
+def close_http_cache() -> None:
+    """Закрыть файл кэша (вызывается при остановке приложения)."""
+    if _default_cache is not None:
+        _default_cache.close()
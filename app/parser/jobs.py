@@ -0,0 +1,339 @@
+"""
+Исполнитель задач массового парсинга.
+
+Состояние задач хранится в SQLite (`app.DB.job_store`), поэтому после
+перезапуска API незавершённые задачи продолжаются с последней контрольной
+точки. Каждая задача обрабатывается несколькими воркерами: воркер берёт
+свободный чанк и прогоняет его ID через конвейер (`app.parser.pipeline`:
+`window` параллельных загрузок, разбор в пуле процессов, пакетная запись),
+а каждые `checkpoint_every` ID сохраняет `next_id` чанка. Успешный результат
+по ID приходит только после записи гифта в БД, поэтому контрольная точка не
+обгоняет запись. ID, которые по негативному кэшу заведомо пусты,
+не запрашиваются.
+
+Задача может охватывать несколько коллекций: её воркеры берут чанки всех
+коллекций из общей очереди (`job_store.claim_chunk` чередует коллекции с
+учётом весов), так что одна большая коллекция не задерживает маленькие, а
+все они делят `concurrency` задачи и общий лимитер запросов.
+
+Временные сбои (сеть, 429/5xx после повторов fetcher'а) не считаются
+ошибкой: такие ID откладываются (`deferred` чанка) и запрашиваются снова в
+конце чанка. Так же откладываются ID, гифт которых не удалось записать в
+БД (`DB_ERROR`): страница была в порядке, повтор скачает и запишет её
+заново. Окончательной ошибкой они становятся, только если не прошли и
+после `deferred_rounds` повторов.
+
+Негативный кэш пополняется только задачами, поэтому после каждой
+завершённой задачи из него удаляются записи с истёкшим TTL.
+"""
+
+import asyncio
+import math
+from typing import Dict, List, Optional, Tuple
+
+from app.DB import job_store, negative_cache
+from app.DB.models import JobStatus, ParseOutcome
+from app.DB.repository import run_db
+from app.DB.writer import get_gift_writer
+from app.logging_config import get_logger, new_error_id
+from app.price_calculator import get_trait_refresher
+from .pipeline import DEFAULT_QUEUE_SIZE, CrawlPipeline, extract_pool_workers
+from .resilience import get_retry_policy, is_transient_outcome
+
+logger = get_logger(__name__)
+
+
+DEFAULT_CHUNK_WORKERS = 2
+DEFAULT_CHECKPOINT_EVERY = 100
+# Сколько раз в конце чанка повторяются ID с временными сбоями
+DEFAULT_DEFERRED_ROUNDS = 3
+
+
+class JobManager:
+    """Запуск, пауза, отмена и восстановление задач массового парсинга."""
+
+    def __init__(
+        self,
+        chunk_size: int = job_store.DEFAULT_CHUNK_SIZE,
+        chunk_workers: int = DEFAULT_CHUNK_WORKERS,
+        checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        deferred_rounds: int = DEFAULT_DEFERRED_ROUNDS,
+    ):
+        self.chunk_size = chunk_size
+        self.chunk_workers = chunk_workers
+        self.checkpoint_every = checkpoint_every
+        self.queue_size = queue_size
+        self.deferred_rounds = deferred_rounds
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Задачи, воркерам которых нужно остановиться после текущего окна
+        self._stop_requested = set()
+
+    async def submit(self, collection: str, start_id: int, end_id: int, concurrency: int) -> dict:
+        """Создать задачу в БД и запустить её."""
+        job = await run_db(
+            job_store.create_job, collection, start_id, end_id, concurrency, self.chunk_size
+        )
+        self._start(job["task_id"])
+        return job
+
+    async def submit_many(self, ranges: List[Tuple[str, int, int, float]], concurrency: int) -> dict:
+        """
+        Создать и запустить одну задачу по нескольким коллекциям.
+
+        `ranges` — кортежи (коллекция, start_id, end_id, вес); воркеры задачи
+        берут чанки коллекций по очереди с учётом весов и делят общий
+        `concurrency`.
+        """
+        job = await run_db(job_store.create_multi_job, ranges, concurrency, self.chunk_size)
+        self._start(job["task_id"])
+        return job
+
+    async def pause(self, job_id: str) -> Optional[JobStatus]:
+        status = await run_db(
+            job_store.set_job_status, job_id, JobStatus.PAUSED,
+            (JobStatus.PENDING, JobStatus.RUNNING),
+        )
+        if status == JobStatus.PAUSED:
+            self._stop_requested.add(job_id)
+        return status
+
+    async def cancel(self, job_id: str) -> Optional[JobStatus]:
+        status = await run_db(
+            job_store.set_job_status, job_id, JobStatus.CANCELLED,
+            (JobStatus.PENDING, JobStatus.RUNNING, JobStatus.PAUSED),
+        )
+        if status == JobStatus.CANCELLED:
+            self._stop_requested.add(job_id)
+        return status
+
+    async def resume(self, job_id: str) -> Optional[JobStatus]:
+        status = await run_db(
+            job_store.set_job_status, job_id, JobStatus.RUNNING, (JobStatus.PAUSED,)
+        )
+        if status == JobStatus.RUNNING:
+            # Воркеры после паузы могут ещё дописывать последнее окно
+            previous = self._tasks.get(job_id)
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+            self._start(job_id)
+        return status
+
+    async def resume_unfinished(self) -> None:
+        """Продолжить задачи, прерванные остановкой или падением процесса."""
+        for job_id in await run_db(job_store.recover_jobs):
+            logger.info("Продолжаем задачу парсинга %s с контрольной точки", job_id)
+            self._start(job_id)
+
+    async def stop(self) -> None:
+        """Остановить воркеры (вызывается при остановке приложения); задачи продолжатся при старте."""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def running(self) -> int:
+        return sum(1 for task in self._tasks.values() if not task.done())
+
+    def _start(self, job_id: str) -> None:
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            return
+        self._stop_requested.discard(job_id)
+        self._tasks[job_id] = asyncio.create_task(self._run_job(job_id))
+
+    async def _run_job(self, job_id: str) -> None:
+        job = await run_db(job_store.get_job, job_id)
+        if job is None:
+            return
+        status = await run_db(
+            job_store.set_job_status, job_id, JobStatus.RUNNING,
+            (JobStatus.PENDING, JobStatus.RUNNING),
+        )
+        if status != JobStatus.RUNNING:
+            return
+
+        concurrency = job["concurrency"]
+        workers = max(1, min(self.chunk_workers, concurrency))
+        # Окна воркеров вместе дают `concurrency` одновременных запросов
+        window = math.ceil(concurrency / workers)
+        try:
+            await asyncio.gather(*(
+                self._chunk_worker(job_id, window) for _ in range(workers)
+            ))
+        except Exception as e:
+            err_id = new_error_id()
+            logger.exception("Задача парсинга %s прервана ошибкой (%s): %s", job_id, err_id, e)
+            return
+
+        if job_id in self._stop_requested:
+            logger.info("Задача парсинга %s остановлена", job_id)
+            return
+        if not await run_db(job_store.has_unfinished_chunks, job_id):
+            await run_db(
+                job_store.set_job_status, job_id, JobStatus.COMPLETED, (JobStatus.RUNNING,)
+            )
+            logger.info("Задача парсинга %s завершена", job_id)
+            try:
+                await run_db(negative_cache.purge_expired)
+            except Exception as e:
+                logger.exception("Не удалось очистить негативный кэш после задачи %s: %s", job_id, e)
+            # Редкость и оценочные цены обходимых коллекций — сразу, не дожидаясь периода
+            try:
+                await get_trait_refresher().run_once()
+            except Exception as e:
+                logger.exception("Не удалось пересчитать коллекции после задачи %s: %s", job_id, e)
+
+    async def _chunk_worker(self, job_id: str, window: int) -> None:
+        while job_id not in self._stop_requested:
+            chunk = await run_db(job_store.claim_chunk, job_id)
+            if chunk is None:
+                return
+            await self._process_chunk(job_id, chunk, window)
+
+    async def _process_chunk(self, job_id: str, chunk: dict, window: int) -> None:
+        writer = get_gift_writer()
+        collection = chunk["collection"]
+        end_id = chunk["end_id"]
+        next_id = checkpoint_id = chunk["next_id"]
+        success = failed = 0
+        outcomes = {}
+        finished = False
+        # ID с временными сбоями и ошибками записи не считаются ни успехом, ни
+        # ошибкой, пока не исчерпаны повторы; последний исход нужен для негативного кэша
+        deferred: Dict[int, ParseOutcome] = dict.fromkeys(chunk["deferred"], ParseOutcome.NETWORK_ERROR)
+
+        skip = await run_db(negative_cache.known_negative_ids, collection, next_id, end_id)
+        ids = [gift_id for gift_id in range(next_id, end_id + 1) if gift_id not in skip]
+        # Результаты приходят не по порядку: next_id — первый ID, по которому
+        # ещё нет результата. Результаты после него ждут в `pending` и
+        # учитываются, когда до них дойдёт next_id
+        pending: Dict[int, ParseOutcome] = {}
+        position = 0
+
+        def account(gift_id: int, outcome: ParseOutcome) -> None:
+            nonlocal success, failed
+            if is_transient_outcome(outcome) or outcome == ParseOutcome.DB_ERROR:
+                deferred[gift_id] = outcome
+                return
+            deferred.pop(gift_id, None)
+            outcomes[gift_id] = outcome
+            if outcome == ParseOutcome.OK:
+                success += 1
+            else:
+                failed += 1
+
+        async def checkpoint() -> None:
+            nonlocal checkpoint_id, success, failed, outcomes, finished
+            # Конвейер отдаёт OK только после коммита батча с гифтом, а ID с
+            # неудачной записью приходят как DB_ERROR и остаются в `deferred`:
+            # next_id и счётчики не уходят дальше незаписанных гифтов
+            skipped = sum(1 for gift_id in skip if checkpoint_id <= gift_id < next_id)
+            done = next_id > end_id and not deferred
+            await run_db(negative_cache.record_outcomes, collection, outcomes)
+            await run_db(
+                job_store.checkpoint_chunk, chunk["id"], next_id, success, failed, skipped,
+                done, list(deferred),
+            )
+            checkpoint_id, success, failed, outcomes, finished = next_id, 0, 0, {}, done
+
+        async def crawl(gift_ids, on_result) -> None:
+            pipeline = CrawlPipeline(
+                fetch_workers=window,
+                extract_workers=max(1, extract_pool_workers()),
+                queue_size=self.queue_size,
+                writer=writer,
+            )
+            results = pipeline.run(collection, gift_ids)
+            try:
+                async for gift_id, outcome in results:
+                    if job_id in self._stop_requested:
+                        pipeline.stop()
+                    await on_result(gift_id, outcome)
+            finally:
+                await results.aclose()
+
+        async def on_result(gift_id: int, outcome: ParseOutcome) -> None:
+            nonlocal position, next_id
+            pending[gift_id] = outcome
+            while position < len(ids) and ids[position] in pending:
+                account(ids[position], pending.pop(ids[position]))
+                position += 1
+            # Хвост чанка из пропущенных ID закрывается сразу
+            next_id = ids[position] if position < len(ids) else end_id + 1
+            if next_id - checkpoint_id >= self.checkpoint_every or next_id > end_id:
+                await checkpoint()
+
+        async def on_retry(gift_id: int, outcome: ParseOutcome) -> None:
+            account(gift_id, outcome)
+
+        try:
+            if ids:
+                await crawl(ids, on_result)
+            else:
+                next_id = end_id + 1
+            if job_id in self._stop_requested:
+                return
+            await checkpoint()
+
+            # Отложенные ID повторяются в конце чанка, после паузы; пока сервер
+            # недоступен, запросы и так ждут предохранитель
+            policy = get_retry_policy()
+            for round_number in range(1, self.deferred_rounds + 1):
+                if not deferred or job_id in self._stop_requested:
+                    break
+                await asyncio.sleep(policy.delay(policy.attempts + round_number))
+                await crawl(sorted(deferred), on_retry)
+                await checkpoint()
+            if deferred and job_id not in self._stop_requested:
+                logger.warning(
+                    "Чанк %s: %s ID не удалось получить после %s повторов",
+                    chunk["id"], len(deferred), self.deferred_rounds,
+                )
+                failed += len(deferred)
+                outcomes.update(deferred)
+                deferred.clear()
+                await checkpoint()
+        finally:
+            if not finished:
+                # Чанк не доделан (пауза, отмена, остановка) — сохраняем прогресс и отдаём чанк.
+                # ID из `pending` будут запрошены повторно.
+                try:
+                    await checkpoint()
+                    await run_db(job_store.release_chunk, chunk["id"])
+                except Exception as e:
+                    logger.exception("Не удалось сохранить контрольную точку чанка %s: %s", chunk["id"], e)
+
+
+# Общий исполнитель задач для API.
+_default_manager: Optional[JobManager] = None
+
+
+def configure_job_manager(
+    chunk_size: int,
+    chunk_workers: int,
+    checkpoint_every: int,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> JobManager:
+    """Задать параметры исполнителя задач (вызывается при старте приложения)."""
+    global _default_manager
+    _default_manager = JobManager(
+        chunk_size=chunk_size, chunk_workers=chunk_workers, checkpoint_every=checkpoint_every,
+        queue_size=queue_size,
+    )
+    return _default_manager
+
+
+def get_job_manager() -> JobManager:
+    """Вернуть общий исполнитель, создав его с настройками по умолчанию при необходимости."""
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = JobManager()
+    return _default_manager
+
+
+async def close_job_manager() -> None:
+    """Остановить воркеры задач (вызывается при остановке приложения)."""
+    if _default_manager is not None:
+        await _default_manager.stop()
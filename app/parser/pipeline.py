@@ -0,0 +1,360 @@
+"""
+Конвейер парсинга: загрузка → разбор HTML → запись в БД.
+
+Разбор HTML нагружает CPU и держит GIL, поэтому в одном процессе он
+ограничивает скорость обхода одним ядром. Конвейер разделяет работу на
+стадии, соединённые ограниченными очередями:
+
+1. fetch — `fetch_workers` корутин качают страницы через общий
+   `FragmentFetcher` и кладут сырые байты в очередь разбора (на 304
+   из HTTP-кэша запись сразу идёт на запись, минуя разбор);
+2. extract — разбор в `ProcessPoolExecutor` (`extract_workers` задач
+   одновременно), байты передаются в процесс без декодирования;
+3. persist — результат ставится в очередь `GiftBatchWriter`, который
+   пишет в БД пачками. Исход `OK` выдаётся только после коммита пачки с
+   гифтом, при ошибке записи — `DB_ERROR`.
+
+Полная очередь разбора притормаживает загрузку, полная очередь writer'а —
+разбор. По глубине очередей (`stats()`) видно, какая стадия узкое место:
+очередь разбора почти всегда полна — не хватает процессов разбора, пуста —
+упираемся в сеть/лимитер.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Dict, Iterable, Optional, Set, Tuple
+
+import aiohttp
+
+from app.DB.models import ParseOutcome, normalize_slug
+from app.DB.writer import GiftBatchWriter, get_gift_writer
+from app.logging_config import get_logger, new_error_id
+from . import extractors
+from .archive import get_page_archive
+from .fetcher import FragmentFetcher, get_default_fetcher
+from .fragment import build_gift_url, extract_gift_data, outcome_for_status
+from .http_cache import get_http_cache
+
+logger = get_logger(__name__)
+
+
+DEFAULT_QUEUE_SIZE = 64
+
+_DONE = object()
+_FAILED = object()
+
+
+def _extract_page(body: bytes, encoding: str, gift_id: int, backend: Optional[str]) -> Optional[dict]:
+    """Разбор одной страницы (выполняется в процессе пула)."""
+    return extract_gift_data(body.decode(encoding, errors="replace"), gift_id, backend)
+
+
+class StageStats:
+    """Счётчики стадии: обработано, в работе, суммарное время."""
+
+    def __init__(self):
+        self.processed = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "in_flight": self.in_flight,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+class QueueStats:
+    """Глубина очереди: текущая, максимальная и средняя по замерам."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.peak = 0
+        self._samples = 0
+        self._total = 0
+
+    def sample(self, depth: int) -> None:
+        self.peak = max(self.peak, depth)
+        self._samples += 1
+        self._total += depth
+
+    def to_dict(self, depth: int) -> dict:
+        return {
+            "depth": depth,
+            "maxsize": self.maxsize,
+            "peak": self.peak,
+            "avg": round(self._total / self._samples, 2) if self._samples else 0.0,
+        }
+
+
+class CrawlPipeline:
+    """
+    Конвейер для одного прогона по списку ID одной коллекции.
+
+    `run()` — асинхронный генератор пар (gift_id, ParseOutcome) в порядке
+    завершения. `stop()` прекращает выдачу новых ID; уже скачанные
+    страницы дорабатываются до конца.
+    """
+
+    def __init__(
+        self,
+        fetch_workers: int,
+        extract_workers: int,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        fetcher: Optional[FragmentFetcher] = None,
+        writer: Optional[GiftBatchWriter] = None,
+    ):
+        self.fetch_workers = max(1, fetch_workers)
+        self.extract_workers = max(1, extract_workers)
+        self.queue_size = queue_size
+        self.fetcher = fetcher or get_default_fetcher()
+        self.writer = writer or get_gift_writer()
+        self._stopped = False
+        self._extract_queue: Optional[asyncio.Queue] = None
+        self.fetch_stats = StageStats()
+        self.extract_stats = StageStats()
+        self.persist_stats = StageStats()
+        self.extract_queue_stats = QueueStats(queue_size)
+        self.started_at: Optional[float] = None
+        self.not_modified = 0
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    async def run(self, collection: str, gift_ids: Iterable[int]) -> AsyncIterator[Tuple[int, ParseOutcome]]:
+        self.started_at = time.perf_counter()
+        ids = iter(gift_ids)
+        extract_queue = self._extract_queue = asyncio.Queue(maxsize=self.queue_size)
+        results: asyncio.Queue = asyncio.Queue()
+        backend = extractors.DEFAULT_BACKEND
+        archive = get_page_archive()
+        cache = get_http_cache()
+
+        # Ожидания итогов записи: разбор не ждёт коммита, исход выдаётся по его итогу
+        confirmations: Set[asyncio.Task] = set()
+
+        async def confirm(gift_id: int, written: "asyncio.Future[bool]") -> None:
+            outcome = ParseOutcome.OK if await written else ParseOutcome.DB_ERROR
+            await results.put((gift_id, outcome))
+
+        async def persist(gift_id: int, gift: dict) -> None:
+            started = time.perf_counter()
+            # Очередь writer'а ограничена: если БД не успевает, разбор ждёт здесь
+            written = await self.writer.put({**gift, "collection": normalize_slug(collection)})
+            self.persist_stats.busy_seconds += time.perf_counter() - started
+            self.persist_stats.processed += 1
+            task = asyncio.create_task(confirm(gift_id, written))
+            confirmations.add(task)
+            task.add_done_callback(confirmations.discard)
+
+        async def fetch_one(gift_id: int) -> None:
+            url = build_gift_url(gift_id, collection)
+            entry = await asyncio.to_thread(cache.lookup, url) if cache is not None else None
+            self.fetch_stats.in_flight += 1
+            started = time.perf_counter()
+            try:
+                response = await self.fetcher.fetch(url, headers=entry.conditional_headers() if entry else None)
+            finally:
+                self.fetch_stats.in_flight -= 1
+                self.fetch_stats.busy_seconds += time.perf_counter() - started
+            self.fetch_stats.processed += 1
+            if response.status == 304 and entry is not None:
+                # Страница не изменилась: стадию разбора пропускаем
+                self.not_modified += 1
+                await persist(gift_id, await asyncio.to_thread(cache.hit, entry))
+                return
+            if response.status != 200:
+                logger.warning("Ошибка запроса %s: HTTP %s", response.url, response.status)
+                await results.put((gift_id, outcome_for_status(response.status)))
+                return
+            if archive is not None:
+                await asyncio.to_thread(archive.append, collection, gift_id, response.status, response.text)
+            self.extract_queue_stats.sample(extract_queue.qsize())
+            # Очередь разбора ограничена: если процессы не успевают, загрузка ждёт здесь
+            await extract_queue.put((gift_id, url, response, entry is not None))
+
+        async def fetch_worker() -> None:
+            for gift_id in ids:
+                if self._stopped:
+                    break
+                try:
+                    await fetch_one(gift_id)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning("Ошибка запроса %s-%s: %r", collection, gift_id, e)
+                    await results.put((gift_id, ParseOutcome.NETWORK_ERROR))
+                except Exception:
+                    err_id = new_error_id()
+                    logger.exception("Ошибка при загрузке гифта %s (%s)", gift_id, err_id)
+                    await results.put((gift_id, ParseOutcome.PARSE_ERROR))
+
+        async def extract(gift_id: int, body: bytes, encoding: str) -> Optional[dict]:
+            loop = asyncio.get_running_loop()
+            pool = get_extract_pool()
+            if pool is None:
+                return await asyncio.to_thread(_extract_page, body, encoding, gift_id, backend)
+            try:
+                return await loop.run_in_executor(pool, _extract_page, body, encoding, gift_id, backend)
+            except BrokenProcessPool:
+                # Процесс разбора упал (OOM, kill) — пересоздаём пул и повторяем один раз
+                logger.error("Пул процессов разбора сломан, пересоздаём")
+                pool = _replace_broken_pool(pool)
+                return await loop.run_in_executor(pool, _extract_page, body, encoding, gift_id, backend)
+
+        async def extract_worker() -> None:
+            while True:
+                item = await extract_queue.get()
+                if item is _DONE:
+                    return
+                gift_id, url, response, had_entry = item
+                self.extract_stats.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    gift = await extract(gift_id, response.body, response.encoding)
+                except BrokenProcessPool:
+                    raise
+                except Exception:
+                    err_id = new_error_id()
+                    logger.exception("Ошибка разбора гифта %s (%s)", gift_id, err_id)
+                    await results.put((gift_id, ParseOutcome.PARSE_ERROR))
+                    continue
+                finally:
+                    self.extract_stats.in_flight -= 1
+                    self.extract_stats.busy_seconds += time.perf_counter() - started
+                self.extract_stats.processed += 1
+                if cache is not None:
+                    await asyncio.to_thread(cache.store, url, response.headers, gift, had_entry)
+                if gift is None:
+                    await results.put((gift_id, ParseOutcome.INSUFFICIENT_DATA))
+                    continue
+                await persist(gift_id, gift)
+
+        async def fetch_stage() -> None:
+            try:
+                await asyncio.gather(*(fetch_worker() for _ in range(self.fetch_workers)))
+            except Exception as e:
+                results.put_nowait((_FAILED, e))
+                raise
+            for _ in range(self.extract_workers):
+                await extract_queue.put(_DONE)
+
+        async def extract_stage() -> None:
+            try:
+                await asyncio.gather(*(extract_worker() for _ in range(self.extract_workers)))
+            except Exception as e:
+                results.put_nowait((_FAILED, e))
+                raise
+            # Все гифты поставлены в writer — ждём итогов их записи
+            await asyncio.gather(*confirmations)
+            results.put_nowait(_DONE)
+
+        _register(self)
+        stages = [asyncio.create_task(fetch_stage()), asyncio.create_task(extract_stage())]
+        try:
+            while True:
+                item = await results.get()
+                if item is _DONE:
+                    break
+                if item[0] is _FAILED:
+                    # Стадия упала: остальные стадии отменяются в finally
+                    raise item[1]
+                yield item
+        finally:
+            # Неподтверждённые записи не отдаются: их ID будут запрошены заново
+            for task in [*stages, *confirmations]:
+                task.cancel()
+            await asyncio.gather(*stages, *confirmations, return_exceptions=True)
+            _unregister(self)
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        depth = self._extract_queue.qsize() if self._extract_queue is not None else 0
+        return {
+            "fetch_workers": self.fetch_workers,
+            "extract_workers": self.extract_workers,
+            "elapsed": round(elapsed, 3),
+            "pages_per_second": round(self.extract_stats.processed / elapsed, 2) if elapsed else 0.0,
+            "fetch": {**self.fetch_stats.to_dict(), "not_modified": self.not_modified},
+            "extract_queue": self.extract_queue_stats.to_dict(depth),
+            "extract": self.extract_stats.to_dict(),
+            "persist": {**self.persist_stats.to_dict(), "writer": self.writer.stats()},
+        }
+
+
+# Активные конвейеры (для метрик API).
+_active: Dict[int, CrawlPipeline] = {}
+
+
+def _register(pipeline: CrawlPipeline) -> None:
+    _active[id(pipeline)] = pipeline
+
+
+def _unregister(pipeline: CrawlPipeline) -> None:
+    _active.pop(id(pipeline), None)
+
+
+def pipeline_stats() -> dict:
+    """Метрики всех работающих конвейеров и суммарная глубина очередей."""
+    pipelines = [pipeline.stats() for pipeline in _active.values()]
+    return {
+        "active": len(pipelines),
+        "extract_processes": _pool_workers,
+        "extract_queue_depth": sum(p["extract_queue"]["depth"] for p in pipelines),
+        "writer_pending": get_gift_writer().stats()["pending"],
+        "pipelines": pipelines,
+    }
+
+
+# Общий пул процессов разбора; None — разбор в потоках.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn, а не fork: дочерние процессы не наследуют сокеты и потоки API
+    # и сами завершаются, если процесс API убит
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def configure_extract_pool(workers: Optional[int]) -> Optional[ProcessPoolExecutor]:
+    """
+    Создать пул процессов разбора (вызывается при старте приложения).
+
+    `workers=None` — по числу ядер, 0 — без процессов (разбор в потоках).
+    """
+    global _pool, _pool_workers
+    shutdown_extract_pool()
+    _pool_workers = (os.cpu_count() or 1) if workers is None else workers
+    _pool = _new_pool(_pool_workers) if _pool_workers > 0 else None
+    return _pool
+
+
+def _replace_broken_pool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """Заменить сломанный пул новым (один раз, даже если сломались несколько задач)."""
+    global _pool
+    if _pool is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        _pool = _new_pool(_pool_workers)
+    return _pool
+
+
+def get_extract_pool() -> Optional[ProcessPoolExecutor]:
+    return _pool
+
+
+def extract_pool_workers() -> int:
+    """Число процессов разбора (0 — разбор в потоках)."""
+    return _pool_workers
+
+
+def shutdown_extract_pool() -> None:
+    """Остановить пул процессов разбора (вызывается при остановке приложения)."""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+    _pool = None
+    _pool_workers = 0
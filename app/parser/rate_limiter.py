@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Статусы, которые считаем сигналом перегрузки fragment.com
+THROTTLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разобрать заголовок `Retry-After` (секунды или HTTP-дата) в секунды ожидания."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket с адаптивной скоростью по схеме AIMD.
+
+    - пока ответы успешные, скорость растёт аддитивно (примерно на
+      `increase_per_second` запросов/сек за каждую секунду работы);
+    - на 429/5xx/таймаут скорость умножается на `decrease_factor`
+      (не чаще одного раза за `decrease_cooldown`, чтобы пачка
+      одновременных ошибок не обнуляла скорость);
+    - `Retry-After` блокирует выдачу токенов до указанного момента.
+
+    Лимитер потокобезопасен и используется как из asyncio (`acquire`),
+    так и из синхронного кода (`acquire_blocking`).
+    """
+
+    def __init__(
+        self,
+        initial_rate: float = 2.0,
+        min_rate: float = 0.2,
+        max_rate: float = 50.0,
+        increase_per_second: float = 0.5,
+        decrease_factor: float = 0.5,
+        burst: float = 5.0,
+        decrease_cooldown: float = 1.0,
+        history_size: int = 20,
+    ):
+        if not 0 < min_rate <= initial_rate <= max_rate:
+            raise ValueError("Ожидается 0 < min_rate <= initial_rate <= max_rate")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor должен быть в интервале (0, 1)")
+
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_per_second = increase_per_second
+        self.decrease_factor = decrease_factor
+        self.burst = burst
+        self.decrease_cooldown = decrease_cooldown
+
+        self._lock = threading.Lock()
+        self._rate = initial_rate
+        self._tokens = min(burst, 1.0)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+
+        self._successes = 0
+        self._throttles = 0
+        self._recent_throttles = deque(maxlen=history_size)
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self._rate)
+            self._updated_at = now
+
+    def _try_take(self) -> float:
+        """Взять токен или вернуть, сколько секунд подождать до следующей попытки."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self._rate
+
+    async def acquire(self) -> None:
+        """Дождаться токена (asyncio)."""
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self) -> None:
+        """Дождаться токена (синхронный код)."""
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        """Аддитивное увеличение скорости после успешного ответа."""
+        with self._lock:
+            self._successes += 1
+            # За секунду при скорости r приходит ~r ответов, поэтому шаг делим на r
+            self._rate = min(self.max_rate, self._rate + self.increase_per_second / self._rate)
+
+    def on_throttle(self, reason: str, retry_after: Optional[float] = None) -> None:
+        """Мультипликативное снижение скорости после 429/5xx/таймаута."""
+        with self._lock:
+            now = time.monotonic()
+            self._throttles += 1
+            self._recent_throttles.append({
+                "at": time.time(),
+                "reason": reason,
+                "retry_after": retry_after,
+            })
+            if now - self._last_decrease >= self.decrease_cooldown:
+                self._rate = max(self.min_rate, self._rate * self.decrease_factor)
+                self._last_decrease = now
+                # Накопленные токены тоже сбрасываем, иначе после ошибки уйдёт очередь запросов
+                self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            rate = self._rate
+        logger.warning("Троттлинг fragment.com (%s), новая скорость %.2f req/s", reason, rate)
+
+    def record_response(self, status: int, retry_after_header: Optional[str] = None) -> None:
+        """Учесть HTTP-ответ: 429/5xx снижают скорость, остальное — успех."""
+        if status in THROTTLE_STATUSES:
+            self.on_throttle(f"HTTP {status}", parse_retry_after(retry_after_header))
+        else:
+            self.on_success()
+
+    def snapshot(self) -> dict:
+        """Текущее состояние лимитера для API."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "rate": round(self._rate, 3),
+                "min_rate": self.min_rate,
+                "max_rate": self.max_rate,
+                "tokens": round(self._tokens, 3),
+                "burst": self.burst,
+                "blocked_for": round(max(0.0, self._blocked_until - now), 3),
+                "successes": self._successes,
+                "throttles": self._throttles,
+                "recent_throttles": list(self._recent_throttles),
+            }
+
+
+# Общий лимитер для всех запросов к fragment.com
+_default_limiter: Optional[AdaptiveRateLimiter] = None
+
+
+def configure_rate_limiter(**kwargs) -> AdaptiveRateLimiter:
+    """Создать общий лимитер с заданными параметрами (вызывается при старте приложения)."""
+    global _default_limiter
+    _default_limiter = AdaptiveRateLimiter(**kwargs)
+    return _default_limiter
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Вернуть общий лимитер, создав его с настройками по умолчанию при необходимости."""
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = AdaptiveRateLimiter()
+    return _default_limiter
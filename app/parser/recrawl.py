@@ -0,0 +1,194 @@
+"""
+Планировщик инкрементальных обновлений цен.
+
+Вместо полного пересканирования диапазона каждый гифт проверяется со своим
+интервалом: выставленные на продажу гифты, у которых часто меняется цена,
+— часто, а заминченные гифты, которые почти никогда не меняются, — редко.
+Частота изменений оценивается по истории проверок:
+
+    p = (changes + 1) / (checks + 2)        # сглаживание Лапласа
+    interval = base(status) * 0.5 / p       # p = 0.5 (нет истории) -> base
+
+и ограничивается снизу и сверху. Гифты берутся из очереди по `next_due_at`
+(самые просроченные первыми), но не больше `budget_per_hour` запросов в час.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app.DB import recrawl_store
+from app.DB.models import GiftStatus, ParseOutcome, parse_sale_price
+from app.DB.repository import run_db
+from app.DB.writer import get_gift_writer
+from app.logging_config import get_logger
+from .fragment import parse_gift_async
+
+logger = get_logger(__name__)
+
+
+DEFAULT_BUDGET_PER_HOUR = 600
+DEFAULT_TICK_SECONDS = 60.0
+# Новые гифты добавляются в очередь раз в несколько тиков
+SEED_EVERY_TICKS = 10
+
+
+@dataclass
+class RecrawlPolicy:
+    """Интервал повторной проверки по статусу гифта и истории изменений."""
+
+    base_intervals: Dict[Optional[GiftStatus], timedelta] = field(default_factory=lambda: {
+        GiftStatus.FOR_SALE: timedelta(hours=2),
+        GiftStatus.UNKNOWN: timedelta(days=1),
+        GiftStatus.MINTED: timedelta(days=7),
+        None: timedelta(days=1),
+    })
+    min_interval: timedelta = timedelta(minutes=15)
+    max_interval: timedelta = timedelta(days=30)
+
+    def interval(self, status: Optional[GiftStatus], checks: int, changes: int) -> timedelta:
+        base = self.base_intervals.get(status, self.base_intervals[None])
+        change_rate = (changes + 1) / (checks + 2)
+        return min(self.max_interval, max(self.min_interval, base * (0.5 / change_rate)))
+
+    def first_due(self, status: Optional[GiftStatus], date_added: datetime) -> datetime:
+        """Первая проверка — через базовый интервал после даты парсинга."""
+        return date_added + self.interval(status, 0, 0)
+
+
+class RecrawlScheduler:
+    """
+    Фоновая задача: раз в `tick_seconds` проверяет очередные гифты.
+
+    За тик расходуется `budget_per_hour * tick / 3600` запросов; неизрасходованный
+    бюджет не копится, чтобы после простоя не было всплеска запросов.
+    """
+
+    def __init__(
+        self,
+        budget_per_hour: int = DEFAULT_BUDGET_PER_HOUR,
+        tick_seconds: float = DEFAULT_TICK_SECONDS,
+        policy: Optional[RecrawlPolicy] = None,
+    ):
+        self.budget_per_hour = budget_per_hour
+        self.tick_seconds = tick_seconds
+        self.policy = policy or RecrawlPolicy()
+        self._allowance = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.checked = 0
+        self.changed = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        if self.budget_per_hour <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def seed(self) -> int:
+        return await run_db(recrawl_store.seed_recrawl_state, self.policy.first_due)
+
+    async def run_once(self, limit: Optional[int] = None) -> int:
+        """Проверить до `limit` просроченных гифтов (по умолчанию — бюджет одного тика)."""
+        if limit is None:
+            per_tick = self.budget_per_hour * self.tick_seconds / 3600
+            self._allowance = min(self._allowance + per_tick, per_tick + 1)
+            limit = int(self._allowance)
+            self._allowance -= limit
+        if limit <= 0:
+            return 0
+
+        due = await run_db(recrawl_store.due_gifts, limit)
+        if not due:
+            return 0
+        writer = get_gift_writer()
+        results = await asyncio.gather(*(
+            parse_gift_async(item["number"], item["collection"], writer=writer) for item in due
+        ), return_exceptions=True)
+        await writer.flush()
+
+        now = datetime.now()
+        updates = []
+        for item, result in zip(due, results):
+            checks, changes = item["checks"], item["changes"]
+            status, price, changed_at = item["status"], item["last_price"], None
+            if isinstance(result, Exception) or result.outcome != ParseOutcome.OK:
+                # Проверка не удалась — историю не трогаем, повторим через обычный интервал
+                self.failed += 1
+            else:
+                checks += 1
+                status, price = result.gift["status"], result.gift["sale_price"]
+                # Сравниваем разобранные цену и статус, а не строки ('1,250' == '1250')
+                if parse_sale_price(price) != parse_sale_price(item["last_price"]):
+                    changes += 1
+                    changed_at = now
+                    self.changed += 1
+                self.checked += 1
+            updates.append({
+                "collection": item["collection"],
+                "number": item["number"],
+                "last_price": price,
+                "checks": checks,
+                "changes": changes,
+                "last_checked_at": now,
+                "last_changed_at": changed_at,
+                "next_due_at": now + self.policy.interval(status, checks, changes),
+            })
+        await run_db(recrawl_store.apply_checks, updates)
+        return len(due)
+
+    def stats(self) -> dict:
+        return {
+            "budget_per_hour": self.budget_per_hour,
+            "running": self._task is not None and not self._task.done(),
+            "checked": self.checked,
+            "changed": self.changed,
+            "failed": self.failed,
+        }
+
+    async def _run(self) -> None:
+        tick = 0
+        while True:
+            try:
+                if tick % SEED_EVERY_TICKS == 0:
+                    await self.seed()
+                await self.run_once()
+            except Exception as e:
+                logger.exception("Ошибка планировщика обновлений: %s", e)
+            tick += 1
+            await asyncio.sleep(self.tick_seconds)
+
+
+# Общий планировщик для API.
+_default_scheduler: Optional[RecrawlScheduler] = None
+
+
+def configure_recrawl_scheduler(budget_per_hour: int, tick_seconds: float) -> RecrawlScheduler:
+    """Задать бюджет запросов (0 — планировщик выключен) и период тика."""
+    global _default_scheduler
+    _default_scheduler = RecrawlScheduler(budget_per_hour=budget_per_hour, tick_seconds=tick_seconds)
+    return _default_scheduler
+
+
+def get_recrawl_scheduler() -> RecrawlScheduler:
+    """Вернуть общий планировщик, создав его с настройками по умолчанию при необходимости."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = RecrawlScheduler()
+    return _default_scheduler
+
+
+async def close_recrawl_scheduler() -> None:
+    """Остановить планировщик (вызывается при остановке приложения)."""
+    if _default_scheduler is not None:
+        await _default_scheduler.stop()
@@ -0,0 +1,199 @@
+"""
+Повторы запросов и предохранитель (circuit breaker) для fragment.com.
+
+Сбои делятся на временные и постоянные:
+
+- временные — сетевые ошибки, таймауты, 408/425/429/5xx: повторяются с
+  экспоненциальной задержкой со случайным разбросом (full jitter), чтобы
+  воркеры не били в сервер синхронно;
+- постоянные — 404 и прочие ответы о самой странице: повторять нечего.
+
+Предохранитель общий для всех воркеров: после `failure_threshold` временных
+сбоев подряд он размыкается, и все запросы ждут `cooldown` секунд вместо
+того, чтобы тратить таймауты на лежащий сервер. Затем пропускается один
+пробный запрос: успех замыкает предохранитель, сбой снова размыкает его
+с удвоенной паузой (не больше `max_cooldown`).
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from app.DB.models import ParseOutcome
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+TRANSIENT_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Исходы, которые говорят о сбое сервера или сети, а не о самой странице.
+# DB_ERROR и PARSE_ERROR сюда не входят: это сбои нашей записи и разбора, а не fragment.com
+TRANSIENT_OUTCOMES = frozenset({ParseOutcome.NETWORK_ERROR, ParseOutcome.HTTP_ERROR})
+
+
+def is_transient_status(status: int) -> bool:
+    return status in TRANSIENT_STATUSES
+
+
+def is_transient_outcome(outcome: ParseOutcome) -> bool:
+    return outcome in TRANSIENT_OUTCOMES
+
+
+@dataclass
+class RetryPolicy:
+    """Число попыток и экспоненциальная задержка между ними."""
+
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+    def delay(self, attempt: int) -> float:
+        """Пауза после неудачной попытки `attempt` (с 1): случайная в [0, base * 2^(attempt-1)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Предохранитель с состояниями closed → open → half_open.
+
+    Потокобезопасен; ждать разрешения можно из asyncio (`wait`) и из
+    синхронного кода (`wait_blocking`).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 10,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        probe_timeout: float = 30.0,
+        history_size: int = 20,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._probe_until = 0.0
+
+        self._opens = 0
+        self._recent_opens = deque(maxlen=history_size)
+
+    def _try_pass(self) -> float:
+        """Разрешить запрос или вернуть, сколько секунд подождать до следующей проверки."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0.0
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now < self._open_until:
+                    return self._open_until - now
+                self._state = self.HALF_OPEN
+            # half_open: один пробный запрос; если он не ответил за probe_timeout — ещё один
+            if now >= self._probe_until:
+                self._probe_until = now + self.probe_timeout
+                return 0.0
+            return min(1.0, self._probe_until - now)
+
+    async def wait(self) -> None:
+        """Дождаться, пока предохранитель пропустит запрос (asyncio)."""
+        while True:
+            wait = self._try_pass()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def wait_blocking(self) -> None:
+        """Дождаться, пока предохранитель пропустит запрос (синхронный код)."""
+        while True:
+            wait = self._try_pass()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._cooldown = self.base_cooldown
+                self._probe_until = 0.0
+                logger.info("fragment.com снова отвечает, предохранитель замкнут")
+
+    def record_failure(self, reason: str) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.OPEN:
+                return
+            if self._state == self.HALF_OPEN:
+                # Пробный запрос не прошёл — пауза вдвое длиннее
+                self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+            elif self._failures < self.failure_threshold:
+                return
+            self._state = self.OPEN
+            self._open_until = time.monotonic() + self._cooldown
+            self._probe_until = 0.0
+            self._opens += 1
+            self._recent_opens.append({"at": time.time(), "reason": reason, "cooldown": self._cooldown})
+            cooldown = self._cooldown
+        logger.warning(
+            "fragment.com недоступен (%s), запросы приостановлены на %.0f с", reason, cooldown
+        )
+
+    def snapshot(self) -> dict:
+        """Текущее состояние предохранителя для API."""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "open_for": round(max(0.0, self._open_until - time.monotonic()), 3)
+                if self._state == self.OPEN else 0.0,
+                "cooldown": self._cooldown,
+                "opens": self._opens,
+                "recent_opens": list(self._recent_opens),
+            }
+
+
+# Общие политика повторов и предохранитель для всех запросов к fragment.com
+_default_policy: Optional[RetryPolicy] = None
+_default_breaker: Optional[CircuitBreaker] = None
+
+
+def configure_resilience(
+    attempts: int,
+    base_delay: float,
+    max_delay: float,
+    failure_threshold: int,
+    cooldown: float,
+) -> None:
+    """Задать политику повторов и предохранитель (вызывается при старте приложения)."""
+    global _default_policy, _default_breaker
+    _default_policy = RetryPolicy(attempts=max(1, attempts), base_delay=base_delay, max_delay=max_delay)
+    _default_breaker = CircuitBreaker(failure_threshold=failure_threshold, cooldown=cooldown)
+
+
+def get_retry_policy() -> RetryPolicy:
+    global _default_policy
+    if _default_policy is None:
+        _default_policy = RetryPolicy()
+    return _default_policy
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _default_breaker
+    if _default_breaker is None:
+        _default_breaker = CircuitBreaker()
+    return _default_breaker
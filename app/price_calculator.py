@@ -1,13 +1,68 @@
-from typing import List
-from sqlalchemy.orm import Session
+"""
+Trait-based metrics of gift collections.
+
+A collection is the set of gifts with the same `Gift.collection` slug
+("plushpepe" for "Plush Pepe #2790", see `normalize_slug`); a title such as
+"Plush Pepe" is accepted wherever a slug is. Rarity is computed for a whole collection at once: the
+(model, backdrop, symbol) traits are loaded into NumPy arrays, trait
+frequencies come from `np.unique`, and each gift gets
+
+    rarity_score = -sum(log(frequency of its trait))   # over the three traits
+    rarity_rank  = 1 for the rarest gift (equal scores share a rank)
+
+in one vectorized pass.
+
+Prices are estimated from the collection's listings (status for_sale): one
+`GROUP BY ... MIN(price_ton)` query per trait and per trait combination
+gives the floors, and every gift — minted ones included — gets the floor of
+its exact (model, backdrop, symbol) combination, else the highest floor of
+its trait pairs, else of its single traits, else the collection floor.
+
+Only rows whose values changed are written back, in bulk
+`UPDATE ... WHERE id = ? AND collection = ?` batches (the gift key). `TraitRefresher` keeps the values
+current: every `upsert_gifts` marks the collections of the written gifts,
+and the background task recomputes them every `interval` seconds (and after
+each finished parse job). Manual `estimated_price` edits are overwritten on
+the next refresh of the collection.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import and_, bindparam, distinct, func, select, update
+
 from .DB.create_database import connect_db
-from .DB.models import Gift
-import json
+from .DB.models import Gift, GiftStatus, gift_collection, normalize_slug
+from .DB.repository import run_db
+from .DB.writer import add_write_listener
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
- 
- 
+
+
+TRAIT_FIELDS = ("model", "backdrop", "symbol")
+# Scores are rounded so that equal trait combinations always share a rank
+SCORE_DECIMALS = 6
+UPDATE_BATCH_SIZE = 5000
+DEFAULT_REFRESH_SECONDS = 60.0
+
+# Trait combinations with their own floor price, most specific first
+FLOOR_KEYS = (
+    ("model", "backdrop", "symbol"),
+    ("model", "backdrop"),
+    ("model", "symbol"),
+    ("backdrop", "symbol"),
+    ("model",),
+    ("backdrop",),
+    ("symbol",),
+)
+
+
 def get_nfts_by_prefix(prefix: str) -> Gift:
     """
     Return the number of Gift records whose name starts with the given prefix.
@@ -16,16 +71,388 @@ def get_nfts_by_prefix(prefix: str) -> Gift:
         prefix (str): Prefix to match at the start of Gift.name.
 
     Returns:
-        int: Count of Gift records where name LIKE "<prefix>%".
+        int: Count of Gift records where name LIKE "<prefix>%" (ASCII case-insensitive).
     """
     with connect_db() as session:
-        nfts = session.query(Gift).filter(Gift.name.like(f"{prefix}%")).count()
+        nfts = session.query(Gift).filter(name_prefix_clause(prefix)).count()
         return nfts
 
 
-def calculate_rarity(nft, collection_stats):
-    return None
+def name_prefix_clause(prefix: str):
+    """
+    `name LIKE 'prefix%'`: ASCII case-insensitive, as SQLite's LIKE is.
+
+    SQLite serves a case-insensitive LIKE only from a NOCASE index, so this
+    uses `ix_gifts_name_nocase` rather than the unique (BINARY) name index.
+    """
+    return Gift.name.like(f"{prefix}%")
+
+
+def collection_clause(collection: str):
+    """Gifts of one collection, by slug or title ('plushpepe' or 'Plush Pepe'; uses ix_gifts_collection)."""
+    return Gift.collection == normalize_slug(collection)
+
+
+def list_collections() -> List[str]:
+    """Slugs of all collections present in the table."""
+    with connect_db() as session:
+        rows = session.execute(
+            select(distinct(Gift.collection)).where(Gift.collection != "").order_by(Gift.collection)
+        ).all()
+    return [row[0] for row in rows]
+
+
+def calculate_rarity(nft: dict, collection_stats: dict) -> Optional[float]:
+    """
+    Rarity score of a single gift.
+
+    Args:
+        nft (dict): Gift with 'model', 'backdrop' and 'symbol'.
+        collection_stats (dict): {'total': gifts in the collection, '<trait>': {value: count}}
+            for every trait in TRAIT_FIELDS (see `collection_stats`).
+
+    Returns:
+        float: -sum(log(frequency)) over the traits (higher is rarer), or None if
+        a trait is missing from the statistics.
+    """
+    total = collection_stats.get("total")
+    if not total:
+        return None
+    score = 0.0
+    for field in TRAIT_FIELDS:
+        count = collection_stats.get(field, {}).get(nft.get(field))
+        if not count:
+            return None
+        score -= math.log(count / total)
+    return round(score, SCORE_DECIMALS)
+
+
+def collection_stats(collection: str) -> dict:
+    """Trait value counts of a collection in the shape `calculate_rarity` expects."""
+    with connect_db() as session:
+        stats = {"total": session.query(Gift).filter(collection_clause(collection)).count()}
+        for field in TRAIT_FIELDS:
+            column = getattr(Gift, field)
+            rows = (
+                session.query(column, func.count())
+                .filter(collection_clause(collection))
+                .group_by(column)
+                .all()
+            )
+            stats[field] = dict(rows)
+    return stats
+
+
+def trait_frequencies(values: np.ndarray) -> np.ndarray:
+    """Share of the collection that has each gift's trait value."""
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    return counts[inverse.reshape(-1)] / len(values)
+
+
+def rarity_scores(traits: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rarity scores and ranks for a whole collection.
+
+    Args:
+        traits: One array per trait, all of the collection's length.
+
+    Returns:
+        (scores, ranks): float scores (higher is rarer) and int ranks
+        (1 is the rarest; equal scores share the best rank).
+    """
+    size = len(traits[0]) if traits else 0
+    if size == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    scores = np.zeros(size)
+    for values in traits:
+        scores -= np.log(trait_frequencies(values))
+    scores = np.round(scores, SCORE_DECIMALS)
+    ordered = np.sort(-scores)
+    ranks = np.searchsorted(ordered, -scores, side="left") + 1
+    return scores, ranks
+
+
+def refresh_rarity(collection: str) -> dict:
+    """
+    Recompute rarity_score / rarity_rank of one collection and write back the changes.
+
+    Gifts without all three traits are not scored. Returns a summary:
+    collection, gifts scored, rows updated, seconds.
+    """
+    started = time.perf_counter()
+    slug = normalize_slug(collection)
+    table = Gift.__table__
+    query = select(
+        table.c.id, table.c.model, table.c.backdrop, table.c.symbol,
+        table.c.rarity_score, table.c.rarity_rank,
+    ).where(
+        collection_clause(slug),
+        *(table.c[field].is_not(None) for field in TRAIT_FIELDS),
+    )
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"), table.c.collection == bindparam("b_collection"))
+        .values(rarity_score=bindparam("b_score"), rarity_rank=bindparam("b_rank"))
+    )
+    with connect_db() as session:
+        rows = session.execute(query).all()
+        updated = 0
+        if rows:
+            ids, models, backdrops, symbols, old_scores, old_ranks = zip(*rows)
+            scores, ranks = rarity_scores([np.array(models), np.array(backdrops), np.array(symbols)])
+            # None -> nan: never equal, so unscored gifts are always written
+            changed = np.flatnonzero(
+                (scores != np.array(old_scores, dtype=float)) | (ranks != np.array(old_ranks, dtype=float))
+            )
+            params = [
+                {
+                    "b_id": ids[i], "b_collection": slug,
+                    "b_score": float(scores[i]), "b_rank": int(ranks[i]),
+                }
+                for i in changed.tolist()
+            ]
+            for i in range(0, len(params), UPDATE_BATCH_SIZE):
+                session.execute(stmt, params[i:i + UPDATE_BATCH_SIZE])
+            updated = len(params)
+    return {
+        "collection": slug,
+        "gifts": len(rows),
+        "updated": updated,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+@dataclass
+class PriceFloors:
+    """Floor prices of a collection: {trait combination: {trait values: min price_ton}}."""
+
+    by_key: Dict[tuple, Dict[tuple, float]] = field(default_factory=dict)
+    collection: Optional[float] = None
+
+
+def price_floors(collection: str) -> PriceFloors:
+    """Floors of a collection's listings, one grouped aggregate per entry of FLOOR_KEYS."""
+    listed = and_(
+        collection_clause(collection),
+        Gift.status == GiftStatus.FOR_SALE,
+        Gift.price_ton.is_not(None),
+    )
+    floors = PriceFloors()
+    with connect_db() as session:
+        floors.collection = session.execute(select(func.min(Gift.price_ton)).where(listed)).scalar()
+        if floors.collection is None:
+            return floors
+        for key in FLOOR_KEYS:
+            columns = [getattr(Gift, name) for name in key]
+            rows = session.execute(
+                select(*columns, func.min(Gift.price_ton)).where(listed).group_by(*columns)
+            ).all()
+            floors.by_key[key] = {tuple(row[:-1]): row[-1] for row in rows}
+    return floors
+
+
+def estimate_price(nft: dict, floors: PriceFloors) -> Optional[float]:
+    """
+    Estimated price of a gift from its collection's floors.
+
+    The exact trait combination's floor if it is listed; otherwise the highest
+    floor among the gift's trait pairs, then among its single traits (a gift is
+    worth at least the cheapest listing sharing its rarest trait); otherwise the
+    collection floor. None if nothing in the collection is listed.
+    """
+    for size in (3, 2, 1):
+        found = [
+            floors.by_key[key].get(tuple(nft.get(name) for name in key))
+            for key in FLOOR_KEYS
+            if len(key) == size and key in floors.by_key
+        ]
+        found = [price for price in found if price is not None]
+        if found:
+            return max(found)
+    return floors.collection
+
+
+def refresh_estimates(collection: str) -> dict:
+    """
+    Recompute estimated_price of every gift of one collection and write back the changes.
+
+    Returns a summary: collection, gifts, rows updated, seconds.
+    """
+    started = time.perf_counter()
+    slug = normalize_slug(collection)
+    floors = price_floors(slug)
+    table = Gift.__table__
+    query = select(
+        table.c.id, table.c.model, table.c.backdrop, table.c.symbol, table.c.estimated_price,
+    ).where(collection_clause(slug))
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"), table.c.collection == bindparam("b_collection"))
+        .values(estimated_price=bindparam("b_price"))
+    )
+    with connect_db() as session:
+        rows = session.execute(query).all()
+        params = []
+        # Gifts with the same traits get the same estimate: compute it once per combination
+        estimates: Dict[tuple, Optional[float]] = {}
+        for gift_id, model, backdrop, symbol, old_price in rows:
+            traits = (model, backdrop, symbol)
+            if traits not in estimates:
+                estimates[traits] = estimate_price(dict(zip(TRAIT_FIELDS, traits)), floors)
+            price = estimates[traits]
+            if price != old_price:
+                params.append({"b_id": gift_id, "b_collection": slug, "b_price": price})
+        for i in range(0, len(params), UPDATE_BATCH_SIZE):
+            session.execute(stmt, params[i:i + UPDATE_BATCH_SIZE])
+    return {
+        "collection": slug,
+        "gifts": len(rows),
+        "updated": len(params),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def refresh_collection(collection: str) -> dict:
+    """Recompute rarity and estimated prices of one collection."""
+    rarity = refresh_rarity(collection)
+    estimates = refresh_estimates(collection)
+    return {
+        "collection": estimates["collection"],
+        "gifts": estimates["gifts"],
+        "rarity_updated": rarity["updated"],
+        "estimates_updated": estimates["updated"],
+        "seconds": round(rarity["seconds"] + estimates["seconds"], 3),
+    }
+
+
+class TraitRefresher:
+    """
+    Background recomputation of trait-derived fields.
+
+    Collections of written gifts are collected from `upsert_gifts` (the
+    listener runs in DB threads, hence the lock) and refreshed every
+    `interval` seconds, so a crawl triggers one recomputation per collection
+    instead of one per gift.
+    """
+
+    def __init__(self, interval: float = DEFAULT_REFRESH_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._dirty: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.refreshed = 0
+        self.rarity_updated = 0
+        self.estimates_updated = 0
+        self.last: List[dict] = []
+
+    def mark(self, records: Iterable[dict]) -> None:
+        collections = {
+            record.get("collection") or gift_collection(record.get("name")) for record in records
+        }
+        collections.discard("")
+        if collections:
+            with self._lock:
+                self._dirty.update(collections)
+
+    async def refresh(self, collections: Optional[Iterable[str]] = None) -> List[dict]:
+        """Recompute the given collections (slugs or titles) now (None — all collections)."""
+        if collections is None:
+            collections = await run_db(list_collections)
+        results = []
+        for collection in collections:
+            result = await run_db(refresh_collection, collection)
+            results.append(result)
+            self.refreshed += 1
+            self.rarity_updated += result["rarity_updated"]
+            self.estimates_updated += result["estimates_updated"]
+        self.runs += 1
+        self.last = results[-20:]
+        return results
+
+    async def run_once(self) -> List[dict]:
+        """Refresh the collections marked since the previous run."""
+        with self._lock:
+            collections, self._dirty = sorted(self._dirty), set()
+        if not collections:
+            return []
+        try:
+            return await self.refresh(collections)
+        except Exception:
+            # Not refreshed — keep them for the next run
+            with self._lock:
+                self._dirty.update(collections)
+            raise
+
+    async def start(self) -> None:
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sorted(self._dirty)
+        return {
+            "interval": self.interval,
+            "running": self._task is not None and not self._task.done(),
+            "pending": pending,
+            "runs": self.runs,
+            "refreshed": self.refreshed,
+            "rarity_updated": self.rarity_updated,
+            "estimates_updated": self.estimates_updated,
+            "last": self.last,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception("Trait refresh failed: %s", e)
+
+
+# Shared refresher for the API.
+_default_refresher: Optional[TraitRefresher] = None
+
+
+def _on_gifts_written(records) -> None:
+    if _default_refresher is not None:
+        _default_refresher.mark(records)
+
+
+add_write_listener(_on_gifts_written)
+
+
+def configure_trait_refresher(interval: float) -> TraitRefresher:
+    """Set the refresh period (0 disables the background task; manual refresh still works)."""
+    global _default_refresher
+    _default_refresher = TraitRefresher(interval=interval)
+    return _default_refresher
+
+
+def get_trait_refresher() -> TraitRefresher:
+    global _default_refresher
+    if _default_refresher is None:
+        _default_refresher = TraitRefresher()
+    return _default_refresher
+
+
+async def close_trait_refresher() -> None:
+    """Stop the background task (called on application shutdown)."""
+    if _default_refresher is not None:
+        await _default_refresher.stop()
 
 
 if __name__ == "__main__":
-    logger.info("nfts count for prefix=%s -> %s", "Plush Pepe", get_nfts_by_prefix("Plush Pepe"))
\ No newline at end of file
+    logger.info("nfts count for prefix=%s -> %s", "Plush Pepe", get_nfts_by_prefix("Plush Pepe"))
@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy import create_engine
+
+from app.DB import create_database as db, repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Пустая БД во временном каталоге.
+
+    Путь gifts.db движка приложения фиксируется при импорте, поэтому
+    сессии и `create_database` переключаются на отдельный движок.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'gifts.db'}")
+    monkeypatch.setattr(db, "engine", engine)
+    monkeypatch.setitem(db.SessionFactory.kw, "bind", engine)
+    db.Session.remove()
+    db.create_database()
+    yield engine
+    repository.shutdown_db_executor()
+    db.Session.remove()
+    engine.dispose()
@@ -0,0 +1,44 @@
+"""Совпадение бэкендов разбора на сохранённых страницах `app/parser/samples`."""
+
+import glob
+import os
+
+import pytest
+
+from app.parser import extractors
+from app.parser.fragment import extract_gift_data
+
+SAMPLES = sorted(glob.glob(os.path.join(extractors.SAMPLES_DIR, "*.html")))
+
+
+def read_sample(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_samples_present():
+    assert SAMPLES
+
+
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_backends_extract_same_fields(path):
+    html = read_sample(path)
+    # Экстракторы вызываются напрямую: `extract_fields` скрыл бы падение
+    # быстрого бэкенда, повторив разбор через bs4
+    fields = {name: extractor(html) for name, extractor in extractors.EXTRACTORS.items()}
+    reference = fields.pop("bs4")
+    for name, result in fields.items():
+        assert result == reference, name
+
+
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_backends_produce_same_gift(path):
+    html = read_sample(path)
+    gifts = {name: extract_gift_data(html, 1, backend=name) for name in extractors.EXTRACTORS}
+    reference = gifts.pop("bs4")
+    for name, gift in gifts.items():
+        assert gift == reference, name
+
+
+def test_compare_backends_reports_no_mismatches():
+    assert extractors.compare_backends() == []
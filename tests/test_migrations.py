@@ -0,0 +1,51 @@
+"""Миграции старой схемы gifts.db."""
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.DB.migrations import MIGRATIONS, MigrationError, drop_duplicate_names, migrate
+
+# Таблица gifts в исходной схеме (до миграций)
+BASELINE_GIFTS = """
+CREATE TABLE gifts (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR, model VARCHAR, backdrop VARCHAR, symbol VARCHAR,
+    sale_price VARCHAR, rarity_score FLOAT, estimated_price FLOAT, date_added DATETIME
+)
+"""
+
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'gifts.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(BASELINE_GIFTS))
+        conn.execute(text("INSERT INTO gifts (id, name, sale_price) VALUES (:id, :name, '10')"), [
+            {"id": 1, "name": "Loot Bag #1"},
+            {"id": 2, "name": "Loot Bag #2"},
+            {"id": 3, "name": "Loot Bag #1"},
+        ])
+    yield engine
+    engine.dispose()
+
+
+def gift_names(engine) -> dict:
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT id, name FROM gifts")).all())
+
+
+def test_duplicate_names_stop_migration_without_deleting(baseline_engine):
+    with pytest.raises(MigrationError, match=r"'Loot Bag #1': id 1, 3"):
+        migrate(baseline_engine)
+
+    assert gift_names(baseline_engine) == {1: "Loot Bag #1", 2: "Loot Bag #2", 3: "Loot Bag #1"}
+    with baseline_engine.connect() as conn:
+        assert conn.execute(text("PRAGMA user_version")).scalar() == 0
+
+
+def test_drop_duplicate_names_is_explicit_and_logged(baseline_engine, caplog):
+    assert drop_duplicate_names(baseline_engine) == 1
+    assert "id=1 name='Loot Bag #1'" in caplog.text
+
+    assert migrate(baseline_engine) == len(MIGRATIONS)
+    assert gift_names(baseline_engine) == {2: "Loot Bag #2", 3: "Loot Bag #1"}
@@ -0,0 +1,176 @@
+"""Задача по нескольким коллекциям с пересекающимися диапазонами ID."""
+
+import asyncio
+
+from aiohttp import web
+
+from app.DB import job_store, negative_cache, writer
+from app.DB.create_database import connect_db
+from app.DB.models import Gift, JobStatus, ParseOutcome
+from app.DB.writer import close_gift_writer, configure_gift_writer, upsert_gifts
+from app.parser import pipeline, resilience
+from app.parser.fetcher import close_default_fetcher, configure_default_fetcher
+from app.parser.jobs import JobManager
+from app.parser.rate_limiter import configure_rate_limiter
+
+TITLES = {"lootbag": "Loot Bag", "plushpepe": "Plush Pepe"}
+
+PAGE = """<html><body><h1 class="tm-section-header-title">{title} #{number}</h1>
+<table><tr><td><div class="table-cell-value tm-value icon-before icon-ton">{price}</div></td></tr>
+<tr><td><a class="table-cell-value-link" href="#">{title} Model</a></td></tr>
+<tr><td><a class="table-cell-value-link" href="#">Backdrop {number}</a></td></tr>
+<tr><td><a class="table-cell-value-link" href="#">Symbol</a></td></tr></table></body></html>"""
+
+
+def stored_gifts() -> dict:
+    with connect_db() as session:
+        rows = session.query(Gift.collection, Gift.id, Gift.name, Gift.model).all()
+    return {(collection, gift_id): (name, model) for collection, gift_id, name, model in rows}
+
+
+def gift_record(collection: str, number: int) -> dict:
+    return {
+        "id": number,
+        "collection": collection,
+        "name": f"{TITLES[collection]} #{number}",
+        "model": f"{TITLES[collection]} Model",
+        "backdrop": "Backdrop",
+        "symbol": "Symbol",
+        "sale_price": "10",
+    }
+
+
+def test_upsert_keeps_same_number_in_different_collections(database):
+    # Один батч и два отдельных: номер 5 есть в обеих коллекциях
+    upsert_gifts([gift_record("lootbag", 5), gift_record("plushpepe", 5)])
+    upsert_gifts([gift_record("lootbag", 6)])
+    upsert_gifts([gift_record("plushpepe", 6)])
+
+    assert stored_gifts() == {
+        (collection, number): (f"{TITLES[collection]} #{number}", f"{TITLES[collection]} Model")
+        for collection in TITLES
+        for number in (5, 6)
+    }
+
+
+def test_upsert_normalizes_collection_slug(database):
+    # Тот же гифт под разным написанием slug — одна строка, а не конфликт имени
+    upsert_gifts([{**gift_record("plushpepe", 5), "collection": "PlushPepe"}])
+    upsert_gifts([{**gift_record("plushpepe", 5), "collection": None}])
+    upsert_gifts([{**gift_record("plushpepe", 5), "collection": "plush-pepe", "sale_price": "12"}])
+
+    assert stored_gifts() == {("plushpepe", 5): ("Plush Pepe #5", "Plush Pepe Model")}
+    with connect_db() as session:
+        assert session.query(Gift.sale_price).scalar() == "12"
+
+
+async def _run_job(ranges, monkeypatch, statuses=None, requests=None, **manager_options) -> str:
+    # statuses: {(slug, номер): HTTP-статус} вместо страницы; requests считает запросы
+    async def handler(request):
+        slug, _, number = request.match_info["tail"].rpartition("-")
+        key = (slug, int(number))
+        if requests is not None:
+            requests[key] = requests.get(key, 0) + 1
+        if statuses and key in statuses:
+            return web.Response(status=statuses[key])
+        return web.Response(
+            text=PAGE.format(title=TITLES[slug], number=number, price="1,250"),
+            content_type="text/html",
+        )
+
+    app = web.Application()
+    app.router.add_get("/gift/{tail}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    monkeypatch.setattr(
+        pipeline, "build_gift_url", lambda number, slug: f"http://127.0.0.1:{port}/gift/{slug}-{number}"
+    )
+
+    configure_rate_limiter(initial_rate=500.0, max_rate=1000.0, burst=100.0)
+    configure_default_fetcher(concurrency=8)
+    configure_gift_writer(batch_size=50, flush_interval=0.05)
+    manager = JobManager(chunk_size=10, checkpoint_every=5, **manager_options)
+    try:
+        job = await manager.submit_many(ranges, concurrency=4)
+        for _ in range(300):
+            # После отметки о завершении задача ещё доделывает уборку
+            if job_store.job_status(job["task_id"]) == JobStatus.COMPLETED and not manager.running():
+                break
+            await asyncio.sleep(0.1)
+        return job["task_id"]
+    finally:
+        await manager.stop()
+        await close_gift_writer()
+        await close_default_fetcher()
+        await runner.cleanup()
+
+
+def test_collections_sharing_id_range_both_persist(database, monkeypatch):
+    task_id = asyncio.run(
+        _run_job([("lootbag", 1, 25, 1.0), ("plushpepe", 1, 25, 1.0)], monkeypatch)
+    )
+
+    job = job_store.get_job(task_id)
+    assert job["status"] == JobStatus.COMPLETED
+    gifts = stored_gifts()
+    assert len(gifts) == 50
+    for collection, title in TITLES.items():
+        for number in range(1, 26):
+            assert gifts[(collection, number)] == (f"{title} #{number}", f"{title} Model")
+
+
+def test_failed_writes_do_not_advance_as_success(database, monkeypatch):
+    def failing_upsert(records):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(writer, "upsert_gifts", failing_upsert)
+    monkeypatch.setattr(resilience, "_default_policy", resilience.RetryPolicy(base_delay=0.01))
+    task_id = asyncio.run(_run_job([("lootbag", 1, 25, 1.0)], monkeypatch, deferred_rounds=1))
+
+    # Незаписанные гифты не засчитываются успехом и не попадают в негативный кэш
+    job = job_store.get_job(task_id)
+    assert job["status"] == JobStatus.COMPLETED
+    assert (job["success"], job["failed"], job["deferred"]) == (0, 25, 0)
+    assert stored_gifts() == {}
+    assert negative_cache.known_negative_ids("lootbag", 1, 25) == set()
+
+
+def test_extract_failures_are_not_retried_as_http_errors(database, monkeypatch):
+    def broken_extract(body, encoding, gift_id, backend):
+        raise ValueError("unexpected markup")
+
+    monkeypatch.setattr(pipeline, "_extract_page", broken_extract)
+    task_id = asyncio.run(_run_job([("lootbag", 1, 25, 1.0)], monkeypatch))
+
+    # Ошибка разбора окончательна: ID сразу считаются ошибкой, без повторов
+    job = job_store.get_job(task_id)
+    assert (job["success"], job["failed"], job["deferred"]) == (0, 25, 0)
+    # Запись parse_error живёт с TTL 0: ID не пропускается при следующем обходе
+    assert negative_cache.known_negative_ids("lootbag", 1, 25) == set()
+
+
+def test_finished_job_purges_expired_negative_entries(database, monkeypatch):
+    # HTTP_ERROR хранится с TTL 0 и сразу устаревает, 404 действует неделю
+    negative_cache.record_outcomes("plushpepe", {1: ParseOutcome.NOT_FOUND, 2: ParseOutcome.HTTP_ERROR})
+
+    asyncio.run(_run_job([("lootbag", 1, 5, 1.0)], monkeypatch))
+
+    stats = negative_cache.negative_cache_stats("plushpepe")
+    assert (stats["not_found"]["total"], stats["http_error"]["total"]) == (1, 0)
+    assert negative_cache.known_negative_ids("plushpepe", 1, 2) == {1}
+
+
+def test_forbidden_ids_are_final_and_not_retried(database, monkeypatch):
+    requests = {}
+    task_id = asyncio.run(_run_job(
+        [("lootbag", 1, 10, 1.0)], monkeypatch,
+        statuses={("lootbag", 3): 403, ("lootbag", 7): 403}, requests=requests,
+    ))
+
+    # 403 — окончательный отказ: без повторов, сразу ошибка и запись в негативный кэш
+    job = job_store.get_job(task_id)
+    assert (job["success"], job["failed"], job["deferred"]) == (8, 2, 0)
+    assert requests[("lootbag", 3)] == requests[("lootbag", 7)] == 1
+    assert negative_cache.known_negative_ids("lootbag", 1, 10) == {3, 7}
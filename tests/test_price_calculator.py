@@ -0,0 +1,53 @@
+"""Поиск по префиксу имени и пересчёт редкости коллекций."""
+
+from sqlalchemy import select, text
+
+from app.DB.create_database import connect_db
+from app.DB.models import Gift
+from app.DB.writer import upsert_gifts
+from app.price_calculator import (
+    collection_clause,
+    get_nfts_by_prefix,
+    list_collections,
+    name_prefix_clause,
+    refresh_collection,
+)
+
+
+def test_prefix_search_is_case_insensitive_and_indexed(database):
+    upsert_gifts([
+        {"id": 1, "name": "Plush Pepe #1"},
+        {"id": 2, "name": "plush pepe #2"},
+        {"id": 3, "name": "Loot Bag #3"},
+    ])
+
+    assert get_nfts_by_prefix("PLUSH") == 2
+    query = select(Gift.id).where(name_prefix_clause("Plush"))
+    sql = str(query.compile(database, compile_kwargs={"literal_binds": True}))
+    with connect_db() as session:
+        plan = session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    assert any("ix_gifts_name_nocase" in row[-1] for row in plan)
+
+
+def test_refresh_scores_each_collection_by_slug(database):
+    # Номера 1-3 есть в обеих коллекциях; редкость считается внутри своей
+    upsert_gifts([
+        {"id": number, "collection": collection, "name": f"{title} #{number}",
+         "model": model, "backdrop": "Black", "symbol": "Star"}
+        for collection, title, models in (
+            ("plushpepe", "Plush Pepe", ("Amber", "Amber", "Ruby")),
+            ("lootbag", "Loot Bag", ("Jade", "Jade", "Jade")),
+        )
+        for number, model in enumerate(models, start=1)
+    ])
+
+    assert list_collections() == ["lootbag", "plushpepe"]
+    assert refresh_collection("Plush Pepe")["collection"] == "plushpepe"
+    with connect_db() as session:
+        rows = session.execute(select(Gift.collection, Gift.id, Gift.rarity_rank)).all()
+        titled = session.scalars(select(Gift.id).where(collection_clause("plushpepe"))).all()
+    assert {(collection, gift_id): rank for collection, gift_id, rank in rows} == {
+        ("plushpepe", 1): 2, ("plushpepe", 2): 2, ("plushpepe", 3): 1,
+        ("lootbag", 1): None, ("lootbag", 2): None, ("lootbag", 3): None,
+    }
+    assert sorted(titled) == [1, 2, 3]